@@ -0,0 +1,78 @@
+# backend/app_new/alerts.py
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.db.models import DecimalField, IntegerField, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import BudgetAlert, BudgetCategoryMonth, MonthlyCategoryRollup
+from .sharding import db_for_user
+
+THRESHOLDS = (80, 100)  # percent of the month's budget
+UNREAD_LIMIT = 50
+KEYS_PER_QUERY = 200  # keeps the OR below SQLite's expression depth limit
+
+
+def crossed_thresholds(spent, budget, already=0):
+    """The THRESHOLDS above `already` that `spent` has reached, for a positive `budget`."""
+    return [t for t in THRESHOLDS if t > already and spent * 100 >= budget * t]
+
+
+def check_budget_alerts(user_id, keys):
+    """
+    Record a BudgetAlert for every threshold newly crossed in the user's
+    (category_id, year, month) `keys`. The running spend is MonthlyCategoryRollup,
+    which the expense signals and ExpenseDeltas keep current by delta, so this is
+    one query over the touched rollup rows plus an insert when something crossed;
+    no expenses are read. Each threshold alerts once per category and month.
+    Returns the alerts created.
+    """
+    keys = iter(set(keys))
+    alerts = []
+    while chunk := list(islice(keys, KEYS_PER_QUERY)):
+        alerts.extend(_check_months(user_id, chunk))
+    return alerts
+
+
+def _check_months(user_id, keys):
+    db = db_for_user(user_id)
+    budget = BudgetCategoryMonth.objects.using(db).filter(
+        uid_id=user_id, category_id=OuterRef('category_id'), year=OuterRef('year'), month=OuterRef('month'),
+    ).values('amount')[:1]
+    alerted = BudgetAlert.objects.using(db).filter(
+        user_id=user_id, category_id=OuterRef('category_id'), year=OuterRef('year'), month=OuterRef('month'),
+    ).order_by('-threshold').values('threshold')[:1]
+    rows = MonthlyCategoryRollup.objects.using(db).filter(
+        reduce(or_, (Q(category_id=category_id, year=year, month=month) for category_id, year, month in keys)),
+        user_id=user_id,
+    ).annotate(
+        budget=Subquery(budget, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        alerted=Subquery(alerted, output_field=IntegerField()),
+    ).filter(budget__gt=0).values('category_id', 'year', 'month', 'spent', 'budget', 'alerted')
+
+    alerts = [
+        BudgetAlert(user_id=user_id, category_id=row['category_id'], year=row['year'], month=row['month'],
+                    threshold=threshold, spent=row['spent'], budget=row['budget'])
+        for row in rows
+        for threshold in crossed_thresholds(row['spent'], row['budget'], row['alerted'] or 0)
+    ]
+    if alerts:
+        # a concurrent writer may have recorded the same crossing; the unique constraint keeps one
+        BudgetAlert.objects.using(db).bulk_create(alerts, ignore_conflicts=True)
+    return alerts
+
+
+def unread_alerts(user_id, limit=UNREAD_LIMIT):
+    """The user's newest unread alerts, served from the partial (user, -created_at) index."""
+    return (BudgetAlert.objects.using(db_for_user(user_id))
+            .filter(user_id=user_id, read_at__isnull=True)
+            .order_by('-created_at', '-id')[:limit])
+
+
+def mark_alerts_read(user_id, ids=None):
+    """Mark the given alerts (or all of them) read; returns how many changed."""
+    alerts = BudgetAlert.objects.using(db_for_user(user_id)).filter(user_id=user_id, read_at__isnull=True)
+    if ids is not None:
+        alerts = alerts.filter(pk__in=ids)
+    return alerts.update(read_at=timezone.now())
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_new'
+
+    def ready(self):
+        from . import checks  # noqa: F401  registers the system checks
@@ -0,0 +1,134 @@
+# backend/app_new/async_views.py
+"""
+Async variants of reports_view and budget_summary for ASGI deployments
+(uvicorn backend.asgi:application). They return the same bodies and share the
+same response cache entries as the sync views; the difference is that the
+independent queries behind each response run concurrently.
+
+Django's async ORM methods (aaggregate, async for, ...) all hop onto the single
+thread-sensitive executor of the request, so gathering them still runs the
+queries one after another. Each independent fetch here therefore runs through
+sync_to_async(thread_sensitive=False) on its own worker thread, which holds its
+own database connection, and asyncio.gather overlaps them.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .caching import acached_data, etag_matches, get_category_version, get_data_version, make_etag
+from .authentication import get_profile
+from .sharding import activate_user_shard
+from .views import (
+    budget_summary_data, monthly_income_total, report_budget_map, report_category_rows, report_data,
+    year_month_from_params,
+)
+
+
+def _run_query(fn, *args):
+    # Worker threads get the same connection lifecycle Django gives request threads
+    close_old_connections()
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+
+
+async def in_worker(fn, *args):
+    """Run a blocking ORM call on a pool thread (and so on its own DB connection)."""
+    return await sync_to_async(_run_query, thread_sensitive=False)(fn, *args)
+
+
+def _authenticate(request):
+    for auth_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = auth_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    raise exceptions.NotAuthenticated()
+
+
+def _www_authenticate(request):
+    return api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]().authenticate_header(request)
+
+
+async def authenticate(request):
+    """
+    Run the configured DRF authentication classes (JWT) for a plain async view.
+    Returns (user, None) or (None, error_response) with DRF's 401 body.
+    """
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except exceptions.APIException as e:
+        detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+        response = JsonResponse(detail, status=401)
+        response['WWW-Authenticate'] = _www_authenticate(request)
+        return None, response
+    request.user = user
+    # the shard set while authenticating stayed in the worker thread's context
+    activate_user_shard(user.id)
+    return user, None
+
+
+async def _respond(request, user, endpoint, params, build, include_categories=False):
+    version = await sync_to_async(get_data_version)(user.id)
+    category_version = await sync_to_async(get_category_version)() if include_categories else None
+    etag = make_etag(endpoint, user.id, version, request.get_full_path(), category_version, params)
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    data, hit = await acached_data(endpoint, user.id, params, build, include_categories)
+    response = JsonResponse(data, encoder=JSONEncoder)  # DRF's encoder, so Decimals render as in the sync views
+    response['ETag'] = etag
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+@require_GET
+async def reports_view_async(request):
+    """GET /api/async/reports/?year=2025&month=11 - same body as /api/reports/"""
+    user, error = await authenticate(request)
+    if error:
+        return error
+    try:
+        year, month = year_month_from_params(request.GET)
+    except ValueError:
+        return JsonResponse({"error": "year and month must be integers"}, status=400)
+
+    async def build():
+        income_total, category_data, budget_map = await asyncio.gather(
+            in_worker(monthly_income_total, user.id, year, month),
+            in_worker(report_category_rows, user.id, year, month),
+            in_worker(report_budget_map, user.id, year, month),
+        )
+        return report_data(year, month, income_total, category_data, budget_map)
+
+    # same endpoint name as the sync view, so both read and fill the same cache entries
+    return await _respond(request, user, 'reports', (year, month), build, include_categories=True)
+
+
+@require_GET
+async def budget_summary_async(request):
+    """GET /api/async/budget-summary/?year=2025&month=11 - same body as /api/budget-summary/"""
+    user, error = await authenticate(request)
+    if error:
+        return error
+    try:
+        year, month = year_month_from_params(request.GET)
+    except ValueError:
+        return JsonResponse({"error": "year and month must be integers"}, status=400)
+
+    async def build():
+        total_income, profile = await asyncio.gather(
+            in_worker(monthly_income_total, user.id, year, month),
+            in_worker(get_profile, user),
+        )
+        return budget_summary_data(year, month, total_income, profile)
+
+    return await _respond(request, user, 'budget-summary', (year, month), build)
@@ -0,0 +1,86 @@
+# backend/app_new/authentication.py
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .caching import get_auth_version, local_cache_ttl
+from .models import UserProfile
+from .sharding import activate_user_shard, shard_for
+
+
+def _user_key(user_id, version):
+    return f'auth-user:{user_id}:{version}'
+
+
+def user_cache_timeout():
+    """
+    One access-token lifetime with a shared cache. With a process-local one the
+    version bump only reaches the worker that made the change, so the others
+    hold on to the user for LOCAL_CACHE_TTL at most.
+    """
+    timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+    ttl = local_cache_ttl()
+    return timeout if ttl is None else min(timeout, ttl)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the resolved user, with its profile, in the
+    Django cache for one access-token lifetime. The entry is keyed on the user's
+    auth version, which is bumped when the User or its UserProfile is saved or
+    deleted (see models.py). A password change, a deactivation or a profile
+    edit is therefore seen on the next request, by every worker sharing the
+    cache; deployments need Redis or Memcached (see checks.py), and with the
+    process-local cache entries are kept for LOCAL_CACHE_TTL only. The active
+    and revoked-token checks still run against the cached user on every request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        # read the version before the row, so a write that lands in between retires what we store
+        key = _user_key(user_id, get_auth_version(user_id))
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = self._load_user(user_id)
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            cache.set(key, user, timeout=user_cache_timeout())
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        activate_user_shard(user.pk)
+        return user
+
+    def _load_user(self, user_id):
+        lookup = {api_settings.USER_ID_FIELD: user_id}
+        shard = shard_for(user_id)
+        if shard is None:
+            return self.user_model.objects.select_related('userprofile').get(**lookup)
+        # the profile lives on the user's shard, so it can't be joined in
+        user = self.user_model.objects.get(**lookup)
+        profile = UserProfile.objects.using(shard).filter(user_id=user.pk).first()
+        if profile is not None:
+            user.userprofile = profile
+        return user
+
+
+def get_profile(user):
+    """The user's profile, reusing the one loaded with the cached user when there is one."""
+    try:
+        return user.userprofile
+    except UserProfile.DoesNotExist:
+        profile, _ = UserProfile.objects.db_manager(shard_for(user.pk)).get_or_create(user=user)
+        return profile
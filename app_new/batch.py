@@ -0,0 +1,155 @@
+# backend/app_new/batch.py
+from django.db import transaction
+
+from .category_cache import get_category
+from .models import Expense_tbl
+from .rollups import ExpenseDeltas
+from .serializers import ExpenseTblSerializer
+from .sharding import db_for_user, delete_rows
+
+MAX_BATCH_OPERATIONS = 500
+OPERATIONS = ('create', 'update', 'delete')
+UPDATE_FIELDS = ('amount', 'date', 'note', 'cid')
+
+
+class BatchError(ValueError):
+    """The batch as a whole is malformed (not a list, too long, ...)."""
+
+
+def _check_structure(operations):
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("'operations' must be a non-empty list")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise BatchError(f"A batch can hold at most {MAX_BATCH_OPERATIONS} operations")
+
+
+def _parse_id(operation):
+    try:
+        return int(operation.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _validate(user, operations, context):
+    """
+    Validate every operation against ExpenseTblSerializer without writing.
+    Returns (plans, errors): plans holds (index, op, instance, validated_data)
+    for each valid operation, errors maps index -> error details.
+    """
+    ids = {_parse_id(op) for op in operations if isinstance(op, dict) and op.get('op') in ('update', 'delete')}
+    existing = Expense_tbl.objects.filter(user=user, id__in=ids - {None}).select_related('cid').in_bulk()
+
+    plans, errors, seen_ids = [], {}, set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            errors[index] = {'op': [f"Must be one of: {', '.join(OPERATIONS)}"]}
+            continue
+        op = operation['op']
+
+        instance = None
+        if op != 'create':
+            expense_id = _parse_id(operation)
+            if expense_id is None:
+                errors[index] = {'id': ["An integer id is required"]}
+                continue
+            if expense_id in seen_ids:
+                errors[index] = {'id': ["Each expense can appear only once per batch"]}
+                continue
+            seen_ids.add(expense_id)
+            instance = existing.get(expense_id)
+            if instance is None:
+                errors[index] = {'id': ["Expense not found"]}
+                continue
+            if op == 'delete':
+                plans.append((index, op, instance, None))
+                continue
+
+        serializer = ExpenseTblSerializer(instance, data=operation.get('data') or {},
+                                          partial=op == 'update', context=context)
+        if not serializer.is_valid():
+            errors[index] = serializer.errors
+            continue
+        data = dict(serializer.validated_data)
+        if 'cid' in data:
+            category = get_category(data.pop('cid'))
+            if category is None:
+                errors[index] = {'cid': ["Category does not exist."]}
+                continue
+            data['cid'] = category
+        plans.append((index, op, instance, data))
+    return plans, errors
+
+
+def apply_expense_batch(user, operations, context):
+    """
+    Validate a list of {"op": "create"|"update"|"delete", "id": ..., "data": {...}}
+    operations and, only if all of them are valid, apply them in one transaction:
+    one bulk_create, one bulk_update and one filtered delete. Rollups and
+    category totals get one F() update per touched (user, category[, month]).
+
+    Returns (ok, results), with one result per operation in request order.
+    """
+    _check_structure(operations)
+    plans, errors = _validate(user, operations, context)
+    if errors:
+        results = [
+            {'index': index, 'status': 'error', 'errors': errors[index]} if index in errors
+            else {'index': index, 'status': 'valid'}
+            for index in range(len(operations))
+        ]
+        return False, results
+
+    db = db_for_user(user.id)
+    with transaction.atomic(using=db):
+        # re-read the rows under lock: validation ran on an unlocked snapshot,
+        # and the rollup removals must match what is actually being replaced
+        locked_ids = [instance.id for _, op, instance, _ in plans if op != 'create']
+        locked = (Expense_tbl.objects.using(db).filter(user=user, id__in=locked_ids)
+                  .select_related('cid').select_for_update(of=('self',)).order_by('pk').in_bulk())
+        missing = {index for index, op, instance, _ in plans if op != 'create' and instance.id not in locked}
+        if missing:
+            return False, [
+                {'index': index, 'status': 'error', 'errors': {'id': ["Expense not found"]}} if index in missing
+                else {'index': index, 'status': 'valid'}
+                for index in range(len(operations))
+            ]
+
+        deltas = ExpenseDeltas()
+        created, updated, deleted = [], [], []
+        changed_fields = set()
+        for index, op, instance, data in plans:
+            if op == 'create':
+                expense = Expense_tbl(user=user, **data)
+                deltas.add(user.id, expense.cid_id, expense.date, expense.amount)
+                created.append((index, expense))
+                continue
+            expense = locked[instance.id]
+            deltas.remove(user.id, expense.cid_id, expense.date, expense.amount)
+            if op == 'update':
+                for field, value in data.items():
+                    setattr(expense, field, value)
+                deltas.add(user.id, expense.cid_id, expense.date, expense.amount)
+                changed_fields.update(data)
+                updated.append((index, expense))
+            else:
+                deleted.append((index, expense))
+
+        if created:
+            Expense_tbl.objects.using(db).bulk_create([expense for _, expense in created])
+        if updated and changed_fields:
+            Expense_tbl.objects.using(db).bulk_update([expense for _, expense in updated],
+                                                      [field for field in UPDATE_FIELDS if field in changed_fields])
+        if deleted:
+            # skips the per-row post_delete signals; the deltas below cover them
+            delete_rows(Expense_tbl.objects.using(db).filter(user=user, id__in=[e.id for _, e in deleted]))
+        deltas.apply()
+
+    results = {}
+    for status_code, rows in ((201, created), (200, updated)):
+        data = ExpenseTblSerializer([expense for _, expense in rows], many=True, context=context).data
+        for (index, _), item in zip(rows, data):
+            results[index] = {'index': index, 'op': 'create' if status_code == 201 else 'update',
+                              'status': status_code, 'data': item}
+    for index, expense in deleted:
+        results[index] = {'index': index, 'op': 'delete', 'status': 204, 'id': expense.id}
+    return True, [results[index] for index in range(len(operations))]
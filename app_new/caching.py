@@ -0,0 +1,221 @@
+# backend/app_new/caching.py
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .db_routers import pin_to_primary
+from .sharding import db_for_user
+
+HITS_KEY = 'response-cache:hits'
+MISSES_KEY = 'response-cache:misses'
+CATEGORY_VERSION_KEY = 'data-version:categories'
+
+
+def cache_is_process_local():
+    """True when the default cache lives in this process, so other workers never see its writes."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def local_cache_ttl():
+    """
+    Seconds a process-local entry that other workers can't invalidate may be
+    served for (settings.LOCAL_CACHE_TTL), or None with a shared cache, where
+    version bumps reach every worker.
+    """
+    if cache_is_process_local():
+        return getattr(settings, 'LOCAL_CACHE_TTL', 30)
+    return None
+
+
+def _version_key(user_id):
+    return f'data-version:{user_id}'
+
+
+def _get_version(key):
+    # A missing counter (first use, eviction, restart) is seeded from the clock
+    # so it never repeats a version an older cached response may be stored under.
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key, using=None):
+    def _bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+    transaction.on_commit(_bump, using=using)
+
+
+def get_data_version(user_id):
+    """Current version of one user's expenses, income, budgets and profile."""
+    return _get_version(_version_key(user_id))
+
+
+def bump_data_version(user_id):
+    """
+    Invalidate every cached response for this user once the current transaction
+    commits, and keep their reads on the primary while replicas catch up.
+    """
+    # wait for the transaction on the user's shard, which is where their rows were written
+    db = db_for_user(user_id)
+    _bump_version(_version_key(user_id), using=db)
+    transaction.on_commit(lambda: pin_to_primary(user_id), using=db)
+
+
+def get_category_version():
+    """Current version of the global Category table."""
+    return _get_version(CATEGORY_VERSION_KEY)
+
+
+def bump_category_version():
+    _bump_version(CATEGORY_VERSION_KEY)
+
+
+def get_auth_version(user_id):
+    """Current version of the cached authentication record (User + UserProfile) for one user."""
+    return _get_version(f'auth-version:{user_id}')
+
+
+def bump_auth_version(user_id, using=None):
+    _bump_version(f'auth-version:{user_id}', using=using)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 3) if total else 0.0}
+
+
+def response_cache_key(endpoint, user_id, params, version, category_version=None):
+    parts = ('resp', endpoint, user_id, *params, version)
+    if category_version is not None:
+        parts += (category_version,)
+    return ':'.join('-'.join(map(str, part)) if isinstance(part, tuple) else str(part) for part in parts)
+
+
+def versioned_cache(endpoint, key_params, include_categories=False):
+    """
+    Cache a per-user GET view's response data under
+    (endpoint, user, key_params(request), data version), plus the category
+    version for bodies that carry category names. Writes bump the version, so
+    stale entries are simply never looked up again and age out.
+    Place it under @api_view so it receives the DRF request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                params = key_params(request)
+            except (TypeError, ValueError):
+                return view(request, *args, **kwargs)
+
+            user_id = request.user.id
+            key = response_cache_key(endpoint, user_id, params, get_data_version(user_id),
+                                     get_category_version() if include_categories else None)
+
+            data = cache.get(key)
+            if data is not None:
+                _count(HITS_KEY)
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _count(MISSES_KEY)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 24 * 60 * 60))
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+async def acached_data(endpoint, user_id, params, build, include_categories=False):
+    """
+    Async counterpart of versioned_cache for plain Django async views: returns
+    (data, hit) from the same cache entry the sync view uses, awaiting build()
+    on a miss.
+    """
+    version = await sync_to_async(get_data_version)(user_id)
+    category_version = await sync_to_async(get_category_version)() if include_categories else None
+    key = response_cache_key(endpoint, user_id, params, version, category_version)
+    data = await cache.aget(key)
+    if data is not None:
+        await sync_to_async(_count)(HITS_KEY)
+        return data, True
+    await sync_to_async(_count)(MISSES_KEY)
+    data = await build()
+    await cache.aset(key, data, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 24 * 60 * 60))
+    return data, False
+
+
+def make_etag(endpoint, user_id, version, full_path, category_version=None, params=()):
+    # params: the resolved period, so a request that leaves it to "now" changes tag at rollover
+    parts = [endpoint, user_id, version, full_path, *params]
+    if category_version is not None:
+        parts.append(category_version)
+    return '"%s"' % hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def conditional_etag(endpoint, key_params=None, include_categories=False):
+    """
+    Strong ETag for a per-user GET view, derived from the user's data version
+    (and the category version for bodies that carry category names) plus the
+    full request path and, for views whose period defaults to today, the
+    resolved key_params(request) (the same ones versioned_cache keys on). A
+    matching If-None-Match gets a 304 before the view runs, so no report
+    queries or serializers execute; the only lookups are cache reads.
+    Works on @api_view functions and APIView methods alike.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            params = ()
+            if key_params is not None:
+                try:
+                    params = key_params(request)
+                except (TypeError, ValueError):
+                    pass  # the view answers 400 and no ETag is sent
+            etag = make_etag(endpoint, request.user.id, get_data_version(request.user.id), request.get_full_path(),
+                             get_category_version() if include_categories else None, params)
+
+            if etag_matches(request.headers.get('If-None-Match'), etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
+
+            response = view(*args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
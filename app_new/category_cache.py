@@ -0,0 +1,70 @@
+# backend/app_new/category_cache.py
+import threading
+import time
+from collections import namedtuple
+
+from .caching import get_category_version, local_cache_ttl
+from .models import Category
+
+_Snapshot = namedtuple('_Snapshot', 'version expires categories by_id id_by_name')
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _stale(snapshot, version):
+    if snapshot is None or snapshot.version != version:
+        return True
+    return snapshot.expires is not None and time.monotonic() >= snapshot.expires
+
+
+def _current():
+    """
+    The process-local Category maps, reloaded when the shared category version
+    (bumped on every Category save/delete, see models.py) has moved on. Each
+    lookup costs one cache read and, after a change, one query per worker.
+    While the cache itself is process-local a bump never reaches the other
+    workers, so there the maps are also reloaded every LOCAL_CACHE_TTL seconds.
+    """
+    global _snapshot
+    version = get_category_version()
+    snapshot = _snapshot
+    if _stale(snapshot, version):
+        with _lock:
+            snapshot = _snapshot
+            if _stale(snapshot, version):
+                ttl = local_cache_ttl()
+                categories = tuple(Category.objects.order_by('name'))
+                snapshot = _snapshot = _Snapshot(
+                    version,
+                    None if ttl is None else time.monotonic() + ttl,
+                    categories,
+                    {category.id: category for category in categories},
+                    {category.name.lower(): category.id for category in categories},
+                )
+    return snapshot
+
+
+def all_categories():
+    """Every Category, ordered by name. The instances are shared: don't modify them."""
+    return _current().categories
+
+
+def get_category(category_id):
+    """The Category with this id, or None. The instance is shared: don't modify it."""
+    return _current().by_id.get(category_id)
+
+
+def category_id_for_name(name):
+    """Case-insensitive name lookup; None when no category has that name."""
+    return _current().id_by_name.get(name.lower())
+
+
+def category_ids_by_name():
+    """Lowercase name -> id for every category."""
+    return _current().id_by_name
+
+
+def clear():
+    global _snapshot
+    _snapshot = None
@@ -0,0 +1,25 @@
+# backend/app_new/checks.py
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .caching import cache_is_process_local
+
+CACHED_AUTHENTICATION = 'app_new.authentication.CachedJWTAuthentication'
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    CachedJWTAuthentication relies on auth-version bumps reaching every worker;
+    with a per-process cache a deactivated user or a changed password stays
+    valid on the other workers until their entry expires.
+    """
+    classes = getattr(settings, 'REST_FRAMEWORK', {}).get('DEFAULT_AUTHENTICATION_CLASSES', [])
+    if CACHED_AUTHENTICATION in classes and cache_is_process_local():
+        return [Error(
+            'CachedJWTAuthentication needs a cache shared by every worker.',
+            hint="Point CACHES['default'] at Redis or Memcached "
+                 "(django.core.cache.backends.redis.RedisCache or .memcached.PyMemcacheCache).",
+            id='app_new.E001',
+        )]
+    return []
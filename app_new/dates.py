@@ -0,0 +1,19 @@
+# backend/app_new/dates.py
+from datetime import date
+
+
+def month_window(year, month):
+    """Half-open [start, end) date range covering one calendar month."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def month_filter(year, month, field='date'):
+    """
+    Filter kwargs for one month as a plain range on `field`.
+    Unlike date__year/date__month this stays sargable, so the
+    (user, date) indexes can be used.
+    """
+    start, end = month_window(year, month)
+    return {f'{field}__gte': start, f'{field}__lt': end}
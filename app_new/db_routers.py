@@ -0,0 +1,135 @@
+# backend/app_new/db_routers.py
+import contextvars
+import random
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.request import Request
+
+# the replica this request's reads go to, or None for the primary
+_replica_reads = contextvars.ContextVar('replica_reads', default=None)
+# users pinned while handling the current request, for ReplicaPinMiddleware's cookie
+_request_pins = contextvars.ContextVar('request_pins', default=None)
+
+PIN_COOKIE = 'db_pin'
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """
+    Send this user's reads to the primary for REPLICA_PIN_SECONDS, so they read
+    their own writes. The pin goes to the shared cache and, when the write came
+    from a request, to a signed cookie on its response (see ReplicaPinMiddleware),
+    so the next request sees it whichever worker serves it.
+    """
+    if _replicas():
+        cache.set(_pin_key(user_id), 1, timeout=_pin_seconds())
+        pins = _request_pins.get()
+        if pins is not None:
+            pins.add(user_id)
+
+
+def is_pinned(user_id, request=None):
+    if cache.get(_pin_key(user_id)) is not None:
+        return True
+    if request is None:
+        return False
+    pinned = request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_COOKIE, max_age=_pin_seconds())
+    return pinned is not None and str(user_id) in pinned.split(',')
+
+
+class ReplicaPinMiddleware:
+    """Set the signed read-your-writes cookie for users pinned while handling the request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request_pins.set(set())
+        try:
+            return self._set_cookie(self.get_response(request))
+        finally:
+            _request_pins.reset(token)
+
+    async def __acall__(self, request):
+        token = _request_pins.set(set())
+        try:
+            return self._set_cookie(await self.get_response(request))
+        finally:
+            _request_pins.reset(token)
+
+    def _set_cookie(self, response):
+        pins = _request_pins.get()
+        if pins:
+            response.set_signed_cookie(PIN_COOKIE, ','.join(map(str, sorted(pins))), salt=PIN_COOKIE,
+                                       max_age=_pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+
+def replica_reads(view):
+    """
+    Let the ORM reads of a read-only report/list view go to a replica, unless
+    the user wrote recently (see pin_to_primary). One replica is picked per
+    request, so all of its queries see the same snapshot. Works on @api_view
+    functions and APIView methods; authentication has already run on the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = _replicas()
+        if not replicas:
+            return view(*args, **kwargs)
+        request = next(arg for arg in args if isinstance(arg, Request))
+        if is_pinned(request.user.id, request):
+            return view(*args, **kwargs)
+        token = _replica_reads.set(random.choice(replicas))
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Reads inside @replica_reads views go to the alias from
+    settings.DATABASE_REPLICAS picked for the request; everything else, and
+    every write, goes to the primary. With no replicas configured this router
+    changes nothing.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = _replica_reads.get()
+        if replica is not None and replica in _replicas():
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        # explicit, so an instance read from a replica is still saved on the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
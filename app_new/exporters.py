@@ -0,0 +1,56 @@
+# backend/app_new/exporters.py
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPENSE_COLUMNS = ['id', 'date', 'amount', 'cid', 'category', 'note']
+EXPENSE_FIELDS = ['id', 'date', 'amount', 'cid_id', 'cid__name', 'note']
+
+INCOME_COLUMNS = ['id', 'date', 'amount', 'source']
+INCOME_FIELDS = ['id', 'date', 'amount', 'source']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(columns, rows):
+    for row in rows:
+        record = dict(zip(columns, row))
+        record['date'] = record['date'].isoformat()
+        record['amount'] = str(record['amount'])
+        yield json.dumps(record) + '\n'
+
+
+def stream_export(queryset, fields, columns, file_format, filename):
+    """
+    Stream `queryset` as CSV or NDJSON. Rows come from values_list().iterator(),
+    so only one chunk is ever held in memory however long the history is.
+    """
+    if file_format not in CONTENT_TYPES:
+        raise ValueError("Output must be 'csv' or 'ndjson'")
+
+    rows = queryset.order_by('date', 'id').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    lines = _csv_lines(columns, rows) if file_format == 'csv' else _ndjson_lines(columns, rows)
+
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
@@ -0,0 +1,69 @@
+# backend/app_new/filters.py
+import decimal
+from datetime import date
+from decimal import Decimal
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _parse_date(params, key):
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidFilter(f"'{key}' must be a date in YYYY-MM-DD format")
+
+
+def _parse_decimal(params, key):
+    value = params.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(str(value))
+    except decimal.InvalidOperation:
+        raise InvalidFilter(f"'{key}' must be a number")
+    if not number.is_finite():  # NaN and Infinity parse, but the ORM rejects them
+        raise InvalidFilter(f"'{key}' must be a number")
+    return number
+
+
+def _parse_int(params, key):
+    value = params.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidFilter(f"'{key}' must be an integer")
+
+
+def filter_by_date_range(queryset, params):
+    """?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD, both inclusive."""
+    date_from = _parse_date(params, 'date_from')
+    date_to = _parse_date(params, 'date_to')
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset
+
+
+def filter_expenses(queryset, params):
+    """Apply ?date_from, ?date_to, ?cid, ?min_amount and ?max_amount to an Expense_tbl queryset."""
+    queryset = filter_by_date_range(queryset, params)
+
+    cid = _parse_int(params, 'cid')
+    if cid is not None:
+        queryset = queryset.filter(cid_id=cid)
+
+    min_amount = _parse_decimal(params, 'min_amount')
+    max_amount = _parse_decimal(params, 'max_amount')
+    if min_amount is not None:
+        queryset = queryset.filter(amount__gte=min_amount)
+    if max_amount is not None:
+        queryset = queryset.filter(amount__lte=max_amount)
+    return queryset
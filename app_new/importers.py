@@ -0,0 +1,144 @@
+# backend/app_new/importers.py
+import csv
+import decimal
+import io
+import json
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+
+from .category_cache import category_ids_by_name
+from .models import Expense_tbl
+from .rollups import ExpenseDeltas
+from .sharding import db_for_user
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+MAX_AMOUNT = Decimal('99999999.99')  # Expense_tbl.amount is max_digits=10, decimal_places=2
+
+
+class RowError(ValueError):
+    pass
+
+
+def _iter_csv(stream):
+    reader = csv.DictReader(stream)
+    for line_no, row in enumerate(reader, start=2):  # line 1 is the header
+        yield line_no, row
+
+
+def _iter_ndjson(stream):
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            yield line_no, RowError("Invalid JSON")
+            continue
+        yield line_no, row if isinstance(row, dict) else RowError("Each line must be a JSON object")
+
+
+def detect_format(upload, requested=None):
+    if requested:
+        return requested.lower()
+    name = (upload.name or '').lower()
+    return 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def _parse_row(row, category_ids, known_ids):
+    """Turn one uploaded record into Expense_tbl field values, or raise RowError."""
+    if isinstance(row, RowError):
+        raise row
+
+    raw_date = str(row.get('date') or '').strip()
+    try:
+        day = date.fromisoformat(raw_date)
+    except ValueError:
+        raise RowError("'date' must be YYYY-MM-DD")
+
+    try:
+        amount = Decimal(str(row.get('amount', '')).strip())
+    except decimal.InvalidOperation:
+        raise RowError("'amount' must be a number")
+    if not amount.is_finite():
+        raise RowError("'amount' must be a number")
+    # check the stored (rounded) value: 99999999.995 rounds up past the column
+    try:
+        amount = amount.quantize(Decimal('0.01'))
+    except decimal.InvalidOperation:  # more digits than the decimal context holds
+        raise RowError("'amount' is out of range")
+    if not Decimal('0') < amount <= MAX_AMOUNT:
+        raise RowError("'amount' is out of range")
+
+    cid = row.get('cid')
+    if cid not in (None, ''):
+        try:
+            category_id = int(cid)
+        except (TypeError, ValueError):
+            raise RowError("'cid' must be an integer")
+        if category_id not in known_ids:
+            raise RowError(f"Unknown category id {category_id}")
+    else:
+        name = str(row.get('category') or '').strip()
+        category_id = category_ids.get(name.lower())
+        if category_id is None:
+            raise RowError(f"Unknown category '{name}'")
+
+    note = row.get('note') or None
+    if note is not None and not isinstance(note, str):
+        raise RowError("'note' must be a string")
+    return {'date': day, 'amount': amount, 'cid_id': category_id, 'note': note}
+
+
+def import_expenses(user, upload, file_format='csv'):
+    """
+    Stream an uploaded CSV (date,amount,category|cid,note header) or NDJSON file
+    into Expense_tbl. Valid rows are inserted in bulk_create batches inside one
+    transaction; invalid rows are skipped and reported with their line number.
+    Derived totals are refreshed once for the whole import.
+    """
+    if file_format not in ('csv', 'ndjson'):
+        raise ValueError("Format must be 'csv' or 'ndjson'")
+
+    # Category is small and global: resolve names from the process-wide map, not per row
+    category_ids = category_ids_by_name()
+    known_ids = set(category_ids.values())
+
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    records = _iter_csv(stream) if file_format == 'csv' else _iter_ndjson(stream)
+
+    errors = []
+    failed = 0
+    deltas = ExpenseDeltas()
+    imported = 0
+
+    def valid_rows():
+        nonlocal failed
+        for line_no, row in records:
+            try:
+                fields = _parse_row(row, category_ids, known_ids)
+            except RowError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': line_no, 'error': str(e)})
+                continue
+            deltas.add(user.id, fields['cid_id'], fields['date'], fields['amount'])
+            yield Expense_tbl(user=user, **fields)
+
+    db = db_for_user(user.id)
+    try:
+        with transaction.atomic(using=db):
+            rows = valid_rows()
+            while batch := list(islice(rows, IMPORT_BATCH_SIZE)):
+                Expense_tbl.objects.using(db).bulk_create(batch)
+                imported += len(batch)
+            deltas.apply()
+    except UnicodeDecodeError:
+        # the upload is decoded as it streams, so this can surface mid-import; nothing is kept
+        raise ValueError("The file must be UTF-8 encoded") from None
+
+    return {'imported': imported, 'failed': failed, 'errors': errors}
@@ -0,0 +1,143 @@
+import importlib.util
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app_new.management.commands.seed_data import USERNAME_PREFIX
+
+PAIRS = [
+    ('reports', '/api/reports/', '/api/async/reports/'),
+    ('budget-summary', '/api/budget-summary/', '/api/async/budget-summary/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sync and async report endpoints under concurrent load. Each run starts its own "
+        "uvicorn process (so the in-process response cache starts empty) and every request asks for a "
+        "different (user, month), so neither variant is served from cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help="Requests per endpoint variant.")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--months', type=int, default=24, help="How many recent months to spread requests over.")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='benchmark_async.json')
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError("uvicorn is not installed: pip install uvicorn")
+
+        workload = self._workload(options)
+        results = {}
+        for name, sync_path, async_path in PAIRS:
+            for variant, path in (('sync', sync_path), ('async', async_path)):
+                with self._server(options['port']):
+                    result = self._load(options['port'], path, workload, options['concurrency'])
+                results[f'{name}:{variant}'] = result
+                self.stdout.write(
+                    f"{name:15} {variant:5}  p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                    f"p99 {result['p99_ms']:8.2f} ms  {result['requests_per_second']:8.1f} req/s  "
+                    f"errors {result['errors']}"
+                )
+
+        with open(options['output'], 'w') as fh:
+            json.dump({'meta': {'requests': len(workload), 'concurrency': options['concurrency'],
+                                'vendor': settings.DATABASES['default']['ENGINE']},
+                       'results': results}, fh, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def _workload(self, options):
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id'))
+        if not users:
+            raise CommandError("No seeded users; run seed_data first.")
+        first = date.today().replace(day=1)
+        months = [first - relativedelta(months=n) for n in range(options['months'])]
+        combos = [(str(AccessToken.for_user(user)), m.year, m.month) for user in users for m in months]
+        if len(combos) < options['requests']:
+            self.stdout.write(self.style.WARNING(
+                f"Only {len(combos)} distinct (user, month) pairs; repeats will be cache hits."))
+        random.Random(options['seed']).shuffle(combos)
+        return [combos[i % len(combos)] for i in range(options['requests'])]
+
+    @contextmanager
+    def _server(self, port):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'backend.asgi:application',
+             '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        try:
+            self._wait_for_port(port, process)
+            yield process
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    @staticmethod
+    def _wait_for_port(port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError("uvicorn exited during startup")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f"uvicorn did not start listening on port {port}")
+
+    @staticmethod
+    def _fetch(port, path, token, year, month):
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{port}{path}?year={year}&month={month}',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    def _load(self, port, path, workload, concurrency):
+        # one untimed request per worker thread so startup and imports are not measured
+        token, _, _ = workload[0]
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda _: self._fetch(port, path, token, 1900, 1), range(concurrency)))
+
+            started = time.perf_counter()
+            outcomes = list(pool.map(lambda combo: self._fetch(port, path, *combo), workload))
+            wall = time.perf_counter() - started
+
+        latencies = sorted(ms for ms, ok in outcomes)
+        quantiles = statistics.quantiles(latencies, n=100)
+        return {
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(quantiles[94], 3),
+            'p99_ms': round(quantiles[98], 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'requests_per_second': round(len(workload) / wall, 1),
+            'errors': sum(1 for _, ok in outcomes if not ok),
+        }
@@ -0,0 +1,245 @@
+import json
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app_new import urls as app_urls
+from app_new.models import Category, Expense_tbl, Income, RecurringRule
+from app_new.sharding import data_aliases
+
+# Sample bodies for endpoints that only accept writes (query parameters for the
+# GET ones that need some). Every request runs inside a transaction that is
+# rolled back, so benchmarking never changes data.
+WRITE_SAMPLES = {
+    'api/register/': ('post', lambda ctx: {'username': 'bench_register', 'email': 'b@example.com', 'password': 'x-Bench-123'}),
+    'api/token/': None,
+    'api/token/refresh/': None,
+    'api/auto-assign-budgets/': ('post', lambda ctx: {'year': ctx['today'].year, 'month': ctx['today'].month}),
+    'api/categories/<int:pk>/': ('put', lambda ctx: {'description': 'Benchmark'}),
+    'api/categories/<int:pk>/update-budget/': ('put', lambda ctx: {'budget': 500}),
+    'api/categories/<int:category_id>/update-monthly-budget/': (
+        'put', lambda ctx: {'year': ctx['today'].year, 'month': ctx['today'].month, 'budget': 500}),
+    'api/expense/batch/': ('post', lambda ctx: {'operations': [
+        {'op': 'create', 'data': {'amount': '10.00', 'cid': ctx['pk']['category'], 'date': str(ctx['today'])}}
+        for _ in range(20)
+    ]}),
+    'api/expense/import/': None,  # needs a multipart upload; covered by its own tests
+    'api/expense/search/': ('get', lambda ctx: {'q': 'taxi office'}),
+    'api/alerts/read/': ('post', lambda ctx: {}),
+}
+# Admin-only endpoints; the benchmark user is a regular one.
+STAFF_ONLY = {'api/cache-stats/', 'api/metrics/'}
+
+
+class RolledBack(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Call every app_new endpoint through the DRF test client and record wall time, query count and "
+        "peak memory per endpoint as JSON. Pass --compare to diff against an earlier baseline. "
+        "Fails when any endpoint answers with a 4xx/5xx status."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Username or id to benchmark as (default: the first seeded user).")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per endpoint.")
+        parser.add_argument('--output', default='benchmark.json', help="Where to write the results.")
+        parser.add_argument('--compare', help="Baseline JSON to compare against.")
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help="Percent slowdown (median) reported as a regression.")
+        parser.add_argument('--warm-cache', action='store_true',
+                            help="Keep the response cache between runs instead of clearing it.")
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['user'])
+        client = APIClient(raise_request_exception=False)  # a broken view is recorded as a 500, not fatal
+        # a real token, not force_authenticate: the async views authenticate the header themselves
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        ctx = self._context(user)
+
+        results = {}
+        for route, pattern in self._routes():
+            path = self._build_path(route, ctx)
+            if path is None:
+                results[route] = {'skipped': 'no sample object for URL parameters'}
+                continue
+            if route in STAFF_ONLY:
+                results[route] = {'skipped': 'staff-only endpoint'}
+                continue
+            method, body = self._request_for(route, client, path, ctx)
+            if method is None:
+                results[route] = {'skipped': 'write-only endpoint without a sample body'}
+                continue
+            results[route] = self._measure(client, method, path, body, options)
+            self.stdout.write(f"{method.upper():6} {path:55} {self._summary(results[route])}")
+
+        report = {
+            'meta': {
+                'vendor': connection.vendor,
+                'user_id': user.id,
+                'expenses': Expense_tbl.objects.filter(user=user).count(),
+                'incomes': Income.objects.filter(user=user).count(),
+                'categories': Category.objects.count(),
+                'repeat': options['repeat'],
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options['compare']:
+            self._compare(options['compare'], results, options['threshold'])
+
+        failed = sorted(route for route, result in results.items() if result.get('status', 0) >= 400)
+        if failed:
+            for route in failed:
+                self.stderr.write(f"{route} answered {results[route]['status']}")
+            raise CommandError(f"{len(failed)} endpoint(s) answered with an error status; their timings "
+                               "measure the error path, not the endpoint.")
+
+    def _get_user(self, ident):
+        users = User.objects.all()
+        if ident is None:
+            user = users.filter(username__startswith='seed_user_').order_by('id').first() or users.order_by('id').first()
+        elif ident.isdigit():
+            user = users.filter(id=int(ident)).first()
+        else:
+            user = users.filter(username=ident).first()
+        if user is None:
+            raise CommandError("No user to benchmark with; run seed_data first or pass --user.")
+        return user
+
+    def _context(self, user):
+        today = date.today()
+        return {
+            'today': today,
+            'pk': {
+                'expense': Expense_tbl.objects.filter(user=user).values_list('id', flat=True).first(),
+                'income': Income.objects.filter(user=user).values_list('id', flat=True).first(),
+                'category': Category.objects.values_list('id', flat=True).first(),
+                'recurring': RecurringRule.objects.filter(user=user).values_list('id', flat=True).first(),
+            },
+        }
+
+    def _routes(self):
+        seen = set()
+        for pattern in app_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+            route = str(pattern.pattern)
+            if route in seen:
+                continue  # later duplicates are shadowed by the first match
+            seen.add(route)
+            yield route, pattern
+
+    def _build_path(self, route, ctx):
+        path = '/' + route
+        if '<int:pk>' in path:
+            kind = next((kind for kind in ('expense', 'income', 'recurring') if kind in route), 'category')
+            if ctx['pk'][kind] is None:
+                return None
+            path = path.replace('<int:pk>', str(ctx['pk'][kind]))
+        if '<int:category_id>' in path:
+            if ctx['pk']['category'] is None:
+                return None
+            path = path.replace('<int:category_id>', str(ctx['pk']['category']))
+        return path
+
+    def _request_for(self, route, client, path, ctx):
+        if route in WRITE_SAMPLES:
+            sample = WRITE_SAMPLES[route]
+            return (sample[0], sample[1](ctx)) if sample else (None, None)
+        return 'get', None
+
+    def _call(self, client, method, path, body):
+        response = None
+        try:
+            with ExitStack() as stack:
+                # per-user rows live on the shards, Category and friends on default; roll back all of them
+                for alias in sorted({DEFAULT_DB_ALIAS, *data_aliases()}):
+                    stack.enter_context(transaction.atomic(using=alias))
+                if method == 'get':
+                    response = client.get(path, body)
+                else:
+                    response = getattr(client, method)(path, body, format='json')
+                if hasattr(response, 'streaming_content'):
+                    for _ in response.streaming_content:
+                        pass
+                raise RolledBack
+        except RolledBack:
+            pass
+        return response
+
+    def _measure(self, client, method, path, body, options):
+        timings, queries, status = [], 0, None
+        for _ in range(options['repeat']):
+            if not options['warm_cache']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self._call(client, method, path, body)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(captured)
+            status = response.status_code
+
+        if not options['warm_cache']:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            self._call(client, method, path, body)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'method': method.upper(),
+            'status': status,
+            'queries': queries,
+            'wall_ms_median': round(statistics.median(timings), 3),
+            'wall_ms_min': round(min(timings), 3),
+            'wall_ms_max': round(max(timings), 3),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    @staticmethod
+    def _summary(result):
+        return (f"{result['status']}  {result['wall_ms_median']:>9.2f} ms  "
+                f"{result['queries']:>4} queries  {result['peak_memory_kb']:>9.1f} KiB")
+
+    def _compare(self, baseline_path, results, threshold):
+        with open(baseline_path) as fh:
+            baseline = json.load(fh)['endpoints']
+        regressions = 0
+        self.stdout.write(f"\nComparison with {baseline_path}:")
+        for route, current in sorted(results.items()):
+            before = baseline.get(route)
+            if not before or 'skipped' in current or 'skipped' in before:
+                continue
+            change = ((current['wall_ms_median'] - before['wall_ms_median']) / before['wall_ms_median'] * 100
+                      if before['wall_ms_median'] else 0.0)
+            query_delta = current['queries'] - before['queries']
+            flag = ''
+            if change > threshold or query_delta > 0:
+                flag = '  REGRESSION'
+                regressions += 1
+            self.stdout.write(
+                f"{route:55} {change:+7.1f}% time  {query_delta:+4d} queries  "
+                f"{current['peak_memory_kb'] - before['peak_memory_kb']:+9.1f} KiB{flag}"
+            )
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"{regressions} endpoint(s) regressed."))
@@ -0,0 +1,86 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app_new.management.commands.seed_data import USERNAME_PREFIX
+from app_new.models import Expense_tbl
+from app_new.search import search_expenses, search_terms
+from app_new.sharding import user_shard
+
+PAGE_SIZE = 50
+
+
+def _icontains(queryset, text, user_id=None):
+    for term in search_terms(text):
+        queryset = queryset.filter(note__icontains=term)
+    return queryset.order_by('-date', '-id')
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the first page of the expense note search (full-text index) against the old icontains "
+        "scan, per seeded user and for the whole table. Run seed_data first, e.g. --expenses 3000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries',
+                            help="Search text (repeatable). Defaults to two words every sixth seeded note "
+                                 "has and one no seeded note has.")
+        parser.add_argument('--users', type=int, default=10, help="How many seeded users to sample.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per query.")
+        parser.add_argument('--output', default='benchmark_search.json', help="Where to write the results.")
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or ['rent', 'taxi office', 'airport']
+        user_ids = list(User.objects.filter(username__startswith=USERNAME_PREFIX)
+                        .order_by('id').values_list('id', flat=True)[:options['users']])
+        if not user_ids:
+            raise CommandError("No seeded users found; run `manage.py seed_data` first.")
+
+        results = {}
+        for text in queries:
+            for scope in ('user', 'all'):
+                timings = {'fulltext': [], 'icontains': []}
+                for user_id in user_ids if scope == 'user' else [None]:
+                    with user_shard(user_id):
+                        queryset = Expense_tbl.objects.all()
+                        if user_id is not None:
+                            queryset = queryset.filter(user_id=user_id)
+                        for name, search in (('fulltext', search_expenses), ('icontains', _icontains)):
+                            timings[name].extend(self._time(search, queryset, text, user_id, options['repeat']))
+                row = {name: self._summary(samples) for name, samples in timings.items()}
+                row['speedup'] = round(row['icontains']['median_ms'] / max(row['fulltext']['median_ms'], 0.001), 1)
+                results[f'{text} [{scope}]'] = row
+                self.stdout.write(f"{text!r:16} {scope:5} fulltext {row['fulltext']['median_ms']:9.2f} ms   "
+                                  f"icontains {row['icontains']['median_ms']:9.2f} ms   x{row['speedup']}")
+
+        report = {
+            'meta': {'vendor': connection.vendor, 'expenses': Expense_tbl.objects.count(),
+                     'users_sampled': len(user_ids), 'page_size': PAGE_SIZE, 'repeat': options['repeat']},
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    @staticmethod
+    def _time(search, queryset, text, user_id, repeat):
+        list(search(queryset, text, user_id)[:PAGE_SIZE])  # warm the page cache
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(search(queryset, text, user_id)[:PAGE_SIZE])
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    @staticmethod
+    def _summary(samples):
+        samples = sorted(samples)
+        return {
+            'median_ms': round(statistics.median(samples), 2),
+            'p95_ms': round(samples[int(0.95 * (len(samples) - 1))], 2),
+        }
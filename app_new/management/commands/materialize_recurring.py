@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_new.recurring import RULES_PER_CHUNK, materialize_due
+from app_new.rollups import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Write every due occurrence of the recurring expense/income rules as real rows. "
+        "Safe to rerun and to run from cron (e.g. daily); already-written occurrences are never repeated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help="Materialize occurrences up to this date (YYYY-MM-DD); default today.")
+        parser.add_argument('--user', type=int, help="Only this user's rules.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per bulk_create.")
+        parser.add_argument('--rules-per-chunk', type=int, default=RULES_PER_CHUNK,
+                            help="Rules read and committed per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            until = date.fromisoformat(options['until']) if options['until'] else None
+        except ValueError:
+            raise CommandError(f"Invalid --until '{options['until']}', expected YYYY-MM-DD")
+        counts = materialize_due(until=until, user_id=options['user'], batch_size=options['batch_size'],
+                                 rules_per_chunk=options['rules_per_chunk'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Materialized {counts['expenses']} expenses and {counts['incomes']} incomes from {counts['rules']} rules."
+        ))
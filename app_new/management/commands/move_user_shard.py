@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_new.models import UserProfile
+from app_new.sharding import ShardMoveError, move_user, shard_aliases, shard_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Move users' expenses, income, budgets and profile from --from to the shard the hash ring "
+        "over DATABASE_SHARDS now assigns them, e.g. after adding a shard."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="User id to move (repeatable).")
+        parser.add_argument('--all', action='store_true',
+                            help="Move every user on --from whose ring shard is elsewhere (rebalance).")
+        parser.add_argument('--from', dest='source', required=True, help="Alias the rows are on now.")
+        parser.add_argument('--renumber', action='store_true',
+                            help="Give the copied rows new ids instead of keeping them (for id clashes).")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the moves.")
+
+    def handle(self, *args, **options):
+        source = options['source']
+        if not shard_aliases():
+            raise CommandError("DATABASE_SHARDS is empty; there is nothing to move between.")
+        if bool(options['user_ids']) == options['all']:
+            raise CommandError("Pass either --user or --all.")
+
+        if options['all']:
+            # every user has a profile, so the profiles on the source list who lives there
+            user_ids = UserProfile.objects.using(source).order_by('user_id').values_list('user_id', flat=True)
+        else:
+            user_ids = options['user_ids']
+        moves = [(user_id, shard_for(user_id)) for user_id in user_ids if shard_for(user_id) != source]
+
+        for count, (user_id, target) in enumerate(moves):
+            if options['dry_run']:
+                self.stdout.write(f"user {user_id}: {source} -> {target}")
+                continue
+            try:
+                copied = move_user(user_id, source, target, renumber=options['renumber'])
+            except ShardMoveError as e:
+                raise CommandError(f"{e} ({count} users moved before this one)") from e
+            rows = ', '.join(f"{rows} {label}" for label, rows in copied.items())
+            self.stdout.write(f"user {user_id}: {source} -> {target} ({rows})")
+
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(moves)} users off {source}."))
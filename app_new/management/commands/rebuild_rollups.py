@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from app_new.rollups import rebuild_category_totals, rebuild_expense_rollups, rebuild_income_rollups
+
+
+class Command(BaseCommand):
+    help = "Regenerate the rollup and per-user category total tables from raw Expense_tbl and Income rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild this user id (repeatable). Defaults to all users.")
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        expenses = rebuild_expense_rollups(user_ids)
+        income = rebuild_income_rollups(user_ids)
+        totals = rebuild_category_totals(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {expenses} category rollup rows, {income} income rollup rows "
+            f"and {totals} category total rows."
+        ))
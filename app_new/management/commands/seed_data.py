@@ -0,0 +1,141 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from app_new.caching import bump_category_version
+from app_new.models import BudgetCategoryMonth, Category, Expense_tbl, Income, UserProfile
+from app_new.rollups import rebuild_category_totals, rebuild_expense_rollups, rebuild_income_rollups
+from app_new.sharding import db_for_user, replicate_categories, replicate_users
+
+USERNAME_PREFIX = 'seed_user_'
+CATEGORY_PREFIX = 'Seed Category '
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _by_shard(rows, user_attname):
+    """Split a batch into {alias: rows} by the shard owning each row's user."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(db_for_user(getattr(row, user_attname)), []).append(row)
+    return groups.items()
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic users, categories, expenses, incomes and monthly budgets with bulk_create, "
+        "e.g. --users 10000 --categories 50 --expenses 20000000 --years 5."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--expenses', type=int, default=100_000, help="Total expenses across all users.")
+        parser.add_argument('--years', type=int, default=5, help="How many years back the data spans.")
+        parser.add_argument('--budget-categories', type=int, default=10,
+                            help="Categories per user that get a budget every month.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, for repeatable datasets.")
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help="Do not rebuild rollups/category totals afterwards.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        today = date.today()
+        first_day = today.replace(day=1) - timedelta(days=365 * options['years'])
+        span_days = (today - first_day).days
+
+        user_ids = self._seed_users(options['users'], batch_size)
+        category_ids = self._seed_categories(options['categories'])
+        months = self._months(first_day, today)
+
+        def expenses():
+            for _ in range(options['expenses']):
+                yield Expense_tbl(
+                    user_id=rng.choice(user_ids),
+                    cid_id=rng.choice(category_ids),
+                    amount=Decimal(rng.randint(100, 500_000)) / 100,
+                    date=first_day + timedelta(days=rng.randrange(span_days + 1)),
+                    note=rng.choice(['', 'groceries', 'rent', 'taxi to office', 'dinner with friends', 'refill']),
+                )
+
+        def incomes():
+            for user_id in user_ids:
+                for year, month in months:
+                    yield Income(user_id=user_id, amount=Decimal(rng.randint(30_000, 200_000)),
+                                 source='Salary', date=date(year, month, 1))
+
+        def budgets():
+            for user_id in user_ids:
+                chosen = rng.sample(category_ids, min(options['budget_categories'], len(category_ids)))
+                for year, month in months:
+                    for category_id in chosen:
+                        yield BudgetCategoryMonth(uid_id=user_id, category_id=category_id, year=year, month=month,
+                                                  amount=Decimal(rng.randint(1_000, 20_000)))
+
+        for label, model, user_attname, rows in (('expenses', Expense_tbl, 'user_id', expenses()),
+                                                 ('incomes', Income, 'user_id', incomes()),
+                                                 ('budgets', BudgetCategoryMonth, 'uid_id', budgets())):
+            created = 0
+            for batch in _batches(rows, batch_size):
+                for db, shard_rows in _by_shard(batch, user_attname):
+                    model.objects.using(db).bulk_create(shard_rows, ignore_conflicts=model is BudgetCategoryMonth)
+                created += len(batch)
+            self.stdout.write(f"Created {created} {label}")
+
+        if not options['skip_rollups']:
+            # bulk_create bypasses the signals that maintain the derived tables
+            rebuild_expense_rollups()
+            rebuild_income_rollups()
+            rebuild_category_totals()
+            self.stdout.write("Rebuilt rollups and category totals")
+
+        self.stdout.write(self.style.SUCCESS("Seeding complete."))
+
+    def _seed_users(self, count, batch_size):
+        existing = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        password = make_password(None)  # unusable; seeded users are only for benchmarks
+        new_users = (User(username=f'{USERNAME_PREFIX}{n}', password=password)
+                     for n in range(existing, count))
+        for batch in _batches(new_users, batch_size):
+            User.objects.bulk_create(batch)
+
+        user_ids = list(User.objects.filter(username__startswith=USERNAME_PREFIX)
+                        .order_by('id').values_list('id', flat=True)[:count])
+        # bulk_create skips the post_save signals that copy users to their shard and create profiles
+        for batch in _batches(user_ids, batch_size):
+            replicate_users(User.objects.filter(pk__in=batch))
+            profiles = (UserProfile(user_id=uid) for uid in batch)
+            for db, rows in _by_shard(profiles, 'user_id'):
+                UserProfile.objects.using(db).bulk_create(rows, ignore_conflicts=True)
+        self.stdout.write(f"Using {len(user_ids)} users")
+        return user_ids
+
+    def _seed_categories(self, count):
+        names = [f'{CATEGORY_PREFIX}{n}' for n in range(count)]
+        Category.objects.bulk_create([Category(name=name) for name in names], ignore_conflicts=True)
+        # bulk_create skips the signals that retire cached category listings and copy categories to the shards
+        bump_category_version()
+        replicate_categories()
+        category_ids = list(Category.objects.filter(name__in=names).values_list('id', flat=True))
+        self.stdout.write(f"Using {len(category_ids)} categories")
+        return category_ids
+
+    @staticmethod
+    def _months(first_day, last_day):
+        year, month = first_day.year, first_day.month
+        months = []
+        while (year, month) <= (last_day.year, last_day.month):
+            months.append((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months
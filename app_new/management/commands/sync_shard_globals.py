@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from app_new.sharding import replicate_categories, replicate_users, shard_aliases
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy every Category to every shard, and every User to the shard that owns them. "
+        "Run after adding a database to DATABASE_SHARDS; later writes are copied by signals."
+    )
+
+    def handle(self, *args, **options):
+        if not shard_aliases():
+            self.stdout.write("DATABASE_SHARDS is empty; nothing to do.")
+            return
+        replicate_categories()
+        users = User.objects.using('default').order_by('pk')
+        count = 0
+        batch = []
+        for user in users.iterator(chunk_size=BATCH_SIZE):
+            batch.append(user)
+            if len(batch) == BATCH_SIZE:
+                replicate_users(batch)
+                count += len(batch)
+                batch = []
+        replicate_users(batch)
+        count += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied categories to {', '.join(shard_aliases())} and {count} users to their shards."
+        ))
@@ -0,0 +1,180 @@
+# backend/app_new/metrics.py
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects it."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {labels: (list(s['counts']), s['sum'], s['count']) for labels, s in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('app_request_duration_seconds', 'Wall time per view.', DURATION_BUCKETS)
+DB_DURATION = Histogram('app_request_db_duration_seconds', 'Time spent in database calls per view.',
+                        DURATION_BUCKETS)
+QUERY_COUNT = Histogram('app_request_queries', 'Database queries per view.', QUERY_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, QUERY_COUNT)
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+
+class QueryTimer:
+    """Counts queries and adds up the time spent in them for one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()  # async views may run queries on several worker threads at once
+
+    def add(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+_current_timer = contextvars.ContextVar('query_timer', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.add(time.perf_counter() - started)
+
+
+def _install(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@receiver(connection_created)
+def _install_on_new_connection(sender, connection, **kwargs):
+    # covers connections opened on sync_to_async worker threads, which the
+    # request's contextvar (and so its timer) is copied into
+    _install(connection)
+
+
+def view_label(request):
+    """URL name when the route has one, otherwise the view function or class name."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    if match.url_name:
+        return match.url_name
+    view = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None) or match.func
+    return getattr(view, '__name__', match.route)
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request, counts its queries and DB time on every connection it
+    touches, adds a Server-Timing header and feeds the per-view histograms
+    served by /api/metrics/. The histograms are per process.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for alias in connections:
+            _install(connections[alias])
+        timer = QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer, time.perf_counter() - started)
+
+    def _finish(self, request, response, timer, elapsed):
+        labels = (('view', view_label(request)), ('method', request.method))
+        REQUEST_DURATION.observe(labels, elapsed)
+        DB_DURATION.observe(labels, timer.seconds)
+        QUERY_COUNT.observe(labels, timer.count)
+
+        # overlapping queries on async views can add up to more than the wall time
+        app_seconds = max(elapsed - timer.seconds, 0.0)
+        response['Server-Timing'] = (
+            f'db;dur={timer.seconds * 1000:.1f};desc="{timer.count} queries", '
+            f'app;dur={app_seconds * 1000:.1f}, '
+            f'total;dur={elapsed * 1000:.1f}'
+        )
+        return response
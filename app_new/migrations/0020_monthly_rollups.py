@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from itertools import islice
+
+
+def _insert_in_batches(model, objs, batch_size=1000):
+    objs = iter(objs)
+    while batch := list(islice(objs, batch_size)):
+        model.objects.bulk_create(batch)
+
+
+def populate_rollups(apps, schema_editor):
+    Expense_tbl = apps.get_model('app_new', 'Expense_tbl')
+    Income = apps.get_model('app_new', 'Income')
+    MonthlyCategoryRollup = apps.get_model('app_new', 'MonthlyCategoryRollup')
+    MonthlyIncomeRollup = apps.get_model('app_new', 'MonthlyIncomeRollup')
+
+    expenses = Expense_tbl.objects.annotate(
+        year=ExtractYear('date'), month=ExtractMonth('date'),
+    ).values('user_id', 'cid_id', 'year', 'month').annotate(
+        spent=Sum('amount'), transaction_count=Count('id'),
+    ).order_by()
+    _insert_in_batches(
+        MonthlyCategoryRollup,
+        (MonthlyCategoryRollup(user_id=r['user_id'], category_id=r['cid_id'], year=r['year'], month=r['month'],
+                               spent=r['spent'], transaction_count=r['transaction_count'])
+         for r in expenses.iterator(chunk_size=1000)),
+    )
+
+    income = Income.objects.annotate(
+        year=ExtractYear('date'), month=ExtractMonth('date'),
+    ).values('user_id', 'year', 'month').annotate(
+        total=Sum('amount'), transaction_count=Count('id'),
+    ).order_by()
+    _insert_in_batches(
+        MonthlyIncomeRollup,
+        (MonthlyIncomeRollup(user_id=r['user_id'], year=r['year'], month=r['month'],
+                             total=r['total'], transaction_count=r['transaction_count'])
+         for r in income.iterator(chunk_size=1000)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_new', '0019_expense_income_date_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyCategoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_new.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'year', 'month'], name='rollup_user_month_idx')],
+                'unique_together': {('user', 'category', 'year', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyIncomeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'year', 'month')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
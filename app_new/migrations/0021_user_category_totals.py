@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from itertools import islice
+
+
+def populate_totals(apps, schema_editor):
+    Expense_tbl = apps.get_model('app_new', 'Expense_tbl')
+    UserCategoryTotal = apps.get_model('app_new', 'UserCategoryTotal')
+
+    grouped = Expense_tbl.objects.values('user_id', 'cid_id').annotate(
+        total_expense=Sum('amount'), transaction_count=Count('id'),
+    ).order_by()
+    rows = (
+        UserCategoryTotal(user_id=r['user_id'], category_id=r['cid_id'],
+                          total_expense=r['total_expense'], transaction_count=r['transaction_count'])
+        for r in grouped.iterator(chunk_size=1000)
+    )
+    while batch := list(islice(rows, 1000)):
+        UserCategoryTotal.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_new', '0020_monthly_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='category',
+            name='total_expense',
+        ),
+        migrations.CreateModel(
+            name='UserCategoryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_expense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_new.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'category')},
+            },
+        ),
+        migrations.RunPython(populate_totals, migrations.RunPython.noop),
+    ]
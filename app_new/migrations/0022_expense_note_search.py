@@ -0,0 +1,83 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Full-text index over Expense_tbl.note, maintained by the database itself so
+# bulk_create/bulk_update/raw deletes stay covered (see app_new/search.py).
+#
+# PostgreSQL: a stored generated tsvector column with a GIN index on
+# (user_id, note_search), so one user's search doesn't walk everyone's postings.
+# SQLite: a contentless FTS5 table kept in step by triggers, holding the owner
+# as a 'u<id>' token for the same reason. SQLite rebuilds a table for most
+# ALTERs and that drops its triggers; a later migration that remakes
+# app_new_expense_tbl must create them again.
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE app_new_expense_tbl ADD COLUMN note_search tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(note, ''))) STORED",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    "CREATE INDEX expense_note_search_idx ON app_new_expense_tbl USING GIN (user_id, note_search)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS expense_note_search_idx",
+    "ALTER TABLE app_new_expense_tbl DROP COLUMN IF EXISTS note_search",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE app_new_expense_fts USING fts5("
+    "note, owner, content='', tokenize='porter unicode61')",
+    # rank by the note alone
+    "INSERT INTO app_new_expense_fts(app_new_expense_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+    "CREATE TRIGGER app_new_expense_fts_insert AFTER INSERT ON app_new_expense_tbl BEGIN "
+    "INSERT INTO app_new_expense_fts(rowid, note, owner) VALUES (new.id, new.note, 'u' || new.user_id); END",
+    "CREATE TRIGGER app_new_expense_fts_delete AFTER DELETE ON app_new_expense_tbl BEGIN "
+    "INSERT INTO app_new_expense_fts(app_new_expense_fts, rowid, note, owner) "
+    "VALUES ('delete', old.id, old.note, 'u' || old.user_id); END",
+    "CREATE TRIGGER app_new_expense_fts_update AFTER UPDATE OF note, user_id ON app_new_expense_tbl BEGIN "
+    "INSERT INTO app_new_expense_fts(app_new_expense_fts, rowid, note, owner) "
+    "VALUES ('delete', old.id, old.note, 'u' || old.user_id); "
+    "INSERT INTO app_new_expense_fts(rowid, note, owner) VALUES (new.id, new.note, 'u' || new.user_id); END",
+    "INSERT INTO app_new_expense_fts(rowid, note, owner) SELECT id, note, 'u' || user_id FROM app_new_expense_tbl",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS app_new_expense_fts_update",
+    "DROP TRIGGER IF EXISTS app_new_expense_fts_delete",
+    "DROP TRIGGER IF EXISTS app_new_expense_fts_insert",
+    "DROP TABLE IF EXISTS app_new_expense_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def add_search_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def remove_search_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_new', '0021_user_category_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseSearchEntry',
+            fields=[
+                ('expense', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='app_new.expense_tbl')),
+                ('note', models.TextField()),
+                ('owner', models.TextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'app_new_expense_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
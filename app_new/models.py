@@ -105,25 +105,114 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db import transaction
-from django.db.models import Sum
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import F, OuterRef, Subquery, DecimalField, Value
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 import datetime
-
-class Income(models.Model):
+from .caching import bump_auth_version, bump_category_version, bump_data_version
+from .sharding import db_for_user, replicate_categories, replicate_users, shard_aliases, shard_for
+
+class UserDataQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # QuerySet.create() picks its database without the new row as a hint;
+        # Model.save() passes it, so ShardRouter can send the row to its user's shard.
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+class RolledUpRowMixin:
+    """
+    For rows summed into the rollup tables: save() and delete() run in one
+    transaction with the rollup deltas their post_save/post_delete receivers
+    apply, so a failed delta also undoes the row write. The stored row is read
+    with select_for_update(), so two concurrent updates of one row don't both
+    subtract the same old amount.
+    """
+    rollup_fields = ()
+
+    def _locked_row(self, using):
+        if self.pk is None or self._state.adding:
+            return None
+        return type(self).objects.using(using).select_for_update().filter(pk=self.pk).values(
+            *self.rollup_fields).first()
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            self._rollup_previous = self._locked_row(using)
+            super().save(*args, **kwargs)
+
+    save.alters_data = True
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            # take the amounts off as stored, not as this (possibly stale) instance has them
+            for field, value in (self._locked_row(using) or {}).items():
+                setattr(self, field, value)
+            return super().delete(using=using, keep_parents=keep_parents)
+
+    delete.alters_data = True
+
+class Income(RolledUpRowMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     source = models.CharField(max_length=100)
     date = models.DateField()
+    recurring_rule = models.ForeignKey('RecurringRule', on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='incomes')
+
+    rollup_fields = ('user_id', 'date', 'amount')
+
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='income_user_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['recurring_rule', 'date'], condition=models.Q(recurring_rule__isnull=False),
+                                    name='income_once_per_rule_date'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.source} - {self.amount}"
 
+class CategoryQuerySet(models.QuerySet):
+    def with_monthly_budget(self, user, year, month):
+        """Annotate the user's running total and one month's budget, spent, remaining and transaction_count in a single query."""
+        money = DecimalField(max_digits=12, decimal_places=2)
+        budget = BudgetCategoryMonth.objects.filter(
+            uid=user, category=OuterRef('pk'), year=year, month=month
+        ).values('amount')[:1]
+        rollup = MonthlyCategoryRollup.objects.filter(
+            user=user, category=OuterRef('pk'), year=year, month=month
+        )
+        running_total = UserCategoryTotal.objects.filter(
+            user=user, category=OuterRef('pk')
+        ).values('total_expense')[:1]
+        # the subqueries read per-user tables, so with sharding the query runs on the user's shard
+        shard = shard_for(getattr(user, 'pk', user))
+        queryset = self.using(shard) if shard else self
+        return queryset.annotate(
+            user_total_expense=Coalesce(Subquery(running_total, output_field=money), Value(Decimal('0')), output_field=money),
+            monthly_budget=Coalesce(Subquery(budget, output_field=money), Value(Decimal('0')), output_field=money),
+            monthly_spent=Coalesce(Subquery(rollup.values('spent')[:1], output_field=money), Value(Decimal('0')), output_field=money),
+            monthly_transaction_count=Coalesce(Subquery(rollup.values('transaction_count')[:1]), Value(0)),
+        ).annotate(
+            monthly_remaining=F('monthly_budget') - F('monthly_spent'),
+        )
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    total_expense = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         ordering = ['name']
@@ -131,11 +220,6 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-    def update_total_expense(self, user):
-        total = Expense_tbl.objects.filter(cid=self, user=user).aggregate(total=Sum('amount'))['total'] or 0
-        self.total_expense = total
-        self.save(update_fields=['total_expense'])
-
 # NEW MODEL: Monthly Budget per Category per User
 class BudgetCategoryMonth(models.Model):
     uid = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -144,6 +228,8 @@ class BudgetCategoryMonth(models.Model):
     month = models.IntegerField()  # 1-12
     amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    objects = UserDataQuerySet.as_manager()
+
     class Meta:
         unique_together = ('uid', 'category', 'year', 'month')
         indexes = [
@@ -153,40 +239,287 @@ class BudgetCategoryMonth(models.Model):
     def __str__(self):
         return f"{self.uid} - {self.category.name} - {self.year}-{self.month}: ₹{self.amount}"
 
-class Expense_tbl(models.Model):
+class Expense_tbl(RolledUpRowMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     cid = models.ForeignKey(Category, on_delete=models.CASCADE)
     date = models.DateField()
     note = models.TextField(blank=True, null=True)
+    # set on rows materialized from a RecurringRule; (rule, date) is unique so reruns add nothing
+    recurring_rule = models.ForeignKey('RecurringRule', on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='expenses')
+
+    rollup_fields = ('user_id', 'cid_id', 'date', 'amount')
+
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+            models.Index(fields=['user', 'cid', 'date'], name='expense_user_cid_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['recurring_rule', 'date'], condition=models.Q(recurring_rule__isnull=False),
+                                    name='expense_once_per_rule_date'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} - {self.cid.name}"
 
-@receiver([post_save, post_delete], sender=Expense_tbl)
-def update_category_total_safe(sender, instance, **kwargs):
-    expense_id = instance.id
-    category_id = instance.cid_id
-    user_id = instance.user_id
-
-    def _update():
-        try:
-            category = Category.objects.get(id=category_id)
-            user = User.objects.get(id=user_id)
-            category.update_total_expense(user=user)
-        except (Category.DoesNotExist, User.DoesNotExist):
-            pass
-    transaction.on_commit(_update)
+# SQLite's full-text index over Expense_tbl.note: an FTS5 table created by
+# migration 0022 and kept current by triggers, with the owner as a 'u<id>'
+# token so a user's search only walks their own postings. Only ever joined
+# from Expense_tbl in search.py; PostgreSQL uses a tsvector column instead.
+class ExpenseSearchEntry(models.Model):
+    expense = models.OneToOneField(Expense_tbl, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                   db_constraint=False, related_name='search_entry')
+    note = models.TextField()
+    owner = models.TextField()
+    rank = models.FloatField()  # FTS5's hidden rank column: bm25 over note only, lower is better
+
+    class Meta:
+        managed = False
+        db_table = 'app_new_expense_fts'
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     fixed_expenses = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     savings_target_percent = models.IntegerField(default=33)
 
+    objects = UserDataQuerySet.as_manager()
+
     def __str__(self):
         return f"Profile for {self.user.username}"
 
+# Registered before create_user_profile, so the user exists on their shard
+# before the profile that points at it is written there.
+@receiver(post_save, sender=User)
+def replicate_user_to_shard(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        replicate_users([instance])
+
+@receiver(post_delete, sender=User)
+def delete_user_from_shard(sender, instance, using, **kwargs):
+    db = db_for_user(instance.pk)
+    if using == DEFAULT_DB_ALIAS and db != using:
+        # cascades to the user's rows on the shard
+        User.objects.using(db).filter(pk=instance.pk).delete()
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+        UserProfile.objects.using(db_for_user(instance.pk)).create(user=instance)
+
+
+# Per-user monthly rollups, maintained by delta from the Expense_tbl/Income
+# signals below. Rebuild from raw rows with `manage.py rebuild_rollups`.
+class MonthlyCategoryRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    month = models.IntegerField()  # 1-12
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'category', 'year', 'month')
+        indexes = [
+            models.Index(fields=['user', 'year', 'month'], name='rollup_user_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.category_id} - {self.year}-{self.month}: {self.spent}"
+
+# Running all-time spend per (user, category), kept by delta like the rollups.
+# Replaces the old Category.total_expense column, which every user overwrote.
+class UserCategoryTotal(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    total_expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'category')
+
+    def __str__(self):
+        return f"{self.user_id} - {self.category_id}: {self.total_expense}"
+
+class MonthlyIncomeRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    month = models.IntegerField()  # 1-12
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'year', 'month')
+
+    def __str__(self):
+        return f"{self.user_id} - {self.year}-{self.month}: {self.total}"
+
+# One row per budget threshold a user's monthly category spend has crossed,
+# written at expense/budget write time by alerts.check_budget_alerts().
+class BudgetAlert(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    month = models.IntegerField()  # 1-12
+    threshold = models.IntegerField()  # percent of the budget: 80 or 100
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    budget = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'year', 'month', 'threshold'],
+                                    name='budget_alert_once_per_threshold'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at'], condition=models.Q(read_at__isnull=True),
+                         name='budget_alert_unread_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.category_id} - {self.year}-{self.month}: {self.threshold}%"
+
+# Rent, EMIs, salaries: a schedule that recurring.materialize_due() turns into
+# real Expense_tbl/Income rows as each occurrence comes due. next_date is the
+# first occurrence not yet materialized.
+class RecurringRule(models.Model):
+    EXPENSE = 'expense'
+    INCOME = 'income'
+    KIND_CHOICES = [(EXPENSE, 'Expense'), (INCOME, 'Income')]
+
+    MONTHLY = 'monthly'
+    WEEKLY = 'weekly'
+    DAYS = 'days'
+    FREQUENCY_CHOICES = [(MONTHLY, 'Every N months'), (WEEKLY, 'Every N weeks'), (DAYS, 'Every N days')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)  # expenses only
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.CharField(max_length=100)  # the expense note / income source
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=MONTHLY)
+    interval = models.PositiveIntegerField(default=1)
+    day_of_month = models.PositiveSmallIntegerField(null=True, blank=True)  # monthly; clamped to short months
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    next_date = models.DateField(null=True, blank=True)  # null once the rule has ended
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_date'], condition=models.Q(next_date__isnull=False),
+                         name='recurring_rule_due_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .recurring import first_occurrence
+        if self.frequency == self.MONTHLY and self.day_of_month is None:
+            self.day_of_month = self.start_date.day
+        if self._state.adding and self.next_date is None:
+            self.next_date = first_occurrence(self)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.kind} {self.amount} {self.frequency}/{self.interval}: {self.description}"
+
+def _saved_values(instance, previous, update_fields):
+    # save(update_fields=[...]) only writes those fields; the rest keep their stored values
+    if not previous or update_fields is None:
+        return {field: getattr(instance, field) for field in instance.rollup_fields}
+    written = {instance._meta.get_field(name).attname for name in update_fields}
+    return {field: getattr(instance, field) if field in written else previous[field]
+            for field in instance.rollup_fields}
+
+# These run inside RolledUpRowMixin's transaction (post_delete inside the
+# Collector's), so a failed delta rolls the row write back with it.
+@receiver(post_save, sender=Expense_tbl)
+def rollup_expense_saved(sender, instance, update_fields, **kwargs):
+    from .rollups import ExpenseDeltas
+    previous = getattr(instance, '_rollup_previous', None)
+    saved = _saved_values(instance, previous, update_fields)
+    # one ExpenseDeltas, so a category move locks the old and new rows in key order, not old-then-new
+    deltas = ExpenseDeltas()
+    if previous:
+        deltas.remove(previous['user_id'], previous['cid_id'], previous['date'], previous['amount'])
+    deltas.add(saved['user_id'], saved['cid_id'], saved['date'], saved['amount'])
+    deltas.apply()
+
+@receiver(post_delete, sender=Expense_tbl)
+def rollup_expense_deleted(sender, instance, **kwargs):
+    from .rollups import apply_expense_delta
+    apply_expense_delta(instance.user_id, instance.cid_id, instance.date, -instance.amount, -1)
+
+@receiver(post_save, sender=Income)
+def rollup_income_saved(sender, instance, update_fields, **kwargs):
+    from .rollups import apply_income_delta
+    previous = getattr(instance, '_rollup_previous', None)
+    saved = _saved_values(instance, previous, update_fields)
+    if previous:
+        apply_income_delta(previous['user_id'], previous['date'], -previous['amount'], -1)
+    apply_income_delta(saved['user_id'], saved['date'], saved['amount'], 1)
+
+@receiver(post_delete, sender=Income)
+def rollup_income_deleted(sender, instance, **kwargs):
+    from .rollups import apply_income_delta
+    apply_income_delta(instance.user_id, instance.date, -instance.amount, -1)
+
+# A new or lowered budget can put the month's existing spend past a threshold.
+@receiver(post_save, sender=BudgetCategoryMonth)
+def check_alerts_on_budget_write(sender, instance, **kwargs):
+    from .alerts import check_budget_alerts
+    check_budget_alerts(instance.uid_id, [(instance.category_id, instance.year, instance.month)])
+
+# Any write to a user's data moves their data version, which retires every
+# cached report/summary for that user (see caching.versioned_cache).
+@receiver([post_save, post_delete], sender=Expense_tbl)
+@receiver([post_save, post_delete], sender=Income)
+@receiver([post_save, post_delete], sender=UserProfile)
+def bump_version_on_user_data_write(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)
+
+# Password changes, deactivation and profile edits retire the cached user that
+# CachedJWTAuthentication serves (see authentication.py). QuerySet.update()
+# skips these signals; bump_auth_version() by hand after bulk updates.
+@receiver([post_save, post_delete], sender=User)
+def bump_auth_version_on_user_write(sender, instance, **kwargs):
+    bump_auth_version(instance.pk)
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def bump_auth_version_on_profile_write(sender, instance, using, **kwargs):
+    bump_auth_version(instance.user_id, using=using)
+
+@receiver([post_save, post_delete], sender=BudgetCategoryMonth)
+def bump_version_on_budget_write(sender, instance, **kwargs):
+    bump_data_version(instance.uid_id)
+
+@receiver([post_save, post_delete], sender=Category)
+def bump_version_on_category_write(sender, instance, **kwargs):
+    bump_category_version()
+
+# Categories are global: written on 'default' and copied to every shard, where
+# expenses, budgets and rollups point at them.
+@receiver(post_save, sender=Category)
+def replicate_category_to_shards(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        replicate_categories(categories=[instance])
+
+@receiver(post_delete, sender=Category)
+def delete_category_from_shards(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        for alias in shard_aliases():
+            if alias != using:
+                Category.objects.using(alias).filter(pk=instance.pk).delete()
@@ -0,0 +1,87 @@
+# backend/app_new/pagination.py
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_DB_INT = 2 ** 63 - 1  # ids, OFFSET and LIMIT are bigint on the database side
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(row_date, row_id):
+    payload = json.dumps({"d": row_date.isoformat(), "i": row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        row_date, row_id = date.fromisoformat(payload["d"]), int(payload["i"])
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError, OverflowError):
+        raise InvalidCursor("Invalid cursor")
+    if not 0 <= row_id <= MAX_DB_INT:
+        raise InvalidCursor("Invalid cursor")
+    return row_date, row_id
+
+
+def get_page_size(request):
+    try:
+        size = int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    Return (rows, next_cursor) for a queryset ordered newest first on (date, id).
+    The cursor points at the last row of the previous page, so each page is an
+    index range scan instead of an OFFSET over everything already seen.
+    """
+    queryset = queryset.order_by('-date', '-id')
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date__lt=last_date) | Q(date=last_date, id__lt=last_id))
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return rows, next_cursor
+
+
+def get_page_number(request):
+    try:
+        page = int(request.query_params.get('page', 1))
+    except (TypeError, ValueError):
+        raise InvalidPage("'page' must be a positive integer")
+    if not 1 <= page <= MAX_DB_INT:
+        raise InvalidPage("'page' must be a positive integer")
+    return page
+
+
+def offset_page(queryset, page, page_size):
+    """
+    Return (rows, next_page) for an already ordered queryset. For orderings with
+    no stable key to seek on, such as search rank; fetches one extra row rather
+    than counting the matches.
+    """
+    start = (page - 1) * page_size
+    if start + page_size + 1 > MAX_DB_INT:
+        raise InvalidPage("'page' is out of range")
+    rows = list(queryset[start:start + page_size + 1])
+    next_page = page + 1 if len(rows) > page_size else None
+    return rows[:page_size], next_page
@@ -0,0 +1,162 @@
+# backend/app_new/recurring.py
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .alerts import check_budget_alerts
+from .caching import bump_data_version
+from .models import Expense_tbl, Income, RecurringRule
+from .rollups import (
+    BATCH_SIZE, ExpenseDeltas, apply_income_delta, rebuild_category_totals, rebuild_expense_rollups,
+    rebuild_income_rollups,
+)
+from .sharding import data_aliases, db_for_user
+
+RULES_PER_CHUNK = 200
+# A user whose occurrences in one chunk touch more months than this (a backlog)
+# has their rollups rebuilt from raw rows instead of updated one key at a time.
+REBUILD_AFTER_MONTHS = 24
+
+
+def _add_months(year, month, months):
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def _day_in_month(year, month, day_of_month):
+    # the 31st of a rule falls on the 30th, 29th or 28th in shorter months
+    return date(year, month, min(day_of_month, calendar.monthrange(year, month)[1]))
+
+
+def _until_end(rule, day):
+    return day if rule.end_date is None or day <= rule.end_date else None
+
+
+def first_occurrence(rule):
+    """The rule's first date on or after start_date, or None if it ends before then."""
+    start = rule.start_date
+    if rule.frequency == RecurringRule.MONTHLY:
+        day = _day_in_month(start.year, start.month, rule.day_of_month)
+        if day < start:
+            day = _day_in_month(*_add_months(start.year, start.month, rule.interval), rule.day_of_month)
+        return _until_end(rule, day)
+    return _until_end(rule, start)
+
+
+def next_occurrence(rule, day):
+    """The occurrence after `day`, or None once the rule has ended."""
+    if rule.frequency == RecurringRule.MONTHLY:
+        day = _day_in_month(*_add_months(day.year, day.month, rule.interval), rule.day_of_month)
+    elif rule.frequency == RecurringRule.WEEKLY:
+        day += timedelta(weeks=rule.interval)
+    else:
+        day += timedelta(days=rule.interval)
+    return _until_end(rule, day)
+
+
+def _due(rules, until, existing):
+    """(rule, date) for every occurrence up to `until`, moving each rule's next_date past them."""
+    for rule in rules:
+        day = rule.next_date
+        while day is not None and day <= until:
+            if (rule.pk, day) not in existing:
+                yield rule, day
+            day = next_occurrence(rule, day)
+        rule.next_date = day
+
+
+def _materialize(db, rules, until, batch_size):
+    # Rows a rule already has from next_date on: only there if next_date was moved back by hand.
+    existing = set()
+    for model, kind in ((Expense_tbl, RecurringRule.EXPENSE), (Income, RecurringRule.INCOME)):
+        kind_rules = [rule for rule in rules if rule.kind == kind]
+        if kind_rules:
+            existing.update(model.objects.using(db).filter(
+                recurring_rule__in=kind_rules, date__gte=min(rule.next_date for rule in kind_rules),
+            ).values_list('recurring_rule_id', 'date'))
+
+    expense_deltas = defaultdict(ExpenseDeltas)  # per user
+    income_deltas = defaultdict(lambda: defaultdict(lambda: [Decimal('0'), 0]))  # per user, by (year, month)
+    created = {'expenses': 0, 'incomes': 0}
+    occurrences = _due(rules, until, existing)
+    while batch := list(islice(occurrences, batch_size)):
+        expenses, incomes = [], []
+        for rule, day in batch:
+            if rule.kind == RecurringRule.EXPENSE:
+                expenses.append(Expense_tbl(user_id=rule.user_id, cid_id=rule.category_id, amount=rule.amount,
+                                            date=day, note=rule.description, recurring_rule=rule))
+                expense_deltas[rule.user_id].add(rule.user_id, rule.category_id, day, rule.amount)
+            else:
+                incomes.append(Income(user_id=rule.user_id, amount=rule.amount, source=rule.description,
+                                      date=day, recurring_rule=rule))
+                bucket = income_deltas[rule.user_id][(day.year, day.month)]
+                bucket[0] += rule.amount
+                bucket[1] += 1
+        # Only materialize_due writes (rule, date) rows, and it holds the rules' row locks, so
+        # after filtering out `existing` every row here is new. No ignore_conflicts: silently
+        # skipped rows would still be counted and added to the rollups. If the (rule, date)
+        # constraints are ever hit, the IntegrityError rolls back the whole chunk instead.
+        Expense_tbl.objects.using(db).bulk_create(expenses)
+        Income.objects.using(db).bulk_create(incomes)
+        created['expenses'] += len(expenses)
+        created['incomes'] += len(incomes)
+
+    RecurringRule.objects.using(db).bulk_update(rules, ['next_date'])
+    _update_derived(db, expense_deltas, income_deltas)
+    return created
+
+
+def _update_derived(db, expense_deltas, income_deltas):
+    # bulk_create skips the signals that maintain rollups, alerts and cached responses
+    users = expense_deltas.keys() | income_deltas.keys()
+    backlog = [user_id for user_id in users
+               if len(expense_deltas[user_id].monthly) + len(income_deltas[user_id]) > REBUILD_AFTER_MONTHS]
+    if backlog:
+        rebuild_expense_rollups(backlog, using=db)
+        rebuild_category_totals(backlog, using=db)
+        rebuild_income_rollups(backlog, using=db)
+    for user_id in users:
+        if user_id in backlog:
+            check_budget_alerts(user_id, [key[1:] for key in expense_deltas[user_id].monthly])
+        else:
+            expense_deltas[user_id].apply()  # checks budget alerts too
+            for (year, month), (amount, count) in income_deltas[user_id].items():
+                apply_income_delta(user_id, date(year, month, 1), amount, count)
+        bump_data_version(user_id)
+
+
+def materialize_due(until=None, user_id=None, batch_size=BATCH_SIZE, rules_per_chunk=RULES_PER_CHUNK):
+    """
+    Write every occurrence of every rule (or one user's rules) due on or before
+    `until` (default today) as Expense_tbl/Income rows, and move the rules'
+    next_date past them. Rules are read in primary-key chunks of
+    `rules_per_chunk`, each chunk committed in one transaction with its rows
+    bulk-inserted `batch_size` at a time, so a backlog of years for every user
+    runs in bounded memory and a crash loses at most the current chunk. Users
+    catching up on many months get their rollups rebuilt rather than updated
+    per month, so run large backfills off-peak. Reruns find nothing due; a
+    concurrent run skips the rules this one has locked.
+    Returns {'rules': ..., 'expenses': ..., 'incomes': ...} counts.
+    """
+    until = until or timezone.localdate()
+    totals = {'rules': 0, 'expenses': 0, 'incomes': 0}
+    for db in [db_for_user(user_id)] if user_id is not None else data_aliases():
+        last_pk = 0
+        while True:
+            with transaction.atomic(using=db):
+                due = RecurringRule.objects.using(db).filter(next_date__lte=until, pk__gt=last_pk)
+                if user_id is not None:
+                    due = due.filter(user_id=user_id)
+                rules = list(due.select_for_update(skip_locked=True).order_by('pk')[:rules_per_chunk])
+                if not rules:
+                    break
+                last_pk = rules[-1].pk
+                for key, count in _materialize(db, rules, until, batch_size).items():
+                    totals[key] += count
+                totals['rules'] += len(rules)
+    return totals
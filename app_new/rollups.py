@@ -0,0 +1,191 @@
+# backend/app_new/rollups.py
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .alerts import check_budget_alerts
+from .caching import bump_data_version
+from .models import Expense_tbl, Income, MonthlyCategoryRollup, MonthlyIncomeRollup, UserCategoryTotal
+from .sharding import data_aliases, db_for_user
+
+BATCH_SIZE = 1000
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _bump(model, keys, amount_field, amount, count):
+    """Add (amount, count) to one rollup row with F() so concurrent writers never lose updates."""
+    db = db_for_user(keys['user_id'])
+    updates = {
+        amount_field: F(amount_field) + amount,
+        'transaction_count': F('transaction_count') + count,
+    }
+    if model.objects.using(db).filter(**keys).update(**updates):
+        return
+    if count < 0:
+        # Nothing stored to take away from (e.g. the owning user or category is being deleted).
+        return
+    try:
+        with transaction.atomic(using=db):
+            model.objects.using(db).create(**keys, **{amount_field: amount, 'transaction_count': count})
+    except IntegrityError:
+        # Another writer created the row first; fall back to the update.
+        model.objects.using(db).filter(**keys).update(**updates)
+
+
+def apply_expense_delta(user_id, category_id, day, amount, count):
+    """Move one expense's amount into (or out of) its monthly rollup and the user's category total."""
+    day = _as_date(day)
+    amount = Decimal(str(amount))
+    keys = {'user_id': user_id, 'category_id': category_id}
+    _bump(UserCategoryTotal, keys, 'total_expense', amount, count)
+    _bump(MonthlyCategoryRollup, {**keys, 'year': day.year, 'month': day.month}, 'spent', amount, count)
+    if amount > 0:
+        check_budget_alerts(user_id, [(category_id, day.year, day.month)])
+
+
+def apply_income_delta(user_id, day, amount, count):
+    day = _as_date(day)
+    keys = {'user_id': user_id, 'year': day.year, 'month': day.month}
+    _bump(MonthlyIncomeRollup, keys, 'total', Decimal(str(amount)), count)
+
+
+class ExpenseDeltas:
+    """
+    Collects expense changes from bulk writes (which skip model signals) so the
+    derived tables get one F() update per touched key instead of one per row.
+    apply() locks rows in one fixed order, category totals then monthly rows,
+    each sorted by key, so writers moving expenses between the same categories
+    in opposite directions can't deadlock.
+    """
+
+    def __init__(self):
+        self.monthly = defaultdict(lambda: [Decimal('0'), 0])
+        self.totals = defaultdict(lambda: [Decimal('0'), 0])
+
+    def add(self, user_id, category_id, day, amount, count=1):
+        day = _as_date(day)
+        amount = Decimal(str(amount))
+        for bucket in (self.monthly[(user_id, category_id, day.year, day.month)], self.totals[(user_id, category_id)]):
+            bucket[0] += amount
+            bucket[1] += count
+
+    def remove(self, user_id, category_id, day, amount):
+        self.add(user_id, category_id, day, -Decimal(str(amount)), -1)
+
+    def apply(self):
+        with ExitStack() as stack:
+            for db in sorted({db_for_user(user_id) for user_id, _ in self.totals}):
+                stack.enter_context(transaction.atomic(using=db))
+            for (user_id, category_id), (amount, count) in sorted(self.totals.items()):
+                if not (amount or count):
+                    continue
+                _bump(UserCategoryTotal, {'user_id': user_id, 'category_id': category_id},
+                      'total_expense', amount, count)
+            for (user_id, category_id, year, month), (amount, count) in sorted(self.monthly.items()):
+                if not (amount or count):
+                    continue
+                _bump(MonthlyCategoryRollup,
+                      {'user_id': user_id, 'category_id': category_id, 'year': year, 'month': month},
+                      'spent', amount, count)
+            grown = defaultdict(set)
+            for (user_id, category_id, year, month), (amount, _) in self.monthly.items():
+                if amount > 0:
+                    grown[user_id].add((category_id, year, month))
+            for user_id, keys in grown.items():
+                check_budget_alerts(user_id, keys)
+            # bulk writes skip the model signals, so retire cached responses here
+            for user_id in {user_id for user_id, _ in self.totals}:
+                bump_data_version(user_id)
+
+
+def bulk_insert(model, objs, batch_size=BATCH_SIZE, using=None):
+    """bulk_create from an iterable in fixed-size batches, so memory stays bounded."""
+    objs = iter(objs)
+    created = 0
+    while batch := list(islice(objs, batch_size)):
+        model.objects.db_manager(using).bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def _scope(queryset, user_ids):
+    return queryset if user_ids is None else queryset.filter(user_id__in=user_ids)
+
+
+def _aliases(using):
+    # every shard holds its own users' raw rows and derived tables
+    return [using] if using else data_aliases()
+
+
+def rebuild_expense_rollups(user_ids=None, using=None):
+    """Regenerate MonthlyCategoryRollup from raw Expense_tbl rows (all users, or only `user_ids`)."""
+    created = 0
+    for db in _aliases(using):
+        grouped = _scope(Expense_tbl.objects.using(db), user_ids).annotate(
+            year=ExtractYear('date'), month=ExtractMonth('date'),
+        ).values('user_id', 'cid_id', 'year', 'month').annotate(
+            spent=Sum('amount'), transaction_count=Count('id'),
+        ).order_by()
+
+        with transaction.atomic(using=db):
+            _scope(MonthlyCategoryRollup.objects.using(db), user_ids).delete()
+            created += bulk_insert(MonthlyCategoryRollup, (
+                MonthlyCategoryRollup(
+                    user_id=row['user_id'], category_id=row['cid_id'],
+                    year=row['year'], month=row['month'],
+                    spent=row['spent'], transaction_count=row['transaction_count'],
+                )
+                for row in grouped.iterator(chunk_size=BATCH_SIZE)
+            ), using=db)
+    return created
+
+
+def rebuild_income_rollups(user_ids=None, using=None):
+    """Regenerate MonthlyIncomeRollup from raw Income rows (all users, or only `user_ids`)."""
+    created = 0
+    for db in _aliases(using):
+        grouped = _scope(Income.objects.using(db), user_ids).annotate(
+            year=ExtractYear('date'), month=ExtractMonth('date'),
+        ).values('user_id', 'year', 'month').annotate(
+            total=Sum('amount'), transaction_count=Count('id'),
+        ).order_by()
+
+        with transaction.atomic(using=db):
+            _scope(MonthlyIncomeRollup.objects.using(db), user_ids).delete()
+            created += bulk_insert(MonthlyIncomeRollup, (
+                MonthlyIncomeRollup(
+                    user_id=row['user_id'], year=row['year'], month=row['month'],
+                    total=row['total'], transaction_count=row['transaction_count'],
+                )
+                for row in grouped.iterator(chunk_size=BATCH_SIZE)
+            ), using=db)
+    return created
+
+
+def rebuild_category_totals(user_ids=None, using=None):
+    """Regenerate UserCategoryTotal from raw Expense_tbl rows (all users, or only `user_ids`)."""
+    created = 0
+    for db in _aliases(using):
+        grouped = _scope(Expense_tbl.objects.using(db), user_ids).values('user_id', 'cid_id').annotate(
+            total_expense=Sum('amount'), transaction_count=Count('id'),
+        ).order_by()
+
+        with transaction.atomic(using=db):
+            _scope(UserCategoryTotal.objects.using(db), user_ids).delete()
+            created += bulk_insert(UserCategoryTotal, (
+                UserCategoryTotal(
+                    user_id=row['user_id'], category_id=row['cid_id'],
+                    total_expense=row['total_expense'], transaction_count=row['transaction_count'],
+                )
+                for row in grouped.iterator(chunk_size=BATCH_SIZE)
+            ), using=db)
+    return created
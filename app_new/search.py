@@ -0,0 +1,72 @@
+# backend/app_new/search.py
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Expense_tbl
+
+MAX_TERMS = 8
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'app_new_expense_fts'  # SQLite, see migrations/0022_expense_note_search.py
+
+_WORD = re.compile(r'\w+')
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def search_terms(text):
+    """The words of a user's query; punctuation and search operators are dropped."""
+    return _WORD.findall(text or '')[:MAX_TERMS]
+
+
+def _postgres(queryset, terms, user_id):
+    # the (user_id, note_search) GIN index serves the user filter the caller applied
+    vector = f'"{Expense_tbl._meta.db_table}"."note_search"'
+    tsquery = "plainto_tsquery(%s, %s)"
+    params = [SEARCH_CONFIG, ' '.join(terms)]
+    return queryset.filter(
+        RawSQL(f"{vector} @@ {tsquery}", params, output_field=BooleanField())
+    ).annotate(
+        rank=RawSQL(f"ts_rank({vector}, {tsquery})", params, output_field=FloatField())
+    )
+
+
+def _sqlite(queryset, terms, user_id):
+    # every word as a quoted FTS5 string, so user input can't form query syntax
+    match = 'note : (%s)' % ' '.join(f'"{term}"' for term in terms)
+    if user_id is not None:
+        match = f'owner : "u{int(user_id)}" AND {match}'
+    return queryset.filter(
+        RawSQL(f'"{FTS_TABLE}" MATCH %s', [match], output_field=BooleanField()),
+        search_entry__isnull=False,  # joins the FTS table the MATCH above refers to
+    ).annotate(
+        # FTS5's rank is bm25, lower-is-better; negate it so it sorts like ts_rank
+        rank=-F('search_entry__rank'),
+    )
+
+
+def _unindexed(queryset, terms, user_id):
+    condition = Q()
+    for term in terms:
+        condition &= Q(note__icontains=term)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def search_expenses(queryset, text, user_id=None):
+    """
+    Narrow an Expense_tbl queryset to rows whose note contains every word of
+    `text`, annotated with `rank` (higher is better) and ordered best match
+    first, newest first among equals. Pass the user the queryset is already
+    filtered to as `user_id`, so the index only looks at their notes. Uses the
+    full-text index on PostgreSQL and SQLite, and an icontains scan elsewhere.
+    """
+    terms = search_terms(text)
+    if not terms:
+        raise InvalidSearch("'q' must contain at least one word")
+    vendor = connections[queryset.db].vendor
+    search = {'postgresql': _postgres, 'sqlite': _sqlite}.get(vendor, _unindexed)
+    return search(queryset, terms, user_id).order_by('-rank', '-date', '-id')
@@ -1,10 +1,14 @@
 # backend/app_new/serializers.py
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Income, Expense_tbl, Category, BudgetCategoryMonth, UserProfile
+from .models import (
+    Income, Expense_tbl, Category, BudgetAlert, BudgetCategoryMonth, RecurringRule, UserProfile, UserCategoryTotal,
+)
+from .category_cache import category_id_for_name, get_category
 from django.db.models import Sum
 from django.utils import timezone
 from decimal import Decimal
+from .dates import month_filter
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -21,7 +25,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 class IncomeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Income
-        fields = ['id', 'amount', 'source', 'date']
+        fields = ['id', 'amount', 'source', 'date', 'recurring_rule']
+        read_only_fields = ['recurring_rule']
 
 
 class ExpenseTblSerializer(serializers.ModelSerializer):
@@ -31,29 +36,38 @@ class ExpenseTblSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Expense_tbl
-        fields = ['id', 'amount', 'cid', 'category_id', 'category_name', 'date', 'note']
+        fields = ['id', 'amount', 'cid', 'category_id', 'category_name', 'date', 'note', 'recurring_rule']
+        read_only_fields = ['recurring_rule']
 
     def create(self, validated_data):
         category_id = validated_data.pop('cid')
         user = self.context['request'].user
-        category = Category.objects.get(id=category_id)
+        category = self._category(category_id)
         expense = Expense_tbl.objects.create(user=user, cid=category, **validated_data)
         return expense
 
     def update(self, instance, validated_data):
         if 'cid' in validated_data:
             category_id = validated_data.pop('cid')
-            instance.cid = Category.objects.get(id=category_id)
+            instance.cid = self._category(category_id)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
         return instance
 
+    @staticmethod
+    def _category(category_id):
+        category = get_category(category_id)
+        if category is None:
+            raise serializers.ValidationError({'cid': f"Category {category_id} does not exist."})
+        return category
+
 
 # THIS IS THE ONE YOU NEED — DO NOT DELETE
 # backend/app_new/serializers.py
 
 class CategoryWithMonthlyBudgetSerializer(serializers.ModelSerializer):
+    total_expense = serializers.SerializerMethodField()
     budget = serializers.SerializerMethodField()
     spent = serializers.SerializerMethodField()
     remaining = serializers.SerializerMethodField()
@@ -66,10 +80,29 @@ class CategoryWithMonthlyBudgetSerializer(serializers.ModelSerializer):
             'total_expense', 'budget', 'spent', 'remaining', 'transaction_count'
         ]
 
+    # Listings should come from Category.objects.with_monthly_budget(); the
+    # per-row queries below are only a fallback for un-annotated instances.
+    def _selected_month(self):
+        year = self.context.get('selected_year', timezone.now().year)
+        month = self.context.get('selected_month', timezone.now().month)
+        return year, month
+
+    def get_total_expense(self, obj):
+        # The user's all-time spend in this category, as a 2dp string like the old model field
+        if hasattr(obj, 'user_total_expense'):
+            total = obj.user_total_expense
+        else:
+            user = self.context['request'].user
+            total = UserCategoryTotal.objects.filter(user=user, category=obj).values_list(
+                'total_expense', flat=True
+            ).first() or Decimal('0')
+        return str(Decimal(total).quantize(Decimal('0.01')))
+
     def get_budget(self, obj):
+       if hasattr(obj, 'monthly_budget'):
+          return float(obj.monthly_budget)
        user = self.context['request'].user
-       year = self.context.get('selected_year', timezone.now().year)
-       month = self.context.get('selected_month', timezone.now().month)
+       year, month = self._selected_month()
        try:
           budget_obj = BudgetCategoryMonth.objects.get(
             uid=user, category=obj, year=year, month=month
@@ -79,26 +112,29 @@ class CategoryWithMonthlyBudgetSerializer(serializers.ModelSerializer):
          return 0.0
 
     def get_spent(self, obj):
+      if hasattr(obj, 'monthly_spent'):
+        return float(obj.monthly_spent)
       user = self.context['request'].user
-      year = self.context.get('selected_year', timezone.now().year)
-      month = self.context.get('selected_month', timezone.now().month)
+      year, month = self._selected_month()
       total = Expense_tbl.objects.filter(
-        user=user, cid=obj,
-        date__year=year, date__month=month
+        user=user, cid=obj, **month_filter(year, month)
       ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
       return float(total)
 
     def get_remaining(self, obj):
+        if hasattr(obj, 'monthly_remaining'):
+            return float(obj.monthly_remaining)
         return self.get_budget(obj) - self.get_spent(obj)
 
     def get_transaction_count(self, obj):
+        if hasattr(obj, 'monthly_transaction_count'):
+            return obj.monthly_transaction_count
         user = self.context['request'].user
-        today = timezone.now()
+        year, month = self._selected_month()
         return Expense_tbl.objects.filter(
             user=user,
             cid=obj,
-            date__year=today.year,
-            date__month=today.month
+            **month_filter(year, month)
         ).count()
 
 
@@ -108,7 +144,7 @@ class CategoryCreateSerializer(serializers.ModelSerializer):
         fields = ['name', 'description']
 
     def validate_name(self, value):
-        if Category.objects.filter(name__iexact=value).exists():
+        if category_id_for_name(value) is not None:
             raise serializers.ValidationError("Category with this name already exists.")
         return value
 
@@ -116,4 +152,55 @@ class CategoryCreateSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
-        fields = ['fixed_expenses', 'savings_target_percent']
\ No newline at end of file
+        fields = ['fixed_expenses', 'savings_target_percent']
+
+
+class BudgetAlertSerializer(serializers.ModelSerializer):
+    category_name = serializers.SerializerMethodField()
+    percent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BudgetAlert
+        fields = ['id', 'category', 'category_name', 'year', 'month', 'threshold',
+                  'spent', 'budget', 'percent', 'created_at']
+
+    def get_category_name(self, obj):
+        category = get_category(obj.category_id)
+        return category.name if category else None
+
+    def get_percent(self, obj):
+        # spend as a share of the budget when the alert fired
+        return round(float(obj.spent * 100 / obj.budget), 1)
+
+
+class RecurringRuleSerializer(serializers.ModelSerializer):
+    category = serializers.IntegerField(source='category_id', required=False, allow_null=True)
+    category_name = serializers.SerializerMethodField()
+    interval = serializers.IntegerField(min_value=1, max_value=366, required=False)
+    day_of_month = serializers.IntegerField(min_value=1, max_value=31, required=False, allow_null=True)
+
+    class Meta:
+        model = RecurringRule
+        fields = ['id', 'kind', 'category', 'category_name', 'amount', 'description', 'frequency', 'interval',
+                  'day_of_month', 'start_date', 'end_date', 'next_date']
+        read_only_fields = ['next_date']
+
+    def get_category_name(self, obj):
+        category = get_category(obj.category_id) if obj.category_id else None
+        return category.name if category else None
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be positive.")
+        return value
+
+    def validate(self, attrs):
+        category_id = attrs.get('category_id')
+        if attrs['kind'] == RecurringRule.EXPENSE:
+            if category_id is None or get_category(category_id) is None:
+                raise serializers.ValidationError({'category': "Expense rules need an existing category."})
+        elif category_id is not None:
+            raise serializers.ValidationError({'category': "Income rules have no category."})
+        if attrs.get('end_date') and attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError({'end_date': "End date is before the start date."})
+        return attrs
@@ -0,0 +1,328 @@
+# backend/app_new/sharding.py
+import bisect
+import contextvars
+import hashlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+
+VIRTUAL_NODES = 128
+
+# Per-user tables, with the attribute holding the owning user's id. Everything
+# else (User, Category, auth, sessions, ...) stays global on 'default'.
+SHARDED_MODELS = {
+    'app_new.userprofile': 'user_id',
+    'app_new.budgetcategorymonth': 'uid_id',
+    'app_new.recurringrule': 'user_id',  # before the expenses and income that point at it
+    'app_new.expense_tbl': 'user_id',
+    'app_new.income': 'user_id',
+    'app_new.monthlycategoryrollup': 'user_id',
+    'app_new.usercategorytotal': 'user_id',
+    'app_new.monthlyincomerollup': 'user_id',
+    'app_new.budgetalert': 'user_id',
+}
+# Derived from the raw rows; move_user() rebuilds these on the target instead of copying them.
+DERIVED_MODELS = {'app_new.monthlycategoryrollup', 'app_new.usercategorytotal', 'app_new.monthlyincomerollup'}
+
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent-hash ring: every node owns VIRTUAL_NODES points on a 64-bit
+    circle and a key belongs to the first point at or after its own hash.
+    Adding a node only takes over keys from its new neighbours (about 1/N of
+    them), instead of reshuffling everyone as `hash % N` would.
+    """
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        points = sorted((_hash(f'{node}#{i}'), node) for node in nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect_left(self._hashes, _hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+
+@lru_cache(maxsize=8)
+def _ring(shards):
+    return HashRing(shards)
+
+
+def shard_aliases():
+    """settings.DATABASE_SHARDS; empty when sharding is off."""
+    return list(getattr(settings, 'DATABASE_SHARDS', []))
+
+
+def data_aliases():
+    """Every database holding per-user rows."""
+    return shard_aliases() or [DEFAULT_DB_ALIAS]
+
+
+def shard_for(user_id, shards=None):
+    """The alias that owns this user's rows, or None when sharding is off."""
+    shards = tuple(shards if shards is not None else shard_aliases())
+    return _ring(shards).node_for(user_id) if shards else None
+
+
+def db_for_user(user_id):
+    """Like shard_for(), but 'default' when sharding is off: for transaction.atomic(using=...)."""
+    return shard_for(user_id) or DEFAULT_DB_ALIAS
+
+
+def sharded_models(include_derived=True):
+    models = []
+    for label, attname in SHARDED_MODELS.items():
+        if include_derived or label not in DERIVED_MODELS:
+            models.append((apps.get_model(label), attname))
+    return models
+
+
+@contextmanager
+def on_shard(alias):
+    """Send queries on sharded models that carry no instance hint to `alias`."""
+    token = _current_shard.set(alias)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def user_shard(user_id):
+    return on_shard(shard_for(user_id))
+
+
+def activate_user_shard(user_id):
+    """
+    Route the rest of this request's unhinted queries (`Expense_tbl.objects.filter(user=...)`)
+    to the user's shard. Called once authentication has resolved the user;
+    ShardMiddleware clears it when the request ends.
+    """
+    _current_shard.set(shard_for(user_id))
+
+
+def delete_rows(queryset):
+    """
+    Delete the queryset's rows with a single DELETE on its database: no rows
+    are loaded, and no delete() methods, pre/post_delete signals or Python-side
+    cascades run. Only for callers that account for the rows themselves, such
+    as rollup deltas or rebuilds. Returns the number of rows deleted.
+    """
+    # QuerySet.delete() has to fetch every row to send the rollup signals, which
+    # the callers would then have to undo. _raw_delete is the private
+    # single-statement path Django's own fast delete uses; keep it behind this helper.
+    return queryset._raw_delete(queryset.db)
+
+
+class ShardMiddleware:
+    """Scope activate_user_shard() to a single request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_shard.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_shard.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_shard.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_shard.reset(token)
+
+
+def _hinted_user_id(instance):
+    if instance is None:
+        return None
+    if isinstance(instance, apps.get_model(settings.AUTH_USER_MODEL)):
+        return instance.pk
+    attname = SHARDED_MODELS.get(instance._meta.label_lower)
+    return getattr(instance, attname) if attname else None
+
+
+class ShardRouter:
+    """
+    Routes the per-user tables in SHARDED_MODELS to the shard that owns the
+    user: by the instance hint when Django gives one (saves, related managers),
+    otherwise by the shard activated for the current request or on_shard()
+    block. Other models fall through to the next router. With
+    settings.DATABASE_SHARDS empty this router changes nothing.
+    """
+
+    def _db(self, model, hints):
+        if model._meta.label_lower not in SHARDED_MODELS or not shard_aliases():
+            return None
+        user_id = _hinted_user_id(hints.get('instance'))
+        if user_id is not None:
+            return shard_for(user_id)
+        return _current_shard.get()
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Users and categories are copied to every shard, so an expense on a
+        # shard may point at a User or Category loaded from 'default'.
+        shards = shard_aliases()
+        if shards and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, *shards}:
+            return True
+        return None
+
+
+def copy_rows(model, objs, alias):
+    """Upsert `objs` by primary key into `alias`, keeping their ids. No signals are sent."""
+    fields = model._meta.concrete_fields
+    rows = [model(**{field.attname: getattr(obj, field.attname) for field in fields}) for obj in objs]
+    if rows:
+        model.objects.using(alias).bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=[field.name for field in fields if not field.primary_key],
+        )
+    return len(rows)
+
+
+def replicate_categories(aliases=None, categories=None):
+    """Copy Category rows (all of them by default) from 'default' to every shard."""
+    Category = apps.get_model('app_new', 'Category')
+    if categories is None:
+        categories = list(Category.objects.using(DEFAULT_DB_ALIAS))
+    for alias in aliases if aliases is not None else shard_aliases():
+        if alias != DEFAULT_DB_ALIAS:
+            copy_rows(Category, categories, alias)
+
+
+def replicate_users(users, shards=None):
+    """Copy User rows to the shard that owns each of them, so their foreign keys hold there."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    by_shard = {}
+    for user in users:
+        by_shard.setdefault(shard_for(user.pk, shards), []).append(user)
+    for alias, rows in by_shard.items():
+        if alias not in (None, DEFAULT_DB_ALIAS):
+            copy_rows(User, rows, alias)
+
+
+def _reset_sequences(alias, models):
+    # Rows copied with their ids don't move a Postgres sequence along.
+    connection = connections[alias]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+class ShardMoveError(Exception):
+    pass
+
+
+def _copy_batch(model, rows, alias, new_ids):
+    model.objects.using(alias).bulk_create(rows)
+    for row in rows:
+        if hasattr(row, '_source_pk'):
+            new_ids[row._source_pk] = row.pk
+    return len(rows)
+
+
+def move_user(user_id, source, target, renumber=False, batch_size=1000):
+    """
+    Move one user's rows from `source` to `target`: copy profile, budgets,
+    recurring rules, expenses, income and alerts in one transaction on the
+    target, rebuild the user's rollups there, then delete everything of theirs
+    on the source. Ids are kept unless `renumber` (which points expenses and
+    income at their rules' new ids); a clash raises ShardMoveError and leaves both sides as
+    they were. The target must not hold data for the user yet, apart from an
+    auto-created profile, which the source one replaces. Returns {label: rows copied}.
+
+    Writes for the user that land on `source` while this runs are lost with the
+    source rows, so move users in a maintenance window (see README).
+    """
+    from .caching import bump_auth_version, bump_data_version
+    from .rollups import rebuild_category_totals, rebuild_expense_rollups, rebuild_income_rollups
+
+    if source == target:
+        raise ShardMoveError(f"User {user_id} is already on {target}")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    user = User.objects.using(DEFAULT_DB_ALIAS).get(pk=user_id)
+    raw_models = sharded_models(include_derived=False)
+    for model, attname in raw_models:
+        if model._meta.label_lower == 'app_new.userprofile':
+            continue
+        if model.objects.using(target).filter(**{attname: user_id}).exists():
+            raise ShardMoveError(f"{target} already holds {model.__name__} rows for user {user_id}")
+
+    copied = {}
+    renumbered = {}  # model -> {source pk: target pk}, so later rows' foreign keys follow
+    if target != DEFAULT_DB_ALIAS:
+        copy_rows(User, [user], target)
+        replicate_categories([target])
+    try:
+        with transaction.atomic(using=target):
+            for model, attname in raw_models:
+                source_rows = model.objects.using(source).filter(**{attname: user_id}).order_by('pk')
+                if model._meta.label_lower == 'app_new.userprofile' and source_rows.exists():
+                    delete_rows(model.objects.using(target).filter(**{attname: user_id}))
+                remapped = [field for field in model._meta.concrete_fields
+                            if field.is_relation and field.related_model in renumbered]
+                new_ids = {}
+                if renumber:
+                    renumbered[model] = new_ids
+                count = 0
+                batch = []
+                for row in source_rows.iterator(chunk_size=batch_size):
+                    for field in remapped:
+                        old_id = getattr(row, field.attname)
+                        if old_id is not None:
+                            setattr(row, field.attname, renumbered[field.related_model][old_id])
+                    if renumber:
+                        row._source_pk, row.pk = row.pk, None
+                    batch.append(row)
+                    if len(batch) == batch_size:
+                        count += _copy_batch(model, batch, target, new_ids)
+                        batch = []
+                if batch:
+                    count += _copy_batch(model, batch, target, new_ids)
+                copied[model._meta.label] = count
+            if not renumber:
+                _reset_sequences(target, [model for model, _ in raw_models])
+            rebuild_expense_rollups([user_id], using=target)
+            rebuild_income_rollups([user_id], using=target)
+            rebuild_category_totals([user_id], using=target)
+    except IntegrityError as e:
+        raise ShardMoveError(f"Copying user {user_id} to {target} failed ({e}); retry with --renumber") from e
+
+    with transaction.atomic(using=source):
+        for model, attname in sharded_models():
+            # raw delete: the rows live on in `target`, so no rollup deltas or signals are wanted
+            delete_rows(model.objects.using(source).filter(**{attname: user_id}))
+    bump_data_version(user_id)
+    bump_auth_version(user_id)
+    return copied
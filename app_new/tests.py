@@ -1,3 +1,1524 @@
-from django.test import TestCase
+import base64
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from io import StringIO
+from datetime import MAXYEAR, MINYEAR, date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections, connection
+from django.db.models import Max, Sum
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import batch, category_cache, db_routers, recurring
+from .authentication import get_profile, user_cache_timeout
+from .caching import bump_category_version, cache_stats
+from .checks import check_shared_cache
+from .views import CategoryView, category_list_with_budget, get_categories
+from .db_routers import ReplicaRouter
+from .dates import month_filter, month_window
+from .logutils import DebugSampleFilter, JsonFormatter, RequestContextFilter
+from .metrics import reset_metrics
+from .models import (
+    BudgetAlert, BudgetCategoryMonth, Category, Expense_tbl, Income, MonthlyCategoryRollup, MonthlyIncomeRollup, UserCategoryTotal,
+    RecurringRule, UserProfile,
+)
+from .recurring import materialize_due
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .rollups import rebuild_category_totals, rebuild_expense_rollups
+from .sharding import HashRing, ShardRouter, move_user, shard_for
+
+
+class MonthWindowTests(TestCase):
+    def test_month_window_is_half_open(self):
+        self.assertEqual(month_window(2025, 2), (date(2025, 2, 1), date(2025, 3, 1)))
+        self.assertEqual(month_window(2025, 12), (date(2025, 12, 1), date(2026, 1, 1)))
+
+    def test_month_filter_matches_calendar_month(self):
+        user = User.objects.create_user(username='window', password='pw')
+        category = Category.objects.create(name='Window')
+        for day in (date(2025, 1, 31), date(2025, 2, 1), date(2025, 2, 28), date(2025, 3, 1)):
+            Expense_tbl.objects.create(user=user, cid=category, amount=1, date=day)
+        self.assertEqual(Expense_tbl.objects.filter(user=user, **month_filter(2025, 2)).count(), 2)
+
+
+class MonthIndexExplainTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='explain', password='pw')
+        self.category = Category.objects.create(name='Explain')
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be seq-scanned.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_expense_month_query_uses_user_date_index(self):
+        qs = Expense_tbl.objects.filter(user=self.user, **month_filter(2025, 6)).values('amount')
+        self.assertUsesIndex(qs, 'expense_user_date_idx')
+
+    def test_expense_category_month_query_uses_user_cid_date_index(self):
+        qs = Expense_tbl.objects.filter(user=self.user, cid=self.category, **month_filter(2025, 6)).values('amount')
+        self.assertUsesIndex(qs, 'expense_user_cid_date_idx')
+
+    def test_income_month_query_uses_user_date_index(self):
+        qs = Income.objects.filter(user=self.user, **month_filter(2025, 6)).values('amount')
+        self.assertUsesIndex(qs, 'income_user_date_idx')
+
+
+class MonthlyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rollup', password='pw')
+        self.food = Category.objects.create(name='Rollup Food')
+        self.travel = Category.objects.create(name='Rollup Travel')
+
+    def rollups(self):
+        return sorted(
+            MonthlyCategoryRollup.objects.filter(user=self.user, transaction_count__gt=0)
+            .values_list('category_id', 'year', 'month', 'spent', 'transaction_count')
+        )
+
+    def test_moves_between_categories_and_months_match_rebuild(self):
+        expense = Expense_tbl.objects.create(user=self.user, cid=self.food, amount=10, date=date(2025, 3, 5))
+        Expense_tbl.objects.create(user=self.user, cid=self.food, amount=5, date=date(2025, 3, 6))
+        expense.cid = self.travel
+        expense.date = date(2025, 4, 1)
+        expense.amount = 7
+        expense.save()
+        incremental = self.rollups()
+
+        self.assertEqual(incremental, [
+            (self.food.id, 2025, 3, Decimal('5.00'), 1),
+            (self.travel.id, 2025, 4, Decimal('7.00'), 1),
+        ])
+        rebuild_expense_rollups([self.user.id])
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_income_rollup_tracks_delete(self):
+        income = Income.objects.create(user=self.user, amount=100, source='Salary', date=date(2025, 3, 1))
+        Income.objects.create(user=self.user, amount=50, source='Bonus', date=date(2025, 3, 15))
+        income.delete()
+        rollup = MonthlyIncomeRollup.objects.get(user=self.user, year=2025, month=3)
+        self.assertEqual((rollup.total, rollup.transaction_count), (Decimal('50.00'), 1))
+
+    def test_failing_delta_rolls_back_the_row_write(self):
+        expense = Expense_tbl.objects.create(user=self.user, cid=self.food, amount=10, date=date(2025, 3, 5))
+        with mock.patch('app_new.rollups._bump', side_effect=RuntimeError('rollup down')):
+            with self.assertRaises(RuntimeError):
+                Expense_tbl.objects.create(user=self.user, cid=self.food, amount=4, date=date(2025, 3, 6))
+            with self.assertRaises(RuntimeError):
+                Income.objects.create(user=self.user, amount=100, source='Salary', date=date(2025, 3, 1))
+            expense.amount = 25
+            with self.assertRaises(RuntimeError):
+                expense.save()
+            with self.assertRaises(RuntimeError):
+                expense.delete()
+        self.assertEqual(list(Expense_tbl.objects.filter(user=self.user).values_list('amount', flat=True)),
+                         [Decimal('10.00')])
+        self.assertFalse(Income.objects.filter(user=self.user).exists())
+        self.assertEqual(self.rollups(), [(self.food.id, 2025, 3, Decimal('10.00'), 1)])
+
+    def test_stale_instances_and_partial_saves_move_the_stored_amounts(self):
+        expense = Expense_tbl.objects.create(user=self.user, cid=self.food, amount=10, date=date(2025, 3, 5))
+        stale = Expense_tbl.objects.get(pk=expense.pk)
+        expense.amount = 30
+        expense.save()
+        stale.note = 'edited'
+        stale.amount = 99  # not written: only the note is
+        stale.save(update_fields=['note'])
+        self.assertEqual(self.rollups(), [(self.food.id, 2025, 3, Decimal('30.00'), 1)])
+        stale.delete()
+        self.assertEqual(self.rollups(), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', "needs a server database that allows concurrent writers")
+class UserCategoryTotalConcurrencyTests(TransactionTestCase):
+    WRITERS = 16
+    WRITES_PER_WRITER = 25
+
+    def test_parallel_writers_lose_no_updates(self):
+        user = User.objects.create_user(username='concurrent', password='pw')
+        food = Category.objects.create(name='Concurrent Food')
+        travel = Category.objects.create(name='Concurrent Travel')
+        start = threading.Barrier(self.WRITERS)
+        errors = []
+
+        def writer(n):
+            # half the writers move food -> travel and half travel -> food, so row locks are taken both ways
+            home, away = (food, travel) if n % 2 else (travel, food)
+            try:
+                start.wait()
+                for i in range(self.WRITES_PER_WRITER):
+                    expense = Expense_tbl.objects.create(user=user, cid=home, amount=Decimal('1.25'), date=date(2025, 5, 1))
+                    if i % 5 == 0:
+                        expense.cid = away
+                        expense.amount = Decimal('2.50')
+                        expense.save()
+                    elif i % 7 == 0:
+                        expense.delete()
+            except Exception as e:  # surfaced in the main thread below
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(self.WRITERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        for category in (food, travel):
+            expected = Expense_tbl.objects.filter(user=user, cid=category)
+            total = UserCategoryTotal.objects.get(user=user, category=category)
+            self.assertEqual(total.total_expense, expected.aggregate(total=Sum('amount'))['total'])
+            self.assertEqual(total.transaction_count, expected.count())
+
+
+class VersionedResponseCacheMixin:
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def report(self):
+        return self.client.get('/api/reports/', {'year': 2025, 'month': 3})
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.assertEqual(self.report()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.report()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(cache_stats()['hits'], 1)
+
+    def test_write_bumps_version_so_stale_report_is_never_served(self):
+        self.assertEqual(self.report().data['income'], 0.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Income.objects.create(user=self.user, amount=500, source='Salary', date=date(2025, 3, 1))
+        response = self.report()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['income'], 500.0)
+
+    def test_other_users_writes_do_not_invalidate(self):
+        self.report()
+        other = User.objects.create_user(username='other-cached', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            Income.objects.create(user=other, amount=500, source='Salary', date=date(2025, 3, 1))
+        self.assertEqual(self.report()['X-Cache'], 'HIT')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}})
+class LocMemResponseCacheTests(VersionedResponseCacheMixin, TestCase):
+    pass
+
+
+class FileBasedResponseCacheTests(VersionedResponseCacheMixin, TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir.name,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+class ConditionalGetTests(TestCase):
+    ENDPOINTS = ['/api/expense/', '/api/categories-with-budget/', '/api/reports/']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='etag', password='pw')
+        self.category = Category.objects.create(name='ETag Food')
+        Expense_tbl.objects.create(user=self.user, cid=self.category, amount=10, date=date.today())
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_matching_etag_returns_304_without_queries(self):
+        for url in self.ENDPOINTS:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):  # cached JWT user; no report queries or serializers
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_user_write_changes_etag(self):
+        etag = self.client.get('/api/expense/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense_tbl.objects.create(user=self.user, cid=self.category, amount=5, date=date.today())
+        response = self.client.get('/api/expense/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_category_write_changes_category_listing_etag(self):
+        etag = self.client.get('/api/categories-with-budget/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='ETag Travel')
+        response = self.client.get('/api/categories-with-budget/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_default_period_rollover_changes_etag(self):
+        urls = ['/api/reports/', '/api/budget-summary/', '/api/categories-with-budget/', '/api/categories/',
+                '/api/reports/trend/', '/api/reports/yearly/']
+        before = datetime(2025, 12, 31, 23, 0, tzinfo=dt_timezone.utc)
+        after = datetime(2026, 1, 1, 1, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=before):
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+        with mock.patch('django.utils.timezone.now', return_value=after):
+            for url in urls:
+                with self.subTest(url=url):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_category_rename_reaches_every_body_that_names_it(self):
+        urls = ['/api/expense/', '/api/expense/search/?q=ETag', '/api/reports/', '/api/reports/trend/',
+                '/api/reports/yearly/']
+        Expense_tbl.objects.filter(user=self.user).update(note='ETag lunch')
+        etags = {url: self.client.get(url)['ETag'] for url in urls}  # fills the response cache too
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'ETag Groceries'
+            self.category.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('ETag Groceries', response.content.decode())
+                self.assertNotIn('ETag Food', response.content.decode())
+
+
+class CategorySummaryTests(TestCase):
+    URL = '/api/categories/summary/'
+
+    def setUp(self):
+        category_cache.clear()
+        self.user = User.objects.create_user(username='summary', password='pw')
+        food = Category.objects.create(name='Summary Food')
+        rent = Category.objects.create(name='Summary Rent')
+        Category.objects.create(name='Summary Unused')
+        rows = [(food, '12.30', date(2025, 2, 28)), (food, '7.70', date(2025, 3, 1)), (rent, '900', date(2025, 3, 1)),
+                (food, '3.33', date(2025, 3, 31)), (rent, '900', date(2025, 4, 1)), (food, '5', date(2024, 12, 31))]
+        expenses = [Expense_tbl.objects.create(user=self.user, cid=category, amount=Decimal(amount), date=day)
+                    for category, amount, day in rows]
+        # updates and deletes go through the rollup deltas too
+        expenses[1].amount = Decimal('8.70')
+        expenses[1].save()
+        expenses[3].cid = rent
+        expenses[3].save()
+        expenses[5].delete()
+        Expense_tbl.objects.create(user=User.objects.create_user(username='summary-other', password='pw'),
+                                   cid=food, amount=1000, date=date(2025, 3, 15))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_rollup_and_group_by_paths_return_identical_bodies(self):
+        cases = [
+            ({'year': 2025, 'month': 3}, {'date_from': '2025-03-01', 'date_to': '2025-03-31'}),
+            ({'year': 2025}, {'date_from': '2025-01-01', 'date_to': '2025-12-31'}),
+            ({'year': 2024}, {'date_from': '2024-01-01', 'date_to': '2024-12-31'}),
+            ({}, {'date_from': '1900-01-01'}),
+        ]
+        for rollup_params, range_params in cases:
+            with self.subTest(rollup=rollup_params):
+                from_rollup = self.client.get(self.URL, rollup_params)
+                grouped = self.client.get(self.URL, range_params)
+                self.assertEqual(from_rollup.status_code, 200)
+                self.assertEqual(from_rollup.json(), grouped.json())
+        march = self.client.get(self.URL, {'year': 2025, 'month': 3}).json()
+        self.assertEqual(march['total_expenses'], 912.03)
+
+    def test_month_without_year_is_a_400(self):
+        response = self.client.get(self.URL, {'month': 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': "'month' requires 'year'"})
+
+
+class TrendReportTests(TestCase):
+    URL = '/api/reports/trend/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='trend', password='pw')
+        self.food = Category.objects.create(name='Trend Food')
+        Income.objects.create(user=self.user, amount=1000, source='Salary', date=date(2025, 1, 10))
+        Expense_tbl.objects.create(user=self.user, cid=self.food, amount=250, date=date(2025, 1, 31))
+        Expense_tbl.objects.create(user=self.user, cid=self.food, amount=40, date=date(2025, 3, 1))
+        Expense_tbl.objects.create(user=self.user, cid=self.food, amount=99, date=date(2025, 4, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_window_covers_whole_months(self):
+        response = self.client.get(self.URL, {'from': '2025-01', 'to': '2025-03'})
+        self.assertEqual(response.status_code, 200)
+        months = response.json()['months']
+        self.assertEqual([(m['year'], m['month'], m['income'], m['expenses']) for m in months],
+                         [(2025, 1, 1000.0, 250.0), (2025, 2, 0.0, 0.0), (2025, 3, 0.0, 40.0)])
+        self.assertEqual(months[0]['savings_rate'], 75.0)
+        self.assertEqual(months[0]['categories'],
+                         [{'category_id': self.food.id, 'category': 'Trend Food', 'spent': 250.0, 'budget': 0.0}])
+
+    def test_reversed_range_is_a_400(self):
+        self.assertEqual(self.client.get(self.URL, {'from': '2025-03', 'to': '2025-01'}).status_code, 400)
+
+    def test_malformed_months_are_400s(self):
+        for params in ({'from': '2025-13'}, {'from': 'jan'}, {'to': '2025-03-01'}, {'from': '0-01', 'to': '0-12'},
+                       {'from': '9999-06', 'to': '9999-12'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.URL, params).status_code, 400)
+
+
+class YearlyReportTests(TestCase):
+    URL = '/api/reports/yearly/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='yearly', password='pw')
+        food = Category.objects.create(name='Yearly Food')
+        Expense_tbl.objects.create(user=self.user, cid=food, amount=100, date=date(2024, 6, 1))
+        Expense_tbl.objects.create(user=self.user, cid=food, amount=150, date=date(2025, 6, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_year_over_year_totals(self):
+        body = self.client.get(self.URL, {'year': 2025}).json()
+        self.assertEqual((body['expenses'], body['previous_expenses'], body['expenses_change_percent']),
+                         (150.0, 100.0, 50.0))
+
+    def test_years_without_a_valid_previous_or_next_year_are_400s(self):
+        for year in (MINYEAR, MAXYEAR, 0, -5, 10_000, 'soon'):
+            with self.subTest(year=year):
+                self.assertEqual(self.client.get(self.URL, {'year': year}).status_code, 400)
+        for year in (MINYEAR + 1, MAXYEAR - 1):
+            with self.subTest(year=year):
+                self.assertEqual(self.client.get(self.URL, {'year': year}).status_code, 200)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        reset_metrics()
+        self.user = User.objects.create_user(username='metrics', password='pw')
+        self.admin = User.objects.create_user(username='metrics-admin', password='pw', is_staff=True)
+        self.client = APIClient()
+
+    def test_server_timing_header_reports_db_time_and_query_count(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/reports/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(captured)} queries"', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+.*app;dur=[\d.]+.*total;dur=[\d.]+')
+
+    def test_metrics_endpoint_exposes_per_view_histograms_to_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/reports/')
+        self.client.get('/api/budget-summary/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE app_request_duration_seconds histogram', body)
+        self.assertIn('app_request_duration_seconds_count{view="reports_view",method="GET"} 1', body)
+        self.assertIn('app_request_queries_bucket{view="budget-summary",method="GET",le="+Inf"} 1', body)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached-auth', password='pw')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_repeat_request_resolves_user_and_profile_without_queries(self):
+        self.assertEqual(self.client.get('/api/user-profile/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/user-profile/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_is_seen_on_the_next_request(self):
+        self.client.get('/api/user-profile/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/user-profile/').status_code, 401)
+
+    def test_profile_update_is_not_served_stale(self):
+        self.client.get('/api/user-profile/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/user-profile/', {'savings_target_percent': 50}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/user-profile/').json()['savings_target_percent'], 50)
+
+    @override_settings(LOCAL_CACHE_TTL=30)
+    def test_process_local_cache_keeps_users_briefly(self):
+        self.assertEqual(user_cache_timeout(), 30)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(user_cache_timeout(), int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()))
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['app_new.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class CategoryLookupCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category_cache.clear()
+        self.user = User.objects.create_user(username='category-cache', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Cached Food')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_expense_write_resolves_category_without_querying_it(self):
+        category_cache.all_categories()  # warm the process-local maps
+        body = {'amount': '12.50', 'cid': self.food.id, 'date': str(date.today())}
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/expense/', body, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['category_name'], 'Cached Food')
+        self.assertFalse([q for q in captured if 'FROM "app_new_category"' in q['sql']])
+
+    def test_unknown_category_is_a_validation_error(self):
+        body = {'amount': '12.50', 'cid': self.food.id + 1000, 'date': str(date.today())}
+        response = self.client.post('/api/expense/', body, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_category_writes_invalidate_the_maps(self):
+        self.assertIsNone(category_cache.category_id_for_name('cached travel'))
+        with self.captureOnCommitCallbacks(execute=True):
+            travel = Category.objects.create(name='Cached Travel')
+        self.assertEqual(category_cache.category_id_for_name('CACHED TRAVEL'), travel.id)
+        response = self.client.post('/api/categories/', {'name': 'cached travel'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            travel.delete()
+        self.assertIsNone(category_cache.get_category(travel.id))
+
+    @override_settings(LOCAL_CACHE_TTL=30)
+    def test_maps_expire_when_another_worker_cannot_bump_the_version(self):
+        self.assertIsNone(category_cache.category_id_for_name('elsewhere'))
+        # written by another worker: its version bump went to that worker's own cache
+        elsewhere = Category.objects.create(name='Elsewhere')
+        self.assertIsNone(category_cache.category_id_for_name('elsewhere'))
+        with mock.patch('app_new.category_cache.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertEqual(category_cache.category_id_for_name('elsewhere'), elsewhere.id)
+
+
+
+class ExpenseListTests(TestCase):
+    URL = '/api/expense/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lister', password='pw')
+        self.food = Category.objects.create(name='List Food')
+        self.travel = Category.objects.create(name='List Travel')
+        # three rows share each date, so pages must break ties on id
+        self.expenses = Expense_tbl.objects.bulk_create([
+            Expense_tbl(user=self.user, cid=self.food if n % 2 else self.travel, amount=n + 1,
+                        date=date(2025, 1, 1) + timedelta(days=n // 3))
+            for n in range(12)
+        ])
+        Expense_tbl.objects.create(user=User.objects.create_user(username='list-other', password='pw'),
+                                   cid=self.food, amount=5, date=date(2025, 1, 2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, **params):
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_cursor_pages_walk_every_row_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            body = self.client.get(self.URL, {'page_size': 5, **({'cursor': cursor} if cursor else {})}).json()
+            seen += [row['id'] for row in body['results']]
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        expected = sorted(self.expenses, key=lambda e: (e.date, e.id), reverse=True)
+        self.assertEqual(seen, [e.id for e in expected])
+
+    def test_invalid_cursor_is_a_400(self):
+        encode = lambda payload: base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        overflowing = [encode('{"d":"2025-01-01","i":1e999}'), encode(f'{{"d":"2025-01-01","i":{2 ** 63}}}')]
+        for cursor in ('not-a-cursor', 'eyJkIjoxfQ', *overflowing):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(self.URL, {'cursor': cursor}).status_code, 400)
+
+    def test_page_size_is_capped(self):
+        Expense_tbl.objects.bulk_create([Expense_tbl(user=self.user, cid=self.food, amount=1, date=date(2024, 1, 1))
+                                         for _ in range(MAX_PAGE_SIZE)])
+        for page_size, expected in ((10_000, MAX_PAGE_SIZE), (0, 1), ('x', DEFAULT_PAGE_SIZE)):
+            body = self.client.get(self.URL, {'page_size': page_size}).json()
+            self.assertEqual((body['page_size'], len(body['results'])), (expected, expected))
+
+    def test_each_filter(self):
+        by = lambda condition: sorted(e.id for e in self.expenses if condition(e))
+        cases = [
+            ({'date_from': '2025-01-03'}, by(lambda e: e.date >= date(2025, 1, 3))),
+            ({'date_to': '2025-01-02'}, by(lambda e: e.date <= date(2025, 1, 2))),
+            ({'cid': self.food.id}, by(lambda e: e.cid_id == self.food.id)),
+            ({'min_amount': '10'}, by(lambda e: e.amount >= 10)),
+            ({'max_amount': '2.5'}, by(lambda e: e.amount <= Decimal('2.5'))),
+            ({'cid': self.travel.id, 'min_amount': '3', 'date_to': '2025-01-03'},
+             by(lambda e: e.cid_id == self.travel.id and e.amount >= 3 and e.date <= date(2025, 1, 3))),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                self.assertEqual(sorted(self.ids(**params)), expected)
+
+    def test_bad_filter_values_are_400s_everywhere(self):
+        bad = [{'min_amount': 'NaN'}, {'max_amount': 'Infinity'}, {'min_amount': '-inf'}, {'max_amount': 'sNaN'},
+               {'min_amount': 'abc'}, {'date_from': '2025-02-30'}, {'cid': 'food'}]
+        for url in (self.URL, '/api/expense/export/', '/api/expense/search/'):
+            for params in bad:
+                with self.subTest(url=url, params=params):
+                    self.assertEqual(self.client.get(url, {'q': 'x', **params}).status_code, 400)
+
+
+class CategoryListingQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='category-lister', password='pw')
+        self.today = date.today()
+        self.add_categories(2)
+
+    def add_categories(self, count):
+        start = Category.objects.count()
+        for n in range(start, start + count):
+            category = Category.objects.create(name=f'Listed {n}')
+            BudgetCategoryMonth.objects.create(uid=self.user, category=category, year=self.today.year,
+                                               month=self.today.month, amount=100)
+            Expense_tbl.objects.create(user=self.user, cid=category, amount=n + 1, date=self.today)
+
+    def call(self, view):
+        cache.clear()
+        category_cache.clear()
+        request = APIRequestFactory().get('/api/categories/')
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_grow_with_categories(self):
+        views = {
+            'categories': CategoryView.as_view(),
+            'categories-with-budget': category_list_with_budget,
+            'categories-current': get_categories,
+        }
+        baseline = {}
+        for name, view in views.items():
+            with CaptureQueriesContext(connection) as captured:
+                self.call(view)
+            baseline[name] = len(captured)
+        self.add_categories(20)
+        for name, view in views.items():
+            with self.subTest(view=name), self.assertNumQueries(baseline[name]):
+                self.call(view)
+
+
+class ExpenseBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category_cache.clear()
+        self.user = User.objects.create_user(username='batch', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Batch Food')
+            self.travel = Category.objects.create(name='Batch Travel')
+        self.kept = Expense_tbl.objects.create(user=self.user, cid=self.food, amount=10, date=date(2025, 1, 5))
+        self.gone = Expense_tbl.objects.create(user=self.user, cid=self.food, amount=7, date=date(2025, 2, 5))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rollup_rows(self):
+        return sorted(MonthlyCategoryRollup.objects.filter(transaction_count__gt=0).values_list(
+            'user_id', 'category_id', 'year', 'month', 'spent', 'transaction_count'))
+
+    def test_mixed_operations_apply_in_order_and_keep_rollups_exact(self):
+        operations = [
+            {'op': 'create', 'data': {'amount': '5.00', 'cid': self.travel.id, 'date': '2025-01-20'}},
+            {'op': 'update', 'id': self.kept.id, 'data': {'cid': self.travel.id, 'date': '2025-03-01'}},
+            {'op': 'delete', 'id': self.gone.id},
+        ] + [{'op': 'create', 'data': {'amount': '1.00', 'cid': self.food.id, 'date': '2025-01-02'}}] * 20
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/expense/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(captured), 30)  # bulk writes and per-key rollup updates, not per-row work
+
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results[:3]], [201, 200, 204])
+        self.assertEqual(results[1]['data']['category_name'], 'Batch Travel')
+        self.assertFalse(Expense_tbl.objects.filter(id=self.gone.id).exists())
+        self.assertEqual(Expense_tbl.objects.filter(user=self.user).count(), 22)
+
+        incremental = self.rollup_rows()
+        rebuild_expense_rollups()
+        self.assertEqual(incremental, self.rollup_rows())
+
+    def test_one_invalid_operation_applies_nothing(self):
+        operations = [
+            {'op': 'create', 'data': {'amount': '5.00', 'cid': self.food.id, 'date': '2025-01-20'}},
+            {'op': 'delete', 'id': self.gone.id},
+            {'op': 'update', 'id': self.kept.id, 'data': {'cid': 999999}},
+        ]
+        response = self.client.post('/api/expense/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['valid', 'valid', 'error'])
+        self.assertEqual(Expense_tbl.objects.filter(user=self.user).count(), 2)
+
+    def test_other_users_expenses_are_not_found(self):
+        other = User.objects.create_user(username='batch-other', password='pw')
+        theirs = Expense_tbl.objects.create(user=other, cid=self.food, amount=3, date=date(2025, 1, 1))
+        response = self.client.post('/api/expense/batch/', {'operations': [{'op': 'delete', 'id': theirs.id}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Expense_tbl.objects.filter(id=theirs.id).exists())
+
+    def test_bulk_delete_adjusts_the_rollups(self):
+        extra = Expense_tbl.objects.bulk_create([
+            Expense_tbl(user=self.user, cid=self.travel if n % 2 else self.food, amount=n + 1,
+                        date=date(2025, 1 + n % 3, 10))
+            for n in range(9)
+        ])
+        rebuild_expense_rollups()
+        rebuild_category_totals()
+        operations = [{'op': 'delete', 'id': expense.id} for expense in [self.gone, *extra[:6]]]
+        response = self.client.post('/api/expense/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Expense_tbl.objects.filter(user=self.user).count(), 4)
+
+        totals = lambda: sorted(UserCategoryTotal.objects.filter(transaction_count__gt=0).values_list(
+            'user_id', 'category_id', 'total_expense', 'transaction_count'))
+        incremental, incremental_totals = self.rollup_rows(), totals()
+        self.assertEqual(sum(row[4] for row in incremental), 10 + 7 + 8 + 9)
+        rebuild_expense_rollups()
+        rebuild_category_totals()
+        self.assertEqual(incremental, self.rollup_rows())
+        self.assertEqual(incremental_totals, totals())
+
+    def validate_then(self, change):
+        """Patch batch._validate so `change` runs between validation and the write."""
+        def validate(*args):
+            outcome = original(*args)
+            change()
+            return outcome
+        original = batch._validate
+        return mock.patch.object(batch, '_validate', side_effect=validate)
+
+    def test_rows_changed_after_validation_use_the_locked_values(self):
+        def move():
+            for expense in Expense_tbl.objects.filter(id__in=[self.kept.id, self.gone.id]):
+                expense.cid, expense.amount = self.travel, 40
+                expense.save()
+
+        operations = [{'op': 'update', 'id': self.kept.id, 'data': {'note': 'edited'}},
+                      {'op': 'delete', 'id': self.gone.id}]
+        with self.validate_then(move):
+            response = self.client.post('/api/expense/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['data']['category_name'], 'Batch Travel')
+        self.kept.refresh_from_db()
+        self.assertEqual((self.kept.cid_id, self.kept.amount, self.kept.note), (self.travel.id, 40, 'edited'))
+
+        incremental = self.rollup_rows()
+        rebuild_expense_rollups()
+        self.assertEqual(incremental, self.rollup_rows())
+
+    def test_rows_deleted_after_validation_fail_the_batch(self):
+        operations = [{'op': 'create', 'data': {'amount': '5.00', 'cid': self.food.id, 'date': '2025-01-20'}},
+                      {'op': 'delete', 'id': self.gone.id}]
+        with self.validate_then(lambda: Expense_tbl.objects.filter(id=self.gone.id).delete()):
+            response = self.client.post('/api/expense/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 400)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['valid', 'error'])
+        self.assertEqual(results[1]['errors'], {'id': ['Expense not found']})
+        self.assertEqual(Expense_tbl.objects.filter(user=self.user).count(), 1)
+
+
+class ExpenseImportTests(TestCase):
+    URL = '/api/expense/import/'
+
+    def setUp(self):
+        category_cache.clear()
+        self.user = User.objects.create_user(username='importer', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Import Food')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content, **data):
+        content = content.encode() if isinstance(content, str) else content
+        return self.client.post(self.URL, {'file': SimpleUploadedFile(name, content), **data}, format='multipart')
+
+    def test_csv_imports_valid_rows_and_reports_bad_ones(self):
+        response = self.upload('expenses.csv', (
+            'date,amount,category,note\n'
+            '2025-03-01,12.50,import food,lunch\n'
+            '2025-03-02,7,,\n'
+            '2025-13-01,5,Import Food,\n'
+            '2025-03-03,abc,Import Food,\n'
+            '2025-03-04,5,Nope,\n'
+        ))
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['imported'], body['failed']), (1, 4))
+        self.assertEqual([e['line'] for e in body['errors']], [3, 4, 5, 6])
+        rollup = MonthlyCategoryRollup.objects.get(user=self.user, category=self.food, year=2025, month=3)
+        self.assertEqual((rollup.spent, rollup.transaction_count), (Decimal('12.50'), 1))
+
+    def test_ndjson_by_category_id(self):
+        lines = [{'date': '2025-04-01', 'amount': '3.10', 'cid': self.food.id, 'note': 'tea'},
+                 {'date': '2025-04-02', 'amount': '1', 'cid': 999999}, 'not json', [1]]
+        content = '\n'.join(json.dumps(line) if not isinstance(line, str) else line for line in lines)
+        body = self.upload('expenses.ndjson', content).json()
+        self.assertEqual((body['imported'], body['failed']), (1, 3))
+        self.assertEqual(Expense_tbl.objects.get(user=self.user).note, 'tea')
+
+    def test_ndjson_note_must_be_a_string(self):
+        lines = [{'date': '2025-04-01', 'amount': '2', 'cid': self.food.id, 'note': note}
+                 for note in ({'a': 1}, ['x'], 42, 'fine')]
+        response = self.upload('expenses.ndjson', '\n'.join(json.dumps(line) for line in lines))
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['imported'], body['failed']), (1, 3))
+        self.assertEqual({e['error'] for e in body['errors']}, {"'note' must be a string"})
+        self.assertEqual(Expense_tbl.objects.get(user=self.user).note, 'fine')
+
+    def test_non_finite_and_out_of_range_amounts_are_row_errors(self):
+        amounts = ['NaN', 'sNaN', 'Infinity', '-Infinity', '0', '0.001', '-5', '1e30', '100000000',
+                   '99999999.995']
+        content = 'date,cid,amount\n' + ''.join(f'2025-03-01,{self.food.id},{amount}\n' for amount in amounts)
+        valid = f'2025-03-01,{self.food.id},1\n2025-03-01,{self.food.id},99999999.994\n'
+        response = self.upload('expenses.csv', content + valid)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['imported'], response.json()['failed']), (2, len(amounts)))
+        self.assertEqual(Expense_tbl.objects.filter(user=self.user).aggregate(top=Max('amount'))['top'],
+                         Decimal('99999999.99'))
+
+    def test_empty_file_and_bad_encoding(self):
+        empty = self.upload('expenses.csv', '')
+        self.assertEqual((empty.status_code, empty.json()['imported']), (400, 0))
+
+        latin1 = 'date,amount,category,note\n2025-03-01,5,Import Food,caf\xe9\n'.encode('latin-1')
+        response = self.upload('expenses.csv', latin1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'The file must be UTF-8 encoded'})
+        self.assertFalse(Expense_tbl.objects.filter(user=self.user).exists())
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_only_replica_read_views_leave_the_primary(self):
+        self.assertIsNone(self.router.db_for_read(Expense_tbl))
+        token = db_routers._replica_reads.set('replica')
+        try:
+            self.assertEqual(self.router.db_for_read(Expense_tbl), 'replica')
+            self.assertEqual(self.router.db_for_write(Expense_tbl), 'default')
+        finally:
+            db_routers._replica_reads.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_stays_on_the_primary(self):
+        token = db_routers._replica_reads.set('replica')
+        try:
+            self.assertIsNone(self.router.db_for_read(Expense_tbl))
+        finally:
+            db_routers._replica_reads.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2', 'replica3'])
+    def test_one_replica_serves_every_read_of_a_request(self):
+        cache.clear()
+        request = Request(APIRequestFactory().get('/api/reports/'))
+        request.user = User(id=1)
+
+        @db_routers.replica_reads
+        def view(request):
+            return {self.router.db_for_read(model) for model in (Expense_tbl, Income, Expense_tbl, Category)}
+
+        with mock.patch('app_new.db_routers.random.choice', wraps=random.choice) as choice:
+            aliases = view(request)
+        self.assertEqual(choice.call_count, 1)
+        self.assertEqual(len(aliases), 1)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "needs a replica alias: --settings=backend.settings_replica_test")
+class ReplicaReadTests(TestCase):
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.replica = settings.DATABASE_REPLICAS[0]
+        self.user = User.objects.create_user(username='replica-reader', password='pw')
+        today = date.today()
+        Income.objects.create(user=self.user, amount=1000, source='Salary', date=today)
+        # the replica "lags": it knows the user but has an older income total
+        User.objects.using(self.replica).bulk_create([User(id=self.user.id, username=self.user.username)])
+        MonthlyIncomeRollup.objects.using(self.replica).create(
+            user_id=self.user.id, year=today.year, month=today.month, total=400, transaction_count=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reports_read_from_the_replica(self):
+        self.assertEqual(self.client.get('/api/reports/').json()['income'], 400.0)
+
+    def test_writer_is_pinned_to_the_primary(self):
+        category = Category.objects.create(name='Replica Food')
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense_tbl.objects.create(user=self.user, cid=category, amount=5, date=date.today())
+        self.assertTrue(db_routers.is_pinned(self.user.id))
+        self.assertEqual(self.client.get('/api/reports/').json()['income'], 1000.0)
+
+    def test_falls_back_to_the_primary_without_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.client.get('/api/reports/').json()['income'], 1000.0)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "needs a replica alias: --settings=backend.settings_replica_test")
+class ReplicaPinCookieTests(TransactionTestCase):
+    # real commits, so the pin is made while the request is still being handled
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='replica-cookie', password='pw')
+        self.category = Category.objects.create(name='Replica Cookie')
+        today = date.today()
+        Income.objects.create(user=self.user, amount=1000, source='Salary', date=today)
+        replica = settings.DATABASE_REPLICAS[0]
+        User.objects.using(replica).bulk_create([User(id=self.user.id, username=self.user.username)])
+        MonthlyIncomeRollup.objects.using(replica).create(
+            user_id=self.user.id, year=today.year, month=today.month, total=400, transaction_count=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pin_cookie_reaches_a_worker_that_missed_the_cache_pin(self):
+        body = {'amount': '5.00', 'cid': self.category.id, 'date': str(date.today())}
+        response = self.client.post('/api/expense/', body, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(db_routers.PIN_COOKIE, response.cookies)
+        cache.clear()  # the next request lands on a worker whose cache never saw the pin
+        self.assertEqual(self.client.get('/api/reports/').json()['income'], 1000.0)
+        del self.client.cookies[db_routers.PIN_COOKIE]
+        cache.clear()
+        self.assertEqual(self.client.get('/api/reports/').json()['income'], 400.0)
+
+
+class HashRingTests(SimpleTestCase):
+    def test_assignment_is_stable_and_spread(self):
+        ring = HashRing(['a', 'b', 'c'])
+        owners = [ring.node_for(user_id) for user_id in range(3000)]
+        self.assertEqual(owners, [HashRing(['c', 'a', 'b']).node_for(user_id) for user_id in range(3000)])
+        for node in 'abc':
+            self.assertGreater(owners.count(node), 700)
+
+    def test_adding_a_node_only_moves_its_share(self):
+        before, after = HashRing(['a', 'b', 'c']), HashRing(['a', 'b', 'c', 'd'])
+        moved = [user_id for user_id in range(3000) if before.node_for(user_id) != after.node_for(user_id)]
+        self.assertTrue(all(after.node_for(user_id) == 'd' for user_id in moved))
+        self.assertLess(len(moved), 3000 * 0.4)
+
+    @override_settings(DATABASE_SHARDS=[])
+    def test_router_is_a_no_op_without_shards(self):
+        self.assertIsNone(shard_for(7))
+        self.assertIsNone(ShardRouter().db_for_write(Expense_tbl, instance=Expense_tbl(user_id=7)))
+
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, "run with --settings=backend.settings_shard_test")
+class ShardingTests(TestCase):
+    databases = {'default', *settings.DATABASE_SHARDS}
+
+    def setUp(self):
+        cache.clear()
+        category_cache.clear()
+        self.food = Category.objects.create(name='Shard Food')
+
+    def _user_on(self, shard, prefix='sharded'):
+        # ids are handed out in order, so create users until the ring gives one to `shard`
+        while True:
+            user = User.objects.create_user(username=f'{prefix}-{User.objects.count()}', password='pw')
+            if shard_for(user.id) == shard:
+                return user
+
+    def _client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def test_categories_and_users_are_copied_to_the_shards(self):
+        user = self._user_on('shard_b')
+        for shard in settings.DATABASE_SHARDS:
+            self.assertTrue(Category.objects.using(shard).filter(pk=self.food.pk, name='Shard Food').exists())
+        self.assertTrue(User.objects.using('shard_b').filter(pk=user.pk).exists())
+        self.assertFalse(User.objects.using('shard_a').filter(pk=user.pk).exists())
+
+        self.food.delete()
+        for shard in settings.DATABASE_SHARDS:
+            self.assertFalse(Category.objects.using(shard).filter(pk=self.food.pk).exists())
+
+    def test_user_data_is_written_and_read_on_the_users_shard(self):
+        user = self._user_on('shard_b')
+        self.assertTrue(UserProfile.objects.using('shard_b').filter(user=user).exists())
+        client = self._client(user)
+        today = date.today()
+
+        response = client.post('/api/expense/', {'amount': '40.00', 'cid': self.food.id, 'date': str(today)},
+                               format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Expense_tbl.objects.using('shard_b').filter(user_id=user.id).count(), 1)
+        self.assertFalse(Expense_tbl.objects.using('shard_a').exists())
+        self.assertFalse(Expense_tbl.objects.using('default').exists())
+        rollup = MonthlyCategoryRollup.objects.using('shard_b').get(user_id=user.id)
+        self.assertEqual(rollup.spent, Decimal('40.00'))
+
+        self.assertEqual(len(client.get('/api/expense/?unpaginated=true').json()), 1)
+        summary = client.get('/api/categories-with-budget/').json()['categories']
+        self.assertEqual([row['spent'] for row in summary if row['name'] == 'Shard Food'], [40.0])
+
+    def test_exports_stream_from_the_users_shard(self):
+        user = self._user_on('shard_b')
+        Expense_tbl.objects.create(user=user, cid=self.food, amount=12, date=date(2025, 2, 1), note='lunch')
+        Income.objects.create(user=user, amount=900, source='Salary', date=date(2025, 2, 1))
+        client = self._client(user)
+        for url, expected in (('/api/expense/export/', 'lunch'), ('/api/income/export/', 'Salary')):
+            for output in ('csv', 'ndjson'):
+                with self.subTest(url=url, output=output):
+                    response = client.get(url, {'output': output})
+                    self.assertEqual(response.status_code, 200)
+                    body = b''.join(response.streaming_content).decode()
+                    self.assertIn(expected, body)
+
+    def test_move_user_shard_rebalances_onto_the_ring(self):
+        today = date.today()
+        with override_settings(DATABASE_SHARDS=['shard_a']):
+            # everyone lands on shard_a while it is the only shard
+            user = self._user_on('shard_a')
+            while shard_for(user.id, settings.DATABASE_SHARDS + ['shard_b']) != 'shard_b':
+                user = self._user_on('shard_a')
+            Expense_tbl.objects.create(user=user, cid=self.food, amount=25, date=today)
+            Income.objects.create(user=user, amount=1000, source='Salary', date=today)
+
+        call_command('move_user_shard', '--all', '--from', 'shard_a', stdout=StringIO())
+
+        for model, field in ((Expense_tbl, 'user_id'), (Income, 'user_id'), (UserProfile, 'user_id'),
+                             (MonthlyCategoryRollup, 'user_id'), (MonthlyIncomeRollup, 'user_id')):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.using('shard_a').filter(**{field: user.id}).exists())
+                self.assertTrue(model.objects.using('shard_b').filter(**{field: user.id}).exists())
+        report = self._client(user).get('/api/reports/').json()
+        self.assertEqual((report['income'], report['expenses']), (1000.0, 25.0))
+
+    def test_renumbered_move_keeps_recurring_rows_on_their_rule(self):
+        neighbour = self._user_on('shard_b')
+        user = self._user_on('shard_a')
+        for owner in (neighbour, user):  # the neighbour's rule takes the id the mover's rule had
+            rule = RecurringRule.objects.create(user=owner, kind=RecurringRule.EXPENSE, category=self.food,
+                                                amount=10, description='Phone', start_date=date(2025, 1, 1))
+        materialize_due(until=date(2025, 3, 31))
+        self.assertEqual(Expense_tbl.objects.using('shard_a').filter(recurring_rule=rule).count(), 3)
+        self.assertTrue(RecurringRule.objects.using('shard_b').filter(pk=rule.pk).exists())
+
+        move_user(user.id, 'shard_a', 'shard_b', renumber=True)
+        moved = RecurringRule.objects.using('shard_b').get(user_id=user.id)
+        self.assertEqual(Expense_tbl.objects.using('shard_b').filter(recurring_rule=moved, user_id=user.id).count(), 3)
+        self.assertEqual(Expense_tbl.objects.using('shard_b').filter(user_id=user.id).count(), 3)
+
+
+class AsyncReportViewTests(TransactionTestCase):
+    # TransactionTestCase: the async views query from worker threads on their own connections,
+    # which cannot see rows inside a TestCase transaction
+
+    def setUp(self):
+        cache.clear()
+        # worker-thread connections share this settings dict; don't leave them open after the test
+        settings_dict = connection.settings_dict
+        previous_max_age = settings_dict.get('CONN_MAX_AGE', 0)
+        settings_dict['CONN_MAX_AGE'] = 0
+        self.addCleanup(settings_dict.__setitem__, 'CONN_MAX_AGE', previous_max_age)
+
+        self.user = User.objects.create_user(username='async', password='pw')
+        food = Category.objects.create(name='Async Food')
+        today = date.today()
+        Income.objects.create(user=self.user, amount=1000, source='Salary', date=today)
+        Expense_tbl.objects.create(user=self.user, cid=food, amount=Decimal('120.50'), date=today)
+        BudgetCategoryMonth.objects.create(uid=self.user, category=food, year=today.year, month=today.month,
+                                           amount=300)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_async_variants_return_the_sync_bodies(self):
+        for sync_url, async_url in [('/api/reports/', '/api/async/reports/'),
+                                    ('/api/budget-summary/', '/api/async/budget-summary/')]:
+            with self.subTest(url=async_url):
+                expected = self.client.get(sync_url).json()
+                cache.clear()
+                response = self.client.get(async_url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertEqual(response.json(), expected)
+
+    def test_async_view_reads_the_sync_views_cache_entry(self):
+        self.client.get('/api/reports/')
+        self.assertEqual(self.client.get('/api/async/reports/')['X-Cache'], 'HIT')
+
+    def test_default_month_rollover_changes_the_async_etag(self):
+        before = datetime(2025, 1, 31, 23, 0, tzinfo=dt_timezone.utc)
+        after = datetime(2025, 2, 1, 1, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=before):
+            etag = self.client.get('/api/async/reports/')['ETag']
+        with mock.patch('django.utils.timezone.now', return_value=after):
+            response = self.client.get('/api/async/reports/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['month'], 2)
+
+    def test_category_rename_retires_the_shared_cache_entry(self):
+        self.client.get('/api/reports/')
+        Category.objects.filter(name='Async Food').update(name='Async Groceries')
+        bump_category_version()
+        response = self.client.get('/api/async/reports/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('Async Groceries', response.content.decode())
+
+    def test_jwt_is_required(self):
+        response = APIClient().get('/api/async/reports/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('detail', response.json())
+        bad = APIClient()
+        bad.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(bad.get('/api/async/budget-summary/').status_code, 401)
+
+
+class BenchmarkEndpointsTests(TransactionTestCase):
+    # TransactionTestCase for the async views, as above
+
+    def setUp(self):
+        cache.clear()
+        settings_dict = connection.settings_dict
+        previous_max_age = settings_dict.get('CONN_MAX_AGE', 0)
+        settings_dict['CONN_MAX_AGE'] = 0
+        self.addCleanup(settings_dict.__setitem__, 'CONN_MAX_AGE', previous_max_age)
+
+        user = User.objects.create_user(username='seed_user_bench', password='pw')
+        food = Category.objects.create(name='Bench Food')
+        today = date.today()
+        Income.objects.create(user=user, amount=1000, source='Salary', date=today)
+        Expense_tbl.objects.create(user=user, cid=food, amount=Decimal('12.50'), date=today)
+        RecurringRule.objects.create(user=user, kind=RecurringRule.EXPENSE, category=food, amount=10,
+                                     description='Rent', frequency=RecurringRule.MONTHLY, day_of_month=1,
+                                     start_date=today, next_date=today + timedelta(days=40))
+        self.output = tempfile.NamedTemporaryFile(suffix='.json')
+        self.addCleanup(self.output.close)
+
+    def _run(self):
+        call_command('benchmark_endpoints', '--repeat', '1', '--output', self.output.name,
+                     stdout=StringIO(), stderr=StringIO())
+        with open(self.output.name) as fh:
+            return json.load(fh)['endpoints']
+
+    def test_every_endpoint_is_measured_on_its_success_path(self):
+        endpoints = self._run()
+        measured = {route: result['status'] for route, result in endpoints.items() if 'skipped' not in result}
+        self.assertEqual(measured['api/async/reports/'], 200)
+        self.assertEqual(measured['api/recurring/<int:pk>/'], 200)
+        self.assertEqual(measured['api/income/<int:pk>/'], 200)
+        self.assertEqual(measured['api/categories/<int:pk>/update-budget/'], 200)
+        self.assertEqual({route: code for route, code in measured.items() if code >= 400}, {})
+
+    def test_an_error_status_fails_the_run(self):
+        def broken(self, request, pk=None):
+            return Response({'error': 'broken'}, status=503)
+
+        with mock.patch('app_new.views.IncomeView.get', broken):
+            with self.assertRaisesMessage(CommandError, '2 endpoint(s) answered with an error status'):
+                self._run()
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class ExpenseSearchTests(TestCase):
+    URL = '/api/expense/search/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='searcher', password='pw')
+        self.other = User.objects.create_user(username='other-searcher', password='pw')
+        self.travel = Category.objects.create(name='Search Travel')
+        today = date.today()
+        notes = [('taxi to office', today), ('taxi taxi, late taxi home', today - timedelta(days=40)),
+                 ('dinner with friends', today), ('', today), (None, today)]
+        self.expenses = [Expense_tbl.objects.create(user=self.user, cid=self.travel, amount=10, date=day, note=note)
+                         for note, day in notes]
+        Expense_tbl.objects.create(user=self.other, cid=self.travel, amount=10, date=today, note='taxi to office')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _ids(self, **params):
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_matches_are_ranked_and_scoped_to_the_user(self):
+        self.assertEqual(self._ids(q='taxi'), [self.expenses[1].id, self.expenses[0].id])
+        self.assertEqual(self._ids(q='Taxis OFFICE'), [self.expenses[0].id])  # stemmed, every word required
+        self.assertEqual(self._ids(q='parking'), [])
+
+    def test_date_range_and_pagination(self):
+        since = str(date.today() - timedelta(days=7))
+        self.assertEqual(self._ids(q='taxi', date_from=since), [self.expenses[0].id])
+        first = self.client.get(self.URL, {'q': 'taxi', 'page_size': 1}).json()
+        self.assertEqual((len(first['results']), first['next_page']), (1, 2))
+        second = self.client.get(self.URL, {'q': 'taxi', 'page_size': 1, 'page': 2}).json()
+        self.assertEqual(([row['id'] for row in second['results']], second['next_page']), ([self.expenses[0].id], None))
+
+    def test_index_follows_updates_bulk_writes_and_deletes(self):
+        expense = self.expenses[2]
+        expense.note = 'airport taxi'
+        expense.save()
+        Expense_tbl.objects.bulk_create([Expense_tbl(user=self.user, cid=self.travel, amount=5,
+                                                     date=date.today(), note='taxi to airport')])
+        self.expenses[0].delete()
+        self.assertEqual(len(self._ids(q='taxi')), 3)
+        self.assertEqual(len(self._ids(q='airport')), 2)
+        self.assertEqual(self._ids(q='dinner'), [])
+
+    def test_query_syntax_in_user_input_is_treated_as_words(self):
+        self.assertEqual(self._ids(q='"taxi office*'), [self.expenses[0].id])
+
+    def test_query_without_words_is_rejected(self):
+        self.assertEqual(self.client.get(self.URL, {'q': ' -*'}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {'q': 'taxi', 'page': 0}).status_code, 400)
+
+    def test_pages_past_the_bigint_range_are_rejected(self):
+        for page in (2 ** 63, 2 ** 62):  # the page itself, then the OFFSET it implies
+            with self.subTest(page=page):
+                self.assertEqual(self.client.get(self.URL, {'q': 'taxi', 'page': page}).status_code, 400)
+
+
+
+class AutoAssignBudgetsTests(TestCase):
+    URL = '/api/auto-assign-budgets/'
+
+    def setUp(self):
+        cache.clear()
+        category_cache.clear()
+        self.user = User.objects.create_user(username='auto-budget', password='pw')
+        profile = get_profile(self.user)
+        profile.savings_target_percent = 50
+        profile.save()
+        for name in ('Food & Dining', 'Transportation', 'Pets'):
+            Category.objects.create(name=name)
+        Income.objects.create(user=self.user, amount=1000, source='Salary', date=date(2025, 1, 15))
+        Income.objects.create(user=self.user, amount=2000, source='Salary', date=date(2025, 2, 15))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def budgets(self):
+        return {(row.category.name, row.year, row.month): row.amount
+                for row in BudgetCategoryMonth.objects.filter(uid=self.user).select_related('category')}
+
+    def test_first_run_writes_every_month_with_income(self):
+        response = self.client.post(self.URL, {'from': '2025-01', 'to': '2025-03'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([(m['year'], m['month'], m['spendable']) for m in body['months']],
+                         [(2025, 1, 500.0), (2025, 2, 1000.0)])
+        self.assertEqual([(m['year'], m['month']) for m in body['skipped']], [(2025, 3)])
+        self.assertEqual(self.budgets(), {
+            ('Food & Dining', 2025, 1): 150, ('Transportation', 2025, 1): 75, ('Pets', 2025, 1): 275,
+            ('Food & Dining', 2025, 2): 300, ('Transportation', 2025, 2): 150, ('Pets', 2025, 2): 550,
+        })
+
+    def test_rerun_updates_the_existing_rows(self):
+        self.client.post(self.URL, {'from': '2025-01', 'to': '2025-02'}, format='json')
+        Income.objects.create(user=self.user, amount=1000, source='Bonus', date=date(2025, 1, 20))
+        response = self.client.post(self.URL, {'year': 2025, 'month': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        budgets = self.budgets()
+        self.assertEqual(len(budgets), 6)
+        self.assertEqual(BudgetCategoryMonth.objects.filter(uid=self.user).count(), 6)
+        self.assertEqual([budgets[(name, 2025, 1)] for name in ('Food & Dining', 'Transportation', 'Pets')],
+                         [300, 150, 550])
+        self.assertEqual(budgets[('Pets', 2025, 2)], 550)
+
+    def test_bad_range_changes_nothing(self):
+        self.client.post(self.URL, {'from': '2025-01', 'to': '2025-02'}, format='json')
+        before = self.budgets()
+        Income.objects.create(user=self.user, amount=5000, source='Bonus', date=date(2025, 1, 20))
+        for body in ({'from': '2025-02', 'to': '2025-01'}, {'from': '2015-01', 'to': '2025-02'},
+                     {'from': '2025-13', 'to': '2025-02'}, {'from': '2025-01-01'}, {'year': 2025, 'month': 'jan'}):
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post(self.URL, body, format='json').status_code, 400)
+                self.assertEqual(self.budgets(), before)
+
+
+class BudgetAlertTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alerted', password='pw')
+        self.food = Category.objects.create(name='Alert Food')
+        BudgetCategoryMonth.objects.create(uid=self.user, category=self.food, year=2025, month=3, amount=100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def spend(self, amount, day=date(2025, 3, 10)):
+        return Expense_tbl.objects.create(user=self.user, cid=self.food, amount=amount, date=day)
+
+    def thresholds(self):
+        return list(BudgetAlert.objects.filter(user=self.user).order_by('threshold').values_list('threshold', flat=True))
+
+    def test_crossings_are_recorded_once_without_reading_expenses(self):
+        self.spend(50)
+        self.assertEqual(self.thresholds(), [])
+        with CaptureQueriesContext(connection) as captured:
+            self.spend(35)
+        self.assertFalse([q for q in captured.captured_queries
+                          if 'SELECT' in q['sql'] and '"app_new_expense_tbl"' in q['sql'].split('FROM', 1)[-1]])
+        self.assertEqual(self.thresholds(), [80])
+        self.spend(1)
+        self.spend(20, day=date(2025, 4, 1))  # no budget that month
+        self.assertEqual(self.thresholds(), [80])
+        self.spend(30)
+        self.assertEqual(self.thresholds(), [80, 100])
+        alert = BudgetAlert.objects.get(user=self.user, threshold=100)
+        self.assertEqual((alert.spent, alert.budget), (Decimal('116.00'), Decimal('100.00')))
+
+    def test_one_write_past_both_thresholds_and_lowered_budgets(self):
+        self.spend(60)
+        self.assertEqual(self.thresholds(), [])
+        self.client.put(f'/api/categories/{self.food.id}/update-monthly-budget/',
+                         {'year': 2025, 'month': 3, 'budget': '50'}, format='json')
+        self.assertEqual(self.thresholds(), [80, 100])
+
+    def test_batch_writes_are_checked(self):
+        operations = [{'op': 'create', 'data': {'amount': '45.00', 'cid': self.food.id, 'date': '2025-03-02'}}] * 2
+        response = self.client.post('/api/expense/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.thresholds(), [80])
+
+    def test_unread_endpoint_and_mark_read(self):
+        self.spend(120)
+        alerts = self.client.get('/api/alerts/').json()['alerts']
+        self.assertEqual([(a['threshold'], a['category_name'], a['percent']) for a in alerts],
+                         [(100, 'Alert Food', 120.0), (80, 'Alert Food', 120.0)])
+
+        response = self.client.post('/api/alerts/read/', {'ids': [alerts[0]['id']]}, format='json')
+        self.assertEqual(response.json(), {'marked_read': 1})
+        self.assertEqual([a['threshold'] for a in self.client.get('/api/alerts/').json()['alerts']], [80])
+        self.assertEqual(self.client.post('/api/alerts/read/', {'ids': 'all'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/alerts/read/', {}, format='json').json(), {'marked_read': 1})
+        self.assertEqual(self.client.get('/api/alerts/').json()['alerts'], [])
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='not-alerted', password='pw'))
+        self.assertEqual(other.get('/api/alerts/').json()['alerts'], [])
+
+
+class RecurringRuleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='recurring', password='pw')
+        self.housing = Category.objects.create(name='Recurring Housing')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rule(self, **fields):
+        fields = {'user': self.user, 'kind': RecurringRule.EXPENSE, 'category': self.housing, 'amount': 1000,
+                  'description': 'Rent', 'start_date': date(2025, 1, 31), **fields}
+        return RecurringRule.objects.create(**fields)
+
+    def test_schedules(self):
+        monthly = self.rule(end_date=date(2025, 5, 1))
+        weekly = self.rule(kind=RecurringRule.INCOME, category=None, description='Wages',
+                           frequency=RecurringRule.WEEKLY, interval=2, start_date=date(2025, 1, 6))
+        every_ten = self.rule(frequency=RecurringRule.DAYS, interval=10, start_date=date(2025, 1, 1))
+        materialize_due(until=date(2025, 2, 10))
+        self.assertEqual(list(monthly.expenses.values_list('date', flat=True).order_by('date')),
+                         [date(2025, 1, 31)])
+        self.assertEqual(list(weekly.incomes.values_list('date', flat=True).order_by('date')),
+                         [date(2025, 1, 6), date(2025, 1, 20), date(2025, 2, 3)])
+        self.assertEqual(every_ten.expenses.count(), 5)  # Jan 1, 11, 21, 31, Feb 10
+
+        materialize_due(until=date(2025, 12, 31))
+        self.assertEqual(list(monthly.expenses.values_list('date', flat=True).order_by('date')),
+                         [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)])
+        monthly.refresh_from_db()
+        self.assertIsNone(monthly.next_date)
+
+    def test_reruns_and_small_batches_never_duplicate(self):
+        rules = [self.rule(start_date=date(2020, 1, 1), day_of_month=day) for day in (1, 15, 28)]
+        counts = materialize_due(until=date(2024, 12, 31), batch_size=7, rules_per_chunk=2)
+        self.assertEqual(counts, {'rules': 3, 'expenses': 180, 'incomes': 0})
+        self.assertEqual(materialize_due(until=date(2024, 12, 31)), {'rules': 0, 'expenses': 0, 'incomes': 0})
+
+        # a rule pointed back at dates it already wrote skips them
+        RecurringRule.objects.filter(pk=rules[0].pk).update(next_date=date(2024, 6, 1))
+        self.assertEqual(materialize_due(until=date(2025, 1, 31))['expenses'], 3)
+        self.assertEqual(Expense_tbl.objects.filter(user=self.user).count(), 183)
+
+    def test_rollups_and_totals_follow(self):
+        self.rule(start_date=date(2025, 1, 5))
+        self.rule(kind=RecurringRule.INCOME, category=None, amount=5000, description='Salary',
+                  start_date=date(2025, 1, 1))
+        materialize_due(until=date(2025, 3, 31))
+        rollup = MonthlyCategoryRollup.objects.get(user=self.user, category=self.housing, year=2025, month=2)
+        self.assertEqual((rollup.spent, rollup.transaction_count), (Decimal('1000.00'), 1))
+        self.assertEqual(UserCategoryTotal.objects.get(user=self.user, category=self.housing).total_expense,
+                         Decimal('3000.00'))
+        self.assertEqual(MonthlyIncomeRollup.objects.get(user=self.user, year=2025, month=3).total, Decimal('5000.00'))
+
+    def test_api_creates_materializes_and_deletes(self):
+        start = date.today() - timedelta(days=14)
+        response = self.client.post('/api/recurring/', {
+            'kind': 'expense', 'category': self.housing.id, 'amount': '250', 'description': 'Gym',
+            'frequency': 'weekly', 'start_date': str(start),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['materialized'], body['next_date']), (3, str(start + timedelta(weeks=3))))
+        self.assertEqual(self.client.get('/api/recurring/').json()[0]['category_name'], 'Recurring Housing')
+        detail = self.client.get(f"/api/recurring/{body['id']}/")
+        self.assertEqual((detail.status_code, detail.json()['description']), (200, 'Gym'))
+        theirs = RecurringRule.objects.create(user=User.objects.create_user(username='recurring-other', password='pw'),
+                                              kind=RecurringRule.INCOME, amount=1, description='x', start_date=start)
+        self.assertEqual(self.client.get(f'/api/recurring/{theirs.id}/').status_code, 404)
+
+        invalid = [{'kind': 'expense', 'amount': '5', 'description': 'x', 'start_date': str(start)},
+                   {'kind': 'income', 'category': self.housing.id, 'amount': '5', 'description': 'x',
+                    'start_date': str(start)},
+                   {'kind': 'income', 'amount': '5', 'description': 'x', 'start_date': str(start), 'interval': 0}]
+        for data in invalid:
+            self.assertEqual(self.client.post('/api/recurring/', data, format='json').status_code, 400)
+
+        self.assertEqual(self.client.delete(f"/api/recurring/{body['id']}/").status_code, 204)
+        self.assertEqual(Expense_tbl.objects.filter(user=self.user, note='Gym', recurring_rule=None).count(), 3)
+
+    def test_conflicting_occurrence_rolls_back_instead_of_miscounting(self):
+        rule = self.rule(start_date=date(2025, 1, 1))
+        real_due = recurring._due
+
+        def due_with_concurrent_writer(rules, until, existing):
+            for due_rule, day in real_due(rules, until, existing):
+                if day == date(2025, 2, 1):
+                    # written after `existing` was read, as a writer ignoring the rule lock would
+                    Expense_tbl.objects.bulk_create([Expense_tbl(user=self.user, cid=self.housing, amount=1000,
+                                                                 date=day, recurring_rule=due_rule)])
+                yield due_rule, day
+
+        with mock.patch('app_new.recurring._due', due_with_concurrent_writer):
+            with self.assertRaises(IntegrityError):
+                materialize_due(until=date(2025, 3, 31))
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_date, date(2025, 1, 1))
+        self.assertFalse(Expense_tbl.objects.filter(user=self.user).exists())
+        self.assertFalse(MonthlyCategoryRollup.objects.filter(user=self.user).exists())
+
+        counts = materialize_due(until=date(2025, 3, 31))
+        self.assertEqual(counts['expenses'], Expense_tbl.objects.filter(user=self.user).count())
+        self.assertEqual(MonthlyCategoryRollup.objects.filter(user=self.user).count(), 3)
+
+
+class StructuredLoggingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='logger', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.handler = _ListHandler()
+        self.handler.setFormatter(JsonFormatter())
+        self.handler.addFilter(RequestContextFilter())
+        view_logger = logging.getLogger('app_new.views')
+        view_logger.addHandler(self.handler)
+        self.addCleanup(view_logger.removeHandler, self.handler)
+
+    def test_validation_failure_logs_json_with_request_and_user_but_not_the_payload(self):
+        response = self.client.post('/api/expense/', {'amount': 'secret-value'}, format='json',
+                                    HTTP_X_REQUEST_ID='req-123')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+
+        record = json.loads(self.handler.lines[-1])
+        self.assertEqual(record['level'], 'WARNING')
+        self.assertEqual(record['message'], 'expense validation failed')
+        self.assertEqual(record['request_id'], 'req-123')
+        self.assertEqual(record['user_id'], self.user.id)
+        self.assertIn('amount', record['fields'])
+        self.assertNotIn('secret-value', self.handler.lines[-1])
+
+    def test_debug_sampling_drops_debug_but_never_warnings(self):
+        sampler = DebugSampleFilter(rate=0)
+        debug = logging.makeLogRecord({'levelno': logging.DEBUG})
+        warning = logging.makeLogRecord({'levelno': logging.WARNING})
+        self.assertFalse(sampler.filter(debug))
+        self.assertTrue(sampler.filter(warning))
+        self.assertTrue(DebugSampleFilter(rate=1).filter(debug))
+
+
+@tag('slow')
+class StreamingExportMemoryTests(TestCase):
+    ROWS = 1_000_000
+    PEAK_MEMORY_CEILING = 32 * 1024 * 1024  # bytes; a buffered export of this size needs several hundred MB
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='exporter', password='pw')
+        category = Category.objects.create(name='Export')
+        start = date(2015, 1, 1)
+        batch = []
+        for i in range(cls.ROWS):
+            batch.append(Expense_tbl(user=cls.user, cid=category, amount=Decimal('12.34'),
+                                     date=start + timedelta(days=i % 3650), note=f'synthetic {i}'))
+            if len(batch) == 10_000:
+                Expense_tbl.objects.bulk_create(batch)
+                batch = []
+
+    def test_csv_export_of_a_million_rows_stays_under_memory_ceiling(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        tracemalloc.start()
+        try:
+            response = client.get('/api/expense/export/', {'output': 'csv'})
+            lines = sum(chunk.count(b'\n') for chunk in response.streaming_content)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lines, self.ROWS + 1)  # header + rows
+        self.assertLess(peak, self.PEAK_MEMORY_CEILING)
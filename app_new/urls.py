@@ -5,13 +5,16 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from .views import (
-    RegisterView, IncomeView, ExpenseView,get_categories,
+    RegisterView, IncomeView, ExpenseView, ExpenseBatchView, ExpenseImportView, RecurringRuleView, get_categories,
+    budget_alerts_view, export_expenses, export_income, mark_budget_alerts_read, metrics_view, response_cache_stats,
+    search_expenses_view, trend_report_view, yearly_report_view,
     CategoryView, CategoryDetailView, 
     PredefinedCategoriesView, category_summary_view,
     update_category_budget, budget_summary, auto_assign_budgets,reports_view,category_list_with_budget,update_monthly_budget,
     UserProfileView  # ← Now this exists!
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .async_views import budget_summary_async, reports_view_async
 
 urlpatterns = [
     path('api/register/', RegisterView.as_view(), name='register'),
@@ -21,10 +24,19 @@ urlpatterns = [
     # Income
     path('api/income/', IncomeView.as_view(), name='income'),
     path('api/income/<int:pk>/', IncomeView.as_view(), name='income-detail'),
+    path('api/income/export/', export_income, name='income-export'),
     
     # Expense
     path('api/expense/', ExpenseView.as_view(), name='expense'),
     path('api/expense/<int:pk>/', ExpenseView.as_view(), name='expense-detail'),
+    path('api/expense/batch/', ExpenseBatchView.as_view(), name='expense-batch'),
+    path('api/expense/import/', ExpenseImportView.as_view(), name='expense-import'),
+    path('api/expense/export/', export_expenses, name='expense-export'),
+    path('api/expense/search/', search_expenses_view, name='expense-search'),
+
+    # Recurring expenses & income
+    path('api/recurring/', RecurringRuleView.as_view(), name='recurring'),
+    path('api/recurring/<int:pk>/', RecurringRuleView.as_view(), name='recurring-detail'),
     
     # Categories
     path('api/categories/', CategoryView.as_view(), name='category-list-create'),
@@ -37,11 +49,21 @@ urlpatterns = [
     path('api/budget-summary/', budget_summary, name='budget-summary'),
     path('api/auto-assign-budgets/', auto_assign_budgets, name='auto-assign'),
     path('api/categories/<int:pk>/update-budget/', update_category_budget, name='update-budget'),
+    path('api/alerts/', budget_alerts_view, name='budget-alerts'),
+    path('api/alerts/read/', mark_budget_alerts_read, name='budget-alerts-read'),
 
    # ADD THESE NEW ONES
     path('api/categories/', category_list_with_budget),  # ← now works with monthly budget
     path('api/categories-with-budget/', category_list_with_budget),  # ← both URLs work
     path('api/reports/', reports_view),
+    path('api/reports/trend/', trend_report_view, name='reports-trend'),
+    path('api/reports/yearly/', yearly_report_view, name='reports-yearly'),
+    path('api/cache-stats/', response_cache_stats, name='cache-stats'),
+    path('api/metrics/', metrics_view, name='metrics'),
+
+    # Async variants (ASGI); same responses and cache entries as the sync views
+    path('api/async/reports/', reports_view_async, name='reports-async'),
+    path('api/async/budget-summary/', budget_summary_async, name='budget-summary-async'),
     path('api/categories/<int:category_id>/update-monthly-budget/', update_monthly_budget),
     path('api/auto-assign-budgets/', auto_assign_budgets),
     path('api/categories/', get_categories),
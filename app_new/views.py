@@ -4,15 +4,16 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Q, DecimalField
+from django.db.models import Sum, Count, Q, F, DecimalField
 from django.db.models.functions import Coalesce
-from django.db import models
+from django.db import models, transaction
 from django.db.models.functions import TruncMonth, TruncYear
 from collections import defaultdict
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
 import calendar
 from .models import Income, Expense_tbl, Category, BudgetCategoryMonth, UserProfile  # ← THIS LINE IS CRITICAL
+from .models import MonthlyCategoryRollup, MonthlyIncomeRollup, RecurringRule, UserCategoryTotal
 from django.contrib.auth import authenticate, login
 from .serializers import (
     RegisterSerializer, 
@@ -21,9 +22,32 @@ from .serializers import (
 )
 from .models import Income, Expense_tbl, Category
 from .models import UserProfile
-from .serializers import UserProfileSerializer
+from .serializers import BudgetAlertSerializer, RecurringRuleSerializer, UserProfileSerializer
 from rest_framework.permissions import AllowAny
-from datetime import datetime
+from datetime import MAXYEAR, MINYEAR, date, datetime
+from .filters import InvalidFilter, filter_expenses
+from .pagination import InvalidCursor, InvalidPage, get_page_number, get_page_size, keyset_page, offset_page
+from .importers import detect_format, import_expenses
+from .batch import BatchError, apply_expense_batch
+from .exporters import EXPENSE_COLUMNS, EXPENSE_FIELDS, INCOME_COLUMNS, INCOME_FIELDS, stream_export
+from .filters import filter_by_date_range
+from .dates import month_window
+from .caching import bump_data_version, cache_stats, conditional_etag, versioned_cache
+from .db_routers import replica_reads
+from .search import InvalidSearch, search_expenses
+from .alerts import check_budget_alerts, mark_alerts_read, unread_alerts
+from .recurring import materialize_due
+from .sharding import db_for_user
+from .metrics import render_metrics
+from .authentication import get_profile
+from .category_cache import all_categories
+from rest_framework.permissions import IsAdminUser
+from django.http import HttpResponse
+from rest_framework.parsers import MultiPartParser
+import csv
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Register API
 class RegisterView(APIView):
@@ -38,8 +62,14 @@ class RegisterView(APIView):
 class IncomeView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    @replica_reads
+    def get(self, request, pk=None):
         incomes = Income.objects.filter(user=request.user)
+        if pk is not None:
+            income = incomes.filter(pk=pk).first()
+            if income is None:
+                return Response({"error": "Income not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(IncomeSerializer(income).data)
         serializer = IncomeSerializer(incomes, many=True)
         return Response(serializer.data)
 
@@ -75,20 +105,47 @@ class IncomeView(APIView):
 class ExpenseView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_etag('expense', include_categories=True)
+    @replica_reads
     def get(self, request, pk=None):
         """
-        GET /api/expense/      → List all expenses
-        GET /api/expense/1/    → Get single expense
+        GET /api/expense/                   → First page of expenses, newest first
+        GET /api/expense/?cursor=<next>     → Following page
+        GET /api/expense/?unpaginated=true  → Full list (legacy response for old clients)
+        GET /api/expense/1/                 → Get single expense
+
+        Filters: date_from, date_to, cid, min_amount, max_amount. Page size: page_size.
         """
         if pk is None:
-            print(f"📥 GET /api/expense/ - User: {request.user.id}")
-            expenses = Expense_tbl.objects.filter(
-                user=request.user
-            ).select_related('cid').order_by('-date')
-            
-            serializer = ExpenseTblSerializer(expenses, many=True, context={'request': request})
-            print(f"✅ Found {len(serializer.data)} expenses")
-            return Response(serializer.data)
+            try:
+                expenses = filter_expenses(
+                    Expense_tbl.objects.filter(user=request.user).select_related('cid'),
+                    request.query_params,
+                )
+            except InvalidFilter as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            if request.query_params.get('unpaginated', '').lower() in ('1', 'true', 'yes'):
+                serializer = ExpenseTblSerializer(expenses.order_by('-date'), many=True, context={'request': request})
+                data = serializer.data
+                logger.debug("expense list served", extra={'user_id': request.user.id, 'count': len(data),
+                                                           'paginated': False})
+                return Response(data)
+
+            page_size = get_page_size(request)
+            try:
+                rows, next_cursor = keyset_page(expenses, request.query_params.get('cursor'), page_size)
+            except InvalidCursor as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            serializer = ExpenseTblSerializer(rows, many=True, context={'request': request})
+            logger.debug("expense list served", extra={'user_id': request.user.id, 'count': len(rows),
+                                                       'paginated': True})
+            return Response({
+                "results": serializer.data,
+                "next_cursor": next_cursor,
+                "page_size": page_size,
+            })
         
         else:
             try:
@@ -103,8 +160,6 @@ class ExpenseView(APIView):
 
     def post(self, request):
         """POST /api/expense/ → Create new expense"""
-        print(f"📥 POST /api/expense/ - Data: {request.data}")
-        
         # FIXED: Use context for serializer
         serializer = ExpenseTblSerializer(
             data=request.data, 
@@ -112,17 +167,18 @@ class ExpenseView(APIView):
         )
         
         if serializer.is_valid():
-            print("✅ Validation passed")
             # CRITICAL FIX: serializer.save() now returns instance
             expense = serializer.save()
             response_serializer = ExpenseTblSerializer(
                 expense, 
                 context={'request': request}
             )
-            print("✅ Expense created successfully")
+            logger.info("expense created", extra={'user_id': request.user.id, 'expense_id': expense.id})
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
         else:
-            print("❌ Validation errors:", serializer.errors)
+            # field names only; the submitted values stay out of the logs
+            logger.warning("expense validation failed", extra={'user_id': request.user.id,
+                                                               'fields': sorted(serializer.errors)})
             return Response({
                 "error": "Failed to create expense",
                 "details": serializer.errors,
@@ -166,15 +222,168 @@ class ExpenseView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+class RecurringRuleView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk=None):
+        """
+        GET /api/recurring/   - The user's recurring expense and income rules
+        GET /api/recurring/1/ - One rule
+        """
+        rules = RecurringRule.objects.filter(user=request.user)
+        if pk is None:
+            return Response(RecurringRuleSerializer(rules.order_by('start_date', 'id'), many=True).data)
+        rule = rules.filter(pk=pk).first()
+        if rule is None:
+            return Response({"error": "Recurring rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(RecurringRuleSerializer(rule).data)
+
+    def post(self, request):
+        """
+        POST /api/recurring/ {"kind": "expense", "category": 3, "amount": "15000", "description": "Rent",
+                              "frequency": "monthly", "day_of_month": 1, "start_date": "2025-01-01"}
+        Occurrences already due are written straight away; later ones by the materialize_recurring command.
+        """
+        serializer = RecurringRuleSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        rule = serializer.save(user=request.user)
+        counts = materialize_due(user_id=request.user.id)
+        rule.refresh_from_db(fields=['next_date'])
+        return Response({**RecurringRuleSerializer(rule).data, "materialized": counts['expenses'] + counts['incomes']},
+                        status=status.HTTP_201_CREATED)
+
+    def delete(self, request, pk):
+        """DELETE /api/recurring/1/ - Stop the rule; rows it already wrote are kept"""
+        deleted, _ = RecurringRule.objects.filter(pk=pk, user=request.user).delete()
+        if not deleted:
+            return Response({"error": "Recurring rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ExpenseBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        POST /api/expense/batch/ → Create, update and delete many expenses in one transaction
+        Body: {"operations": [{"op": "create", "data": {...}},
+                              {"op": "update", "id": 7, "data": {...}},
+                              {"op": "delete", "id": 9}]}
+        All operations are validated first; if any is invalid nothing is written and
+        the response lists the errors by operation index.
+        """
+        try:
+            ok, results = apply_expense_batch(request.user, request.data.get('operations'), {'request': request})
+        except BatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not ok:
+            return Response({"error": "Batch not applied", "results": results}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info("expense batch applied", extra={'user_id': request.user.id, 'operations': len(results)})
+        return Response({"results": results})
+
+class ExpenseImportView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """
+        POST /api/expense/import/ → Bulk import expenses from an uploaded file
+        Form fields: file (CSV with date,amount,category|cid,note header, or NDJSON),
+        optional file_format=csv|ndjson (otherwise taken from the file extension).
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload a CSV or NDJSON file in the 'file' field"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = import_expenses(request.user, upload, detect_format(upload, request.data.get('file_format')))
+        except (ValueError, csv.Error) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result, status=status.HTTP_201_CREATED if result['imported'] else status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_expenses(request):
+    """
+    GET /api/expense/export/?output=csv|ndjson - Stream the user's full expense history
+    Filters: date_from, date_to, cid, min_amount, max_amount
+    """
+    try:
+        # bound to the user's shard now: the body is read after ShardMiddleware has reset it
+        expenses = filter_expenses(
+            Expense_tbl.objects.using(db_for_user(request.user.id)).filter(user=request.user), request.query_params,
+        )
+        return stream_export(expenses, EXPENSE_FIELDS, EXPENSE_COLUMNS,
+                             request.query_params.get('output', 'csv'), 'expenses')
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_etag('expense-search', include_categories=True)
+@replica_reads
+def search_expenses_view(request):
+    """
+    GET /api/expense/search/?q=taxi office&page=2 - Expenses whose note has every word, best match first
+    Filters: date_from, date_to, cid, min_amount, max_amount. Page size: page_size.
+    """
+    try:
+        expenses = search_expenses(
+            filter_expenses(Expense_tbl.objects.filter(user=request.user).select_related('cid'), request.query_params),
+            request.query_params.get('q'),
+            user_id=request.user.id,
+        )
+        page_size = get_page_size(request)
+        rows, next_page = offset_page(expenses, get_page_number(request), page_size)
+    except (InvalidSearch, InvalidFilter, InvalidPage) as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = ExpenseTblSerializer(rows, many=True, context={'request': request}).data
+    for item, row in zip(results, rows):
+        item['rank'] = round(row.rank, 6)
+    return Response({
+        "results": results,
+        "next_page": next_page,
+        "page_size": page_size,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_income(request):
+    """
+    GET /api/income/export/?output=csv|ndjson - Stream the user's full income history
+    Filters: date_from, date_to
+    """
+    try:
+        incomes = filter_by_date_range(
+            Income.objects.using(db_for_user(request.user.id)).filter(user=request.user), request.query_params,
+        )
+        return stream_export(incomes, INCOME_FIELDS, INCOME_COLUMNS,
+                             request.query_params.get('output', 'csv'), 'income')
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def get_current_month(request):
+    """(year, month) of today, for views that always show the current month."""
+    today = timezone.now()
+    return today.year, today.month
+
+
 # INTEGRATED: CategoryView with function-based improvements
 class CategoryView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_etag('categories', get_current_month, include_categories=True)
+    @replica_reads
     def get(self, request, pk=None):
         """GET /api/categories/ - List all categories with expense summary"""
         if pk is None:
             # FIXED: Include expense summary for current user only
-            categories = Category.objects.all()
+            today = timezone.now()
+            categories = Category.objects.with_monthly_budget(request.user, today.year, today.month)
             
             # Add search functionality
             search = request.query_params.get('search', None)
@@ -192,9 +401,9 @@ class CategoryView(APIView):
             )
             
             # FIXED: Proper DecimalField aggregation
-            user_expenses = Expense_tbl.objects.filter(user=request.user).aggregate(
+            user_expenses = UserCategoryTotal.objects.filter(user=request.user).aggregate(
                 total=Coalesce(
-                    Sum('amount'), 
+                    Sum('total_expense'), 
                     0, 
                     output_field=DecimalField(max_digits=12, decimal_places=2)  # ✅ CRITICAL FIX
                 )
@@ -253,7 +462,7 @@ class CategoryDetailView(APIView):
         )
         if serializer.is_valid():
             serializer.save()
-            detail_serializer = CategorySerializer(
+            detail_serializer = CategoryCreateSerializer(
                 serializer.instance, 
                 context={'request': request}
             )
@@ -301,9 +510,7 @@ class PredefinedCategoriesView(APIView):
         ]
         
         # Filter out categories that already exist
-        existing_names = set(
-            Category.objects.values_list('name', flat=True)
-        )
+        existing_names = {category.name for category in all_categories()}
         available = [cat for cat in predefined if cat['name'] not in existing_names]
         
         return Response({
@@ -314,40 +521,54 @@ class PredefinedCategoriesView(APIView):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def category_summary_view(request):
     """
     GET /api/categories/summary/ - Get categories with expense summary
+    Optional window: ?year=2025[&month=3] or ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    (all-time when omitted).
     """
-    categories = Category.objects.all()
     user = request.user
-    
-    summary_data = []
-    total_expenses = 0
-    
-    for category in categories:
-        expenses = Expense_tbl.objects.filter(user=user, cid=category)
-        total_amount = expenses.aggregate(total=Coalesce(Sum('amount'), 0))['total'] or 0
-        transaction_count = expenses.count()
-        
-        if total_amount > 0:
-            percentage = round((float(total_amount) / float(total_expenses + total_amount)) * 100, 1)
+    params = request.query_params
+
+    try:
+        if params.get('date_from') or params.get('date_to'):
+            # Arbitrary day ranges need the raw rows: one GROUP BY on the (user, cid, date) index
+            grouped = filter_by_date_range(Expense_tbl.objects.filter(user=user), params).values(
+                category_id=F('cid_id')
+            ).annotate(total=Sum('amount'), count=Count('id'))
         else:
-            percentage = 0
-            
+            # Whole months/years/all-time come straight from the monthly rollup
+            rollups = MonthlyCategoryRollup.objects.filter(user=user)
+            if params.get('month') and not params.get('year'):
+                raise ValueError("'month' requires 'year'")
+            if params.get('year'):
+                if not params['year'].isdigit() or not params.get('month', '0').isdigit():
+                    raise ValueError("'year' and 'month' must be integers")
+                rollups = rollups.filter(year=int(params['year']))
+                if params.get('month'):
+                    rollups = rollups.filter(month=int(params['month']))
+            grouped = rollups.values('category_id').annotate(
+                total=Sum('spent'), count=Sum('transaction_count')
+            )
+        totals = {row['category_id']: row for row in grouped.order_by()}
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    total_expenses = sum((row['total'] or Decimal('0') for row in totals.values()), Decimal('0'))
+
+    summary_data = []
+    for category in all_categories():
+        row = totals.get(category.id, {})
+        total_amount = row.get('total') or Decimal('0')
         summary_data.append({
             'category': category.id,
             'category_name': category.name,
             'total_amount': float(total_amount),
-            'transaction_count': transaction_count,
-            'percentage': percentage
+            'transaction_count': row.get('count') or 0,
+            'percentage': round(float(total_amount / total_expenses * 100), 1) if total_expenses > 0 else 0,
         })
-        total_expenses += total_amount
-    
-    # Update percentages
-    for item in summary_data:
-        if total_expenses > 0:
-            item['percentage'] = round((item['total_amount'] / total_expenses) * 100, 1)
-    
+
     return Response({
         'categories': summary_data,
         'total_expenses': float(total_expenses)
@@ -378,9 +599,16 @@ def update_category_budget(request, pk):
 
     return Response({"budget": float(budget_value)})
 
+def monthly_income_total(user, year, month):
+    rollup = MonthlyIncomeRollup.objects.filter(user=user, year=year, month=month).values('total').first()
+    return rollup['total'] if rollup else Decimal('0')
+
 def get_year_month(request):
-    year = int(request.query_params.get('year', timezone.now().year))
-    month = int(request.query_params.get('month', timezone.now().month))
+    return year_month_from_params(request.query_params)
+
+def year_month_from_params(params):
+    year = int(params.get('year', timezone.now().year))
+    month = int(params.get('month', timezone.now().month))
     if month < 1 or month > 12:
         month = timezone.now().month
     return year, month
@@ -396,15 +624,19 @@ from datetime import datetime
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_etag('budget-summary', get_year_month)
+@versioned_cache('budget-summary', get_year_month)
+@replica_reads
 def budget_summary(request):
     user = request.user
     year, month = get_year_month(request)
 
-    total_income = Income.objects.filter(
-        user=user, date__year=year, date__month=month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    total_income = monthly_income_total(user, year, month)
+    profile = get_profile(user)
+    return Response(budget_summary_data(year, month, total_income, profile))
 
-    profile, _ = UserProfile.objects.get_or_create(user=user)
+def budget_summary_data(year, month, total_income, profile):
+    """Response body of budget_summary; shared with the async variant."""
     fixed = Decimal(profile.fixed_expenses or 0)
     savings_percent = Decimal(profile.savings_target_percent or 33) / 100
     savings = total_income * savings_percent
@@ -412,7 +644,7 @@ def budget_summary(request):
 
     month_name = calendar.month_name[month]
 
-    return Response({
+    return {
         "year": year,
         "month": month,
         "month_name": month_name,
@@ -421,15 +653,17 @@ def budget_summary(request):
         "savings_target_percent": int(profile.savings_target_percent),
         "savings_amount": float(savings),
         "spendable": max(float(spendable), 0),
-    })
+    }
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_etag('categories-with-budget', get_year_month, include_categories=True)
+@replica_reads
 def category_list_with_budget(request):
     user = request.user
     year, month = get_year_month(request)
 
-    categories = Category.objects.all().order_by('name')
+    categories = Category.objects.with_monthly_budget(user, year, month).order_by('name')
     serializer = CategoryWithMonthlyBudgetSerializer(
         categories, many=True, context={'request': request, 'selected_year': year, 'selected_month': month}
     )
@@ -441,8 +675,11 @@ def category_list_with_budget(request):
     })
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_etag('categories-current', get_current_month, include_categories=True)
+@replica_reads
 def get_categories(request):
-    categories = Category.objects.all().order_by('name')
+    today = timezone.now()
+    categories = Category.objects.with_monthly_budget(request.user, today.year, today.month).order_by('name')
     serializer = CategoryWithMonthlyBudgetSerializer(
         categories, many=True, context={'request': request}
     )
@@ -471,75 +708,136 @@ def update_monthly_budget(request, category_id):
     return Response({"budget": float(obj.amount), "year": year, "month": month})
 
 
+AUTO_BUDGET_SPLIT = {
+    "Food & Dining": Decimal('0.30'),
+    "Transportation": Decimal('0.15'),
+    "Shopping": Decimal('0.10'),
+    "Bills & Utilities": Decimal('0.15'),
+    "Entertainment": Decimal('0.10'),
+    "Health": Decimal('0.10'),
+    "Education": Decimal('0.05'),
+    "Travel": Decimal('0.03'),
+    "Other": Decimal('0.02'),
+}
+
+def parse_year_month(value):
+    """'2025-03' -> (2025, 3)"""
+    try:
+        year, month = (int(part) for part in str(value).split('-'))
+    except ValueError:
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+    return year, month
+
+def iter_months(start, end):
+    year, month = start
+    while (year, month) <= end:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def allocate_budgets(spendable, categories):
+    """Split one month's spendable income across categories, in memory. Returns [(category, amount)]."""
+    by_name = {cat.name.lower(): cat for cat in categories}
+    allocation = []
+    assigned = Decimal('0')
+    for name, pct in AUTO_BUDGET_SPLIT.items():
+        cat = by_name.get(name.lower())
+        if cat is None:
+            continue
+        budget = (spendable * pct).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
+        allocation.append((cat, budget))
+        assigned += budget
+
+    remaining = spendable - assigned
+    split_names = {name.lower() for name in AUTO_BUDGET_SPLIT}
+    others = [cat for cat in categories if cat.name.lower() not in split_names]
+    if others and remaining > 0:
+        per_cat = (remaining / len(others)).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
+        allocation.extend((cat, per_cat) for cat in others)
+    return allocation
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def auto_assign_budgets(request):
+    """
+    POST /api/auto-assign-budgets/ {"year": 2025, "month": 3}            - one month
+    POST /api/auto-assign-budgets/ {"from": "2025-01", "to": "2025-12"}  - every month in the range
+    All budgets are written with one bulk upsert inside a single transaction.
+    """
     user = request.user
-    year = int(request.data.get('year', timezone.now().year))
-    month = int(request.data.get('month', timezone.now().month))
-
-    total_income = Income.objects.filter(
-        user=user, date__year=year, date__month=month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-
-    if total_income <= 0:
-        return Response({"error": f"No income recorded for {calendar.month_name[month]} {year}"}, status=400)
-
-    profile, _ = UserProfile.objects.get_or_create(user=user)
+    is_range = 'from' in request.data or 'to' in request.data
+    try:
+        if is_range:
+            start = parse_year_month(request.data.get('from') or request.data.get('to'))
+            end = parse_year_month(request.data.get('to') or request.data.get('from'))
+        else:
+            start = end = parse_year_month(
+                f"{request.data.get('year', timezone.now().year)}-{request.data.get('month', timezone.now().month)}"
+            )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    months = list(iter_months(start, end))
+    if not months or len(months) > 120:
+        return Response({"error": "Range must cover between 1 and 120 months"}, status=400)
+
+    income_by_month = {
+        (r['year'], r['month']): r['total']
+        for r in MonthlyIncomeRollup.objects.filter(
+            user=user, year__gte=start[0], year__lte=end[0]
+        ).values('year', 'month', 'total')
+    }
+    profile = get_profile(user)
     savings_rate = Decimal(profile.savings_target_percent or 33) / 100
     fixed = Decimal(profile.fixed_expenses or 0)
-    spendable = total_income - (total_income * savings_rate) - fixed
-
-    if spendable <= 0:
-        return Response({"error": "Not enough spendable income after savings & fixed expenses"}, status=400)
-
-    categories = Category.objects.all()
-    split = {
-        "Food & Dining": 0.30,
-        "Transportation": 0.15,
-        "Shopping": 0.10,
-        "Bills & Utilities": 0.15,
-        "Entertainment": 0.10,
-        "Health": 0.10,
-        "Education": 0.05,
-        "Travel": 0.03,
-        "Other": 0.02,
-    }
-
-    assigned = Decimal('0')
-    updated = []
+    categories = all_categories()
 
-    for name, pct in split.items():
-        try:
-            cat = categories.get(name__iexact=name)
-            budget = (spendable * Decimal(str(pct))).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
-            BudgetCategoryMonth.objects.update_or_create(
-                uid=user, category=cat, year=year, month=month,
-                defaults={"amount": budget}
-            )
-            updated.append({"name": cat.name, "budget": float(budget)})
-            assigned += budget
-        except Category.DoesNotExist:
+    results, skipped, rows = [], [], []
+    for year, month in months:
+        total_income = income_by_month.get((year, month)) or Decimal('0')
+        if total_income <= 0:
+            skipped.append({"year": year, "month": month, "error": f"No income recorded for {calendar.month_name[month]} {year}"})
+            continue
+        spendable = total_income - (total_income * savings_rate) - fixed
+        if spendable <= 0:
+            skipped.append({"year": year, "month": month, "error": "Not enough spendable income after savings & fixed expenses"})
             continue
 
-    remaining = spendable - assigned
-    others = categories.exclude(name__in=[k for k in split.keys()])
-    if others.exists() and remaining > 0:
-        per_cat = (remaining / len(others)).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
-        for cat in others:
-            BudgetCategoryMonth.objects.update_or_create(
-                uid=user, category=cat, year=year, month=month,
-                defaults={"amount": per_cat}
-            )
-            updated.append({"name": cat.name, "budget": float(per_cat)})
+        allocation = allocate_budgets(spendable, categories)
+        rows.extend(
+            BudgetCategoryMonth(uid=user, category=cat, year=year, month=month, amount=amount)
+            for cat, amount in allocation
+        )
+        results.append({
+            "message": f"Budgets assigned for {calendar.month_name[month]} {year}!",
+            "year": year,
+            "month": month,
+            "updated_categories": [{"name": cat.name, "budget": float(amount)} for cat, amount in allocation],
+            "total_income": float(total_income),
+            "spendable": float(spendable),
+        })
+
+    with transaction.atomic(using=db_for_user(user.id)):
+        BudgetCategoryMonth.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['uid', 'category', 'year', 'month'],
+            update_fields=['amount'],
+        )
+        # bulk_create skips the post_save signals
+        check_budget_alerts(user.id, [(row.category_id, row.year, row.month) for row in rows])
+        bump_data_version(user.id)
+
+    if not is_range:
+        if skipped:
+            return Response({"error": skipped[0]["error"]}, status=400)
+        return Response(results[0])
 
     return Response({
-        "message": f"Budgets assigned for {calendar.month_name[month]} {year}!",
-        "year": year,
-        "month": month,
-        "updated_categories": updated,
-        "total_income": float(total_income),
-        "spendable": float(spendable),
+        "from": f"{start[0]}-{start[1]:02d}",
+        "to": f"{end[0]}-{end[1]:02d}",
+        "months": results,
+        "skipped": skipped,
     })
 
 # ──────────────────────────────────────────────────────────────
@@ -549,7 +847,7 @@ class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        profile = get_profile(request.user)
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)
 
@@ -565,37 +863,40 @@ class UserProfileView(APIView):
 # views.py → Replace the old reports_view completely
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_etag('reports', get_year_month, include_categories=True)
+@versioned_cache('reports', get_year_month, include_categories=True)
+@replica_reads
 def reports_view(request):
     user = request.user
-    year = int(request.query_params.get('year', timezone.now().year))
-    month = int(request.query_params.get('month', timezone.now().month))
+    year, month = get_year_month(request)
 
-    # Income for selected month
-    income_total = Income.objects.filter(
-        user=user, date__year=year, date__month=month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    # Income, category breakdown and budgets for the selected month
+    income_total = monthly_income_total(user, year, month)
+    category_data = report_category_rows(user, year, month)
+    budget_map = report_budget_map(user, year, month)
 
-    # Expenses for selected month
-    expenses = Expense_tbl.objects.filter(
-        user=user, date__year=year, date__month=month
-    )
-    expense_total = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    return Response(report_data(year, month, income_total, category_data, budget_map))
 
-    # Category breakdown
-    category_data = expenses.values('cid__id', 'cid__name').annotate(
-        spent=Sum('amount')
-    )
+def report_category_rows(user, year, month):
+    """Category breakdown for one month, straight from the rollup."""
+    return list(MonthlyCategoryRollup.objects.filter(
+        user=user, year=year, month=month, transaction_count__gt=0
+    ).values('category_id', 'category__name', 'spent'))
 
-    # Get budgets for this month
+def report_budget_map(user, year, month):
     budgets = BudgetCategoryMonth.objects.filter(
         uid=user, year=year, month=month
     ).values('category_id', 'amount')
-    budget_map = {b['category_id']: float(b['amount']) for b in budgets}
+    return {b['category_id']: float(b['amount']) for b in budgets}
+
+def report_data(year, month, income_total, category_data, budget_map):
+    """Response body of reports_view; shared with the async variant."""
+    expense_total = sum((item['spent'] for item in category_data), Decimal('0'))
 
     categories_report = []
     for item in category_data:
-        cat_id = item['cid__id']
-        cat_name = item['cid__name']
+        cat_id = item['category_id']
+        cat_name = item['category__name']
         spent = float(item['spent'] or 0)
         budget = budget_map.get(cat_id, 0.0)
         remaining = budget - spent
@@ -612,7 +913,7 @@ def reports_view(request):
     savings = income_total - expense_total
     savings_rate = (savings / income_total * 100) if income_total > 0 else 0
 
-    return Response({
+    return {
         "year": year,
         "month": month,
         "month_name": calendar.month_name[month],
@@ -622,4 +923,204 @@ def reports_view(request):
         "savings_rate": round(savings_rate, 1),
         "status": "Excellent" if savings_rate >= 30 else "Good" if savings_rate >= 20 else "Fair" if savings_rate >= 10 else "Critical",
         "categories": categories_report
-    })
\ No newline at end of file
+    }
+
+
+MAX_REPORT_MONTHS = 120
+
+def get_month_range(request):
+    """?from=YYYY-MM&to=YYYY-MM, defaulting to the 12 months ending this month."""
+    today = timezone.now().date()
+    default_start = today.replace(day=1) - relativedelta(months=11)
+    start = parse_year_month(request.query_params.get('from') or f"{default_start.year}-{default_start.month}")
+    end = parse_year_month(request.query_params.get('to') or f"{today.year}-{today.month}")
+    months = len(list(iter_months(start, end)))
+    if not 1 <= months <= MAX_REPORT_MONTHS:
+        raise ValueError(f"Range must cover between 1 and {MAX_REPORT_MONTHS} months")
+    return start, end
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_etag('reports-trend', get_month_range, include_categories=True)
+@versioned_cache('reports-trend', get_month_range, include_categories=True)
+@replica_reads
+def trend_report_view(request):
+    """
+    GET /api/reports/trend/?from=2025-01&to=2025-12
+    Per-month income, expenses, savings rate and category spend for a range of months.
+    One grouped query per table plus one budget fetch, whatever the range length.
+    """
+    user = request.user
+    try:
+        start, end = get_month_range(request)
+        # date() rejects years outside 1..9999, e.g. ?to=9999-12 whose window ends in year 10000
+        window_start = month_window(*start)[0]
+        window_end = month_window(*end)[1]
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    income_by_month = {
+        (row['period'].year, row['period'].month): row['total']
+        for row in Income.objects.filter(
+            user=user, date__gte=window_start, date__lt=window_end
+        ).annotate(period=TruncMonth('date')).values('period').annotate(total=Sum('amount')).order_by()
+    }
+
+    spend_by_month = defaultdict(list)
+    for row in Expense_tbl.objects.filter(
+        user=user, date__gte=window_start, date__lt=window_end
+    ).annotate(period=TruncMonth('date')).values('period', 'cid_id', 'cid__name').annotate(
+        spent=Sum('amount')
+    ).order_by('period', 'cid__name'):
+        spend_by_month[(row['period'].year, row['period'].month)].append(row)
+
+    budget_map = {
+        (b['year'], b['month'], b['category_id']): float(b['amount'])
+        for b in BudgetCategoryMonth.objects.filter(
+            uid=user, year__gte=start[0], year__lte=end[0]
+        ).values('year', 'month', 'category_id', 'amount')
+    }
+
+    months = []
+    for year, month in iter_months(start, end):
+        income = income_by_month.get((year, month)) or Decimal('0')
+        rows = spend_by_month.get((year, month), [])
+        expenses = sum((row['spent'] for row in rows), Decimal('0'))
+        savings = income - expenses
+        savings_rate = (savings / income * 100) if income > 0 else 0
+        months.append({
+            "year": year,
+            "month": month,
+            "month_name": calendar.month_name[month],
+            "income": float(income),
+            "expenses": float(expenses),
+            "savings": float(savings),
+            "savings_rate": round(savings_rate, 1),
+            "categories": [{
+                "category_id": row['cid_id'],
+                "category": row['cid__name'],
+                "spent": float(row['spent']),
+                "budget": budget_map.get((year, month, row['cid_id']), 0.0),
+            } for row in rows],
+        })
+
+    return Response({
+        "from": f"{start[0]}-{start[1]:02d}",
+        "to": f"{end[0]}-{end[1]:02d}",
+        "months": months,
+    })
+
+def percent_change(current, previous):
+    if not previous:
+        return None
+    return round(float((current - previous) / previous * 100), 1)
+
+def get_report_year(request):
+    year = int(request.query_params.get('year', timezone.now().year))
+    # the report spans the previous year through the end of this one, so both must be valid dates
+    if not MINYEAR + 1 <= year <= MAXYEAR - 1:
+        raise ValueError(f"Year must be between {MINYEAR + 1} and {MAXYEAR - 1}")
+    return (year,)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_etag('reports-yearly', get_report_year, include_categories=True)
+@versioned_cache('reports-yearly', get_report_year, include_categories=True)
+@replica_reads
+def yearly_report_view(request):
+    """
+    GET /api/reports/yearly/?year=2025
+    Annual totals per category for the selected and previous year, with the
+    year-over-year change and budget totals. Three grouped queries in all.
+    """
+    user = request.user
+    try:
+        (year,) = get_report_year(request)
+    except ValueError:
+        return Response({"error": "Invalid year"}, status=400)
+    previous_year = year - 1
+    window_start, window_end = date(previous_year, 1, 1), date(year + 1, 1, 1)
+
+    income = defaultdict(Decimal)
+    for row in Income.objects.filter(
+        user=user, date__gte=window_start, date__lt=window_end
+    ).annotate(period=TruncYear('date')).values('period').annotate(total=Sum('amount')).order_by():
+        income[row['period'].year] += row['total']
+
+    spent = defaultdict(Decimal)  # (year, category_id) -> total
+    names = {}
+    for row in Expense_tbl.objects.filter(
+        user=user, date__gte=window_start, date__lt=window_end
+    ).annotate(period=TruncYear('date')).values('period', 'cid_id', 'cid__name').annotate(
+        total=Sum('amount')
+    ).order_by():
+        spent[(row['period'].year, row['cid_id'])] += row['total']
+        names[row['cid_id']] = row['cid__name']
+
+    budgets = defaultdict(Decimal)  # (year, category_id) -> summed monthly budgets
+    for row in BudgetCategoryMonth.objects.filter(
+        uid=user, year__in=[previous_year, year]
+    ).values('year', 'category_id', 'category__name').annotate(total=Sum('amount')).order_by():
+        budgets[(row['year'], row['category_id'])] += row['total']
+        names.setdefault(row['category_id'], row['category__name'])
+
+    categories = []
+    for category_id, name in sorted(names.items(), key=lambda item: item[1]):
+        current = spent[(year, category_id)]
+        previous = spent[(previous_year, category_id)]
+        categories.append({
+            "category_id": category_id,
+            "category": name,
+            "spent": float(current),
+            "previous_spent": float(previous),
+            "change_percent": percent_change(current, previous),
+            "budget": float(budgets[(year, category_id)]),
+            "previous_budget": float(budgets[(previous_year, category_id)]),
+        })
+
+    expenses = sum((v for (y, _), v in spent.items() if y == year), Decimal('0'))
+    previous_expenses = sum((v for (y, _), v in spent.items() if y == previous_year), Decimal('0'))
+    return Response({
+        "year": year,
+        "previous_year": previous_year,
+        "income": float(income[year]),
+        "previous_income": float(income[previous_year]),
+        "income_change_percent": percent_change(income[year], income[previous_year]),
+        "expenses": float(expenses),
+        "previous_expenses": float(previous_expenses),
+        "expenses_change_percent": percent_change(expenses, previous_expenses),
+        "budget": float(sum((v for (y, _), v in budgets.items() if y == year), Decimal('0'))),
+        "categories": categories,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def budget_alerts_view(request):
+    """GET /api/alerts/ - Unread budget alerts (80% / 100% of a monthly category budget), newest first"""
+    alerts = unread_alerts(request.user.id)
+    return Response({"alerts": BudgetAlertSerializer(alerts, many=True).data})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_budget_alerts_read(request):
+    """
+    POST /api/alerts/read/ {"ids": [3, 4]} - Mark these alerts read
+    POST /api/alerts/read/ {}              - Mark every unread alert read
+    """
+    ids = request.data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return Response({"error": "'ids' must be a list of alert ids"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"marked_read": mark_alerts_read(request.user.id, ids)})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    """GET /api/cache-stats/ - Hit/miss counters for the report response cache (staff only)"""
+    return Response(cache_stats())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """GET /api/metrics/ - Per-view latency, DB time and query histograms in Prometheus text format (staff only)"""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -22,7 +22,7 @@ INSTALLED_APPS = [
 ]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app_new.authentication.CachedJWTAuthentication',  # JWTAuthentication + cached user/profile
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -32,7 +32,7 @@ from datetime import timedelta
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app_new.authentication.CachedJWTAuthentication',  # JWTAuthentication + cached user/profile
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -76,6 +76,10 @@ SIMPLE_JWT = {
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',                        # ← MUST be line 1
+    'app_new.metrics.RequestMetricsMiddleware',                      # Server-Timing + /api/metrics/ histograms
+    'app_new.logutils.RequestIdMiddleware',                          # X-Request-ID, stamped on log records
+    'app_new.sharding.ShardMiddleware',                              # per-request user shard (DATABASE_SHARDS)
+    'app_new.db_routers.ReplicaPinMiddleware',                       # signed read-your-writes cookie (DATABASE_REPLICAS)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',                     # ← CsrfViewMiddleware moved BELOW
@@ -113,9 +117,76 @@ DATABASES = {
         'PASSWORD': 'root',        # your postgres password
         'HOST': 'localhost',
         'PORT': '5432',
+        # persistent connections: async views run queries on pool threads, each with its own connection
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (see app_new/db_routers.py). Report and list views read from one alias in
+# DATABASE_REPLICAS, picked per request; a user who just wrote is pinned to 'default' for
+# REPLICA_PIN_SECONDS, through the shared cache and a signed cookie, which should comfortably
+# exceed replication lag. Empty list = everything on 'default'. Example:
+#   DATABASES['replica1'] = {**DATABASES['default'], 'HOST': 'replica1.internal'}
+#   DATABASE_REPLICAS = ['replica1']
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 10
+
+# User-id sharding (see app_new/sharding.py). Per-user tables (expenses, income, budgets, profiles,
+# rollups) live on the alias a consistent-hash ring over DATABASE_SHARDS picks for the user; User and
+# Category stay on 'default' and are copied to the shards. Empty list = no sharding. After changing
+# the list, move the users the ring now sends elsewhere: `manage.py move_user_shard --all --from <alias>`.
+#   DATABASES['shard1'] = {**DATABASES['default'], 'NAME': 'expense_shard1'}
+#   DATABASE_SHARDS = ['default', 'shard1']
+DATABASE_SHARDS = []
+
+# ShardRouter first: it only answers for the sharded tables, everything else falls through
+DATABASE_ROUTERS = ['app_new.sharding.ShardRouter', 'app_new.db_routers.ReplicaRouter']
+
+# Cache (per-user versioned report cache, see app_new/caching.py)
+# Local memory is per process, fine for one dev server only: cached users and the category maps
+# are invalidated, and replica pins kept, through this cache, so every worker must share it.
+# Deploy with Redis or Memcached (`manage.py check --deploy` fails otherwise, app_new.E001):
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379/1',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'expense-tracker',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60  # seconds; entries are also retired by data-version bumps
+LOCAL_CACHE_TTL = 30  # seconds; caps cached users and category maps while the cache is process-local
+
+# Logging: JSON lines written by a background QueueListener so request threads never block on stdout.
+# Hot-path DEBUG events are sampled; raise LOG_DEBUG_SAMPLE_RATE (0..1) or APP_LOG_LEVEL to see more.
+APP_LOG_LEVEL = 'INFO'
+LOG_DEBUG_SAMPLE_RATE = 0.01
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'app_new.logutils.JsonFormatter'},
+    },
+    'filters': {
+        'request_context': {'()': 'app_new.logutils.RequestContextFilter'},
+        'sample_debug': {'()': 'app_new.logutils.DebugSampleFilter', 'rate': LOG_DEBUG_SAMPLE_RATE},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'app_new.logutils.QueueLogHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+            'filters': ['request_context', 'sample_debug'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': 'WARNING'},
+    'loggers': {
+        'app_new': {'handlers': ['queue'], 'level': APP_LOG_LEVEL, 'propagate': False},
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
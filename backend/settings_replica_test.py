@@ -0,0 +1,16 @@
+"""
+Two local SQLite databases standing in for a primary and a read replica, for
+the replica routing tests:
+
+    python manage.py test app_new.tests.ReplicaReadTests --settings=backend.settings_replica_test
+
+Nothing replicates between them, so a test can tell which one a read hit. The
+rest of the suite assumes a single database; run it with the normal settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'primary.sqlite3'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'},
+}
+DATABASE_REPLICAS = ['replica']
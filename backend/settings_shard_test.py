@@ -0,0 +1,17 @@
+"""
+Three local SQLite databases: 'default' for the global tables (users,
+categories, auth) and two shards for per-user data, for the sharding tests:
+
+    python manage.py test app_new.tests.ShardingTests --settings=backend.settings_shard_test
+
+Each shard is a separate file, so a test can tell where a row landed. The rest
+of the suite assumes a single database; run it with the normal settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'global.sqlite3'},
+    'shard_a': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'shard_a.sqlite3'},
+    'shard_b': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'shard_b.sqlite3'},
+}
+DATABASE_SHARDS = ['shard_a', 'shard_b']